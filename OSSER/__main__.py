@@ -0,0 +1,69 @@
+"""
+Single entry point for every command:
+    python -m OSSER dns A www.test.com
+    python -m OSSER dns-recon 10.0.0.1 test.com --journal recon.journal
+    python -m OSSER --metrics-json metrics.json bing-ip-recon 10.0.0.0/24
+    python -m OSSER --executor threads --concurrency 8 bing-ip-recon 10.0.0.0/24
+    python -m OSSER <command> --help
+
+Only the module of the command that is run gets imported (dnspython, py_ms_cognitive... are slow to import),
+so --help and short runs start fast. Every command module has an add_arguments(parser) and a main(args).
+"""
+import argparse
+import importlib
+import sys
+
+# name -> (module, description)
+COMMANDS = {
+    'dns': ('OSSER.commands.DnsQueryCommand',
+            'query a DNS record type for one or more names'),
+    'dns-recon': ('OSSER.commands.DnsReconCommand',
+                  'resolve IPs <-> FQDNs back and forth until nothing new is found'),
+    'bing-ip': ('OSSER.commands.BingIpSearchCommand',
+                'search Bing for what is hosted on some IPs'),
+    'bing-ip-recon': ('OSSER.commands.BingIpReconCommand',
+                      'search Bing for what is hosted on some IPs (or ranges), then dns-recon the FQDNs found'),
+    'linkedin': ('OSSER.commands.BingLinkedInScraperCommand',
+                 'find the LinkedIn profiles of the employees of a company'),
+    'results': ('OSSER.core.ResultStore',
+                'query the results stored by the other commands (--results), across runs'),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m OSSER',
+                                     description='One-Stop-Shop-Tools',
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog='commands:\n' + '\n'.join('  {:<16}{}'.format(name, description)
+                                                                      for name, (_, description) in COMMANDS.items()))
+    parser.add_argument('--metrics-json', metavar='PATH', help='write a metrics summary there once done')
+    parser.add_argument('--metrics-prometheus', metavar='PATH', help='same, in the Prometheus textfile format')
+    parser.add_argument('--executor', choices=('serial', 'threads', 'asyncio'), default='serial',
+                        help='how composite commands run their independent children (ex. the Bing IP searches)')
+    parser.add_argument('--concurrency', type=int, default=16, help='children run at the same time by the executor')
+    parser.add_argument('command', choices=COMMANDS, metavar='command')
+    parser.add_argument('arguments', nargs=argparse.REMAINDER, help='see python -m OSSER <command> --help')
+
+    args = parser.parse_args(argv)
+
+    module_name, description = COMMANDS[args.command]
+    module = importlib.import_module(module_name)
+
+    command_parser = argparse.ArgumentParser(prog='python -m OSSER {}'.format(args.command), description=description)
+    module.add_arguments(command_parser)
+    command_args = command_parser.parse_args(args.arguments)
+
+    if args.metrics_json or args.metrics_prometheus:
+        from OSSER.core.Metrics import Metrics
+        Metrics.shared().write_at_exit(json_path=args.metrics_json, prometheus_path=args.metrics_prometheus)
+
+    from OSSER.commands.AbstractCommand import AbstractCommand
+    from OSSER.commands.CommandExecutor import CommandExecutor
+
+    with CommandExecutor.create(args.executor, args.concurrency) as executor:
+        AbstractCommand.set_executor(executor)
+        module.main(command_args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,50 @@
+from OSSER.commands.CommandExecutor import CommandExecutor, SerialExecutor
+from OSSER.core.Metrics import Metrics
+
+
 class AbstractCommand:
 
+    # Leaf commands are created by the hundred thousand (ex. a DnsRecon of a /16), so no per instance __dict__.
+    # Subclasses only need their own __slots__ if they are that numerous
+    __slots__ = ('_commands', 'executed', '_results')
+
+    # Shared by every composite command, see set_executor()
+    executor = SerialExecutor()
+
+    # Children of the commands that have none (most of them are leafs)
+    _NO_CHILDREN = ()
+
     class AbstractArgs:
         """Shortcut to pretty-print and handle command arguments"""
 
+        # So Args can be slotted (or tuples) too
+        __slots__ = ()
+
+        def fields(self):
+            """:return: {name: value} of the arguments, be they attributes, slots or (named) tuple fields"""
+            if hasattr(self, '_asdict'):
+                return dict(self._asdict())
+
+            fields = {}
+            for cls in reversed(type(self).__mro__):
+                slots = cls.__dict__.get('__slots__', ())
+                for name in [slots] if isinstance(slots, str) else slots:
+                    if hasattr(self, name):
+                        fields[name] = getattr(self, name)
+
+            fields.update(getattr(self, '__dict__', {}))
+
+            return fields
+
         def __repr__(self):
-            return self.__dict__
+            return '{}({})'.format(type(self).__qualname__,
+                                   ', '.join('{}={!r}'.format(name, value) for name, value in self.fields().items()))
 
         def __str__(self):
-            return str(self.__repr__())
+            return str(self.fields())
 
     def __init__(self):
-        self._commands = []
+        self._commands = AbstractCommand._NO_CHILDREN
         self.executed = False
         self._results = None
 
@@ -19,14 +53,48 @@ class AbstractCommand:
         return self._results
 
     def add(self, command: 'AbstractCommand'):
-        self._commands += [command]
+        if self._commands is AbstractCommand._NO_CHILDREN:
+            self._commands = []
+
+        self._commands.append(command)
 
     def children(self):
         return self._commands
 
+    def prune(self):
+        """Forget the children already executed (once their results were consumed), only keep the pending ones"""
+        self._commands = [child for child in self._commands if not child.executed] or AbstractCommand._NO_CHILDREN
+
     def execute(self):
         raise NotImplementedError()
 
+    def is_leaf(self):
+        return getattr(type(self).execute, 'is_leaf', False)
+
+    def execute_children(self):
+        """
+        Execute every child that was not executed yet.
+        Leaf children are independent from each other, so they are handed all at once to the executor
+        (which may run them at the same time), then composite children are executed one after the other.
+        """
+        pending = [child for child in self.children() if not child.executed]
+
+        AbstractCommand.executor.run([child for child in pending if child.is_leaf()])
+
+        for child in pending:
+            # If the child is also a composite_command, will execute child's children
+            if not child.executed:
+                child.execute()
+
+    @staticmethod
+    def set_executor(executor: CommandExecutor):
+        """
+        Choose how every composite command runs its leaf children
+        EX:
+            AbstractCommand.set_executor(ThreadedExecutor(concurrency=8))
+        """
+        AbstractCommand.executor = executor
+
     ###############################
     # Decorators
     # Usage:
@@ -53,14 +121,17 @@ class AbstractCommand:
             self.child[0].child[1].execute()
             self.child[0].child[2].execute()
             self.child[1].execute()
+
+            Sibling leafs are executed through AbstractCommand.executor, so they may run at the same time.
+            The parent is only marked as executed once all its children are.
+
+            The wall time (children included) is recorded in the command_seconds metric.
         """
         def wrapper(self, *args, **kwargs):
-            output = function_to_decorate(self, *args, **kwargs)
+            with Metrics.shared().timer('command_seconds', command=type(self).__name__):
+                output = function_to_decorate(self, *args, **kwargs)
 
-            for child in self.children():
-                # If the child is also a composite_command, will execute child's children
-                if not child.executed:
-                    child.execute()
+                self.execute_children()
 
             self.executed = True
 
@@ -72,14 +143,19 @@ class AbstractCommand:
     def leaf_command(function_to_decorate):
         """
         Does not do much other than putting in evidence that this won't go through any children (if any?!)
+        Leafs are independent from their siblings, so the executor is free to run them concurrently
+        The wall time is recorded in the command_seconds metric.
         """
         def wrapper(self, *args, **kwargs):
             output = None
 
             if not self.executed:
-                output = function_to_decorate(self, *args, **kwargs)
+                with Metrics.shared().timer('command_seconds', command=type(self).__name__):
+                    output = function_to_decorate(self, *args, **kwargs)
                 self.executed = True
 
             return output
 
+        wrapper.is_leaf = True
+
         return wrapper
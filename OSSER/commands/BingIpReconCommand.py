@@ -1,4 +1,9 @@
-import sys
+import argparse
+import copy
+import ipaddress
+import itertools
+import json
+import os
 from urllib.parse import urlparse
 from typing import Iterable
 
@@ -6,15 +11,47 @@ import OSSER.core.helpers as helpers
 from OSSER.commands.AbstractCommand import AbstractCommand
 from OSSER.commands.DnsReconCommand import DnsReconCommand
 from OSSER.commands.BingIpSearchCommand import BingIpSearchCommand
+from OSSER.core.Journal import Journal
+from OSSER.core.ResultStore import ResultStore
 from OSSER.modules.DnsQuery import DnsQuery
 from OSSER.modules.BingSearch import BingSearch
 
 
 class BingIpReconCommand(AbstractCommand):
+    """
+    Search Bing for everything hosted on a set of IPs (or CIDR ranges), then do a DnsRecon on the FQDNs found.
+
+    Addresses are packed several per Bing query (ip:x OR ip:y ...), up to max_query_length characters,
+    and every result is then attributed back to the IP it was found for:
+        -either the URL's host is one of the IPs,
+        -or it resolves (A or AAAA) to one of them, results whose host does not resolve are unattributed.
+
+    Batches that returned nothing are remembered in empty_ranges_path (one CIDR per line, merged at every run),
+    and skipped on the next runs.
+
+    Every completed search is appended to journal_path, and with resume the IPs found in it are not searched again.
+    The DnsRecon uses its own journal (journal_path + '.dns').
+    """
+
+    # Search commands alive at a time (see _search)
+    SEARCHES_PER_ROUND = 256
 
     class Args(AbstractCommand.AbstractArgs):
-        def __init__(self, ip_addresses: Iterable[str]):
-            self.ip_addresses = set(ip_addresses)
+        def __init__(self,
+                     ip_addresses: Iterable[str],
+                     max_query_length: int = 1000,
+                     empty_ranges_path: str = None,
+                     journal_path: str = None,
+                     resume: bool = False,
+                     results_path: str = None):
+            # IPs or CIDR ranges, expanded lazily
+            self.ip_addresses = ip_addresses
+            self.max_query_length = max_query_length
+            self.empty_ranges_path = empty_ranges_path
+            self.journal_path = journal_path
+            self.resume = resume
+            # The results (and the DnsRecon answers) are also added to this ResultStore (sqlite file)
+            self.results_path = results_path
 
     def __init__(self,
                  dns_query_module_args: DnsQuery.Args,
@@ -26,72 +63,240 @@ class BingIpReconCommand(AbstractCommand):
         self.dns_query_module_args = dns_query_module_args
         self.bing_search_module_args = bing_serch_module_args
 
-        for ip in self.command_args.ip_addresses:
-            bing_ip_search = BingIpSearchCommand(
-                    command_args=BingIpSearchCommand.Args(ip_address=ip),
-                    bing_search_module_args=self.bing_search_module_args
-            )
+        # ip -> results found for this ip, and results we could not attribute to a single IP
+        self.results_by_ip = {}
+        self.unattributed_results = []
+
+        # Searches completed by a previous run: [{'ip_addresses': [...], 'results': [...]}]
+        self._completed = []
+        self.journal = None
+        if self.command_args.journal_path:
+            if self.command_args.resume:
+                self._completed = list(Journal.replay(self.command_args.journal_path))
+
+            self.journal = Journal(self.command_args.journal_path, resume=self.command_args.resume)
+
+        # Ranges that returned nothing before, see _load_empty_ranges()
+        self.empty_ranges = self._load_empty_ranges()
+
+    def _load_empty_ranges(self):
+        """:return: A dict of {(ip version, prefixlen): set of networks} that returned nothing before"""
+        empty_ranges = {}
+
+        path = self.command_args.empty_ranges_path
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        network = ipaddress.ip_network(line.strip())
+                        empty_ranges.setdefault((network.version, network.prefixlen), set()).add(network)
+
+        return empty_ranges
+
+    def _batches(self, empty_ranges: dict, completed_ips: set):
+        """Pack the (not known to be empty, not already searched) addresses into lists fitting in a single query"""
+        batch, length = [], 0
+
+        for ip in helpers.iter_ip_addresses(self.command_args.ip_addresses):
+            if ip in completed_ips:
+                continue
+
+            version = ipaddress.ip_address(ip).version
+            if any(ipaddress.ip_network((ip, prefixlen), strict=False) in networks
+                   for (range_version, prefixlen), networks in empty_ranges.items()
+                   if range_version == version):
+                continue
+
+            # len(' OR ip:') == 7
+            term_length = len(ip) + (3 if not batch else 7)
+            if batch and length + term_length > self.command_args.max_query_length:
+                yield batch
+                batch, length = [], 0
+                term_length = len(ip) + 3
+
+            batch.append(ip)
+            length += term_length
+
+        if batch:
+            yield batch
+
+    def _save_empty_ranges(self, batches: Iterable[list]):
+        """Rewrite empty_ranges_path with the ranges known before and the batches that returned nothing, merged"""
+        path = self.command_args.empty_ranges_path
+        if not path:
+            return
+
+        networks = [network for networks in self.empty_ranges.values() for network in networks]
+        for batch in batches:
+            networks += ipaddress.collapse_addresses(ipaddress.ip_address(ip) for ip in batch)
+
+        # A run that dies while writing leaves the previous file as it was
+        with open(path + '.tmp', 'w') as f:
+            for version in (4, 6):
+                for network in ipaddress.collapse_addresses(x for x in networks if x.version == version):
+                    f.write(str(network) + '\n')
+
+        os.replace(path + '.tmp', path)
+
+    def _search(self):
+        """
+        Run the Bing searches of every batch, SEARCHES_PER_ROUND at a time: the commands are created as the
+        (lazily expanded) addresses are consumed, and dropped once their results are collected
+        :return: (ip_addresses, results) of the searches that found something, and the batches that did not
+        """
+        completed_ips = set(ip for entry in self._completed for ip in entry['ip_addresses'])
+        batches = self._batches(self.empty_ranges, completed_ips)
 
-            self.add(bing_ip_search)
+        searches, empty_batches = [], []
+        while True:
+            for batch in itertools.islice(batches, BingIpReconCommand.SEARCHES_PER_ROUND):
+                self.add(BingIpSearchCommand(command_args=BingIpSearchCommand.Args(ip_addresses=batch),
+                                             bing_search_module_args=self.bing_search_module_args,
+                                             journal=self.journal))
+
+            if not self.children():
+                return searches, empty_batches
+
+            # The IP searches are independent, the executor may run them at the same time
+            self.execute_children()
+
+            for cmd in self.children():
+                if cmd.results:
+                    searches.append((cmd.command_args.ip_addresses, cmd.results))
+                else:
+                    empty_batches.append(cmd.command_args.ip_addresses)
+
+            self.prune()
+
+    def _attribute_results(self, searches: Iterable[tuple]):
+        """
+        Split every batch's results back to the IP(s) they match
+        :param searches: (ip_addresses, results) of every search
+        """
+        pending = []
+        for ip_addresses, results in searches:
+            batch = set(ip_addresses)
+            for result in results:
+                host = urlparse(result['url']).hostname or ''
+                if host in batch:
+                    self.results_by_ip.setdefault(host, []).append(result)
+                else:
+                    pending.append((batch, host, result))
+
+        # Hosts that are not IPs: resolve them (all at once, A and/or AAAA depending on the IPs searched)
+        # and match their addresses with the batch.
+        # The searches are already paid for: a lookup that fails leaves its results unattributed, nothing more
+        versions = set(ipaddress.ip_address(ip).version for batch, _, _ in pending for ip in batch)
+        record_types = [record_type for version, record_type in ((4, 'A'), (6, 'AAAA')) if version in versions]
+
+        dns_query_args = copy.copy(self.dns_query_module_args)
+        dns_query_args.skip_errors = True
+        answers = DnsQuery(args=dns_query_args).do_query_types_many(
+                queries=set(host for _, host, _ in pending if host),
+                record_types=record_types) if record_types else {}
+
+        for batch, host, result in pending:
+            matching_ips = batch.intersection(answers[host].addresses()) if host in answers else set()
+            for ip in matching_ips:
+                self.results_by_ip.setdefault(ip, []).append(result)
+
+            if not matching_ips:
+                self.unattributed_results.append(result)
+
+    def _store_results(self, searches: list):
+        """
+        Add every search result to the ResultStore: one row per IP it was attributed to (a result may match
+        several IPs of its batch), a single row without IP if it was not attributed
+        """
+        store = ResultStore.shared(self.command_args.results_path)
+        run = store.begin_run('bing-ip-recon', {'ip_addresses': self.command_args.ip_addresses})
+
+        ips_of = {}
+        for ip, results in self.results_by_ip.items():
+            for result in results:
+                ips_of.setdefault(id(result), []).append(ip)
+
+        for ip_addresses, results in searches:
+            search_term = BingIpSearchCommand.Args(ip_addresses=ip_addresses).search_term
+            for result in results:
+                for ip in ips_of.get(id(result), [None]):
+                    store.add_web_results(run, 'bing-ip', search_term, [result], ip=ip)
+
+        store.finish_run(run)
 
     @AbstractCommand.composite_command
     def execute(self):
 
-        for child in self.children():
-            child.execute()
+        searches, empty_batches = self._search()
+        self._save_empty_ranges(empty_batches)
+
+        searches += [(entry['ip_addresses'], entry['results']) for entry in self._completed if entry['results']]
+        self._attribute_results(searches)
+
+        if self.journal:
+            self.journal.close()
 
-        bing_results = [res for cmd in self.children()
-                        if cmd.results
-                        for res in cmd.results]
+        if self.command_args.results_path:
+            self._store_results(searches)
+
+        bing_results = [res for _, results in searches for res in results]
 
         found_fqdn = helpers.extract_fqdn_from_bing_results(bing_results)
         dns_recon_cmd = DnsReconCommand(
                 dns_query_module_args=self.dns_query_module_args,
                 command_args=DnsReconCommand.Args(
                         ip_addresses=[],
-                        fully_qualified_domain_names=found_fqdn
+                        fully_qualified_domain_names=found_fqdn,
+                        journal_path=self.command_args.journal_path and self.command_args.journal_path + '.dns',
+                        resume=self.command_args.resume,
+                        results_path=self.command_args.results_path
                 )
         )
 
+        # Executed by the decorator, once we return
+        self.add(dns_recon_cmd)
 
+        self._results = self.results_by_ip
 
 
-        print(found_fqdn)
-
-
-def print_children(command: AbstractCommand):
-    """
-    Depth first print (print leafs up to the top)
-    """
-    for c in command.children():
-        print_children(c)
-
-    print(command.command_args)
+def add_arguments(parser):
+    parser.add_argument('ip_addresses', nargs='+', metavar='ip', help='IP or CIDR range')
+    parser.add_argument('--max-query-length', type=int, default=1000, help='characters per Bing query')
+    parser.add_argument('--empty-ranges', dest='empty_ranges_path', metavar='PATH',
+                        help='remember the ranges without results here, and skip them on the next runs')
+    parser.add_argument('--journal', dest='journal_path', metavar='PATH',
+                        help='append every completed search to this file (an existing one is kept as PATH.1, ...)')
+    parser.add_argument('--resume', action='store_true', help="don't search again what is in the journal")
+    parser.add_argument('--results', dest='results_path', metavar='PATH',
+                        help='also add every result to this sqlite file (see python -m OSSER results)')
+    BingSearch.Args.add_arguments(parser)
+    DnsQuery.Args.add_arguments(parser)
 
 
 def main(args):
-    command_args = BingIpReconCommand.Args(ip_addresses=args.ip_addresses)
-    dns_args = DnsQuery.Args()
-    bing_args = BingSearch.Args(bing_api_key=args.api_key)
+    """Print the results, one JSON object per line, with the IP they were found for (null if unknown)"""
+    command_args = BingIpReconCommand.Args(ip_addresses=args.ip_addresses,
+                                           max_query_length=args.max_query_length,
+                                           empty_ranges_path=args.empty_ranges_path,
+                                           journal_path=args.journal_path,
+                                           resume=args.resume,
+                                           results_path=args.results_path)
 
-    cmd = BingIpReconCommand(dns_query_module_args=dns_args,
-                             bing_serch_module_args=bing_args,
+    cmd = BingIpReconCommand(dns_query_module_args=DnsQuery.Args.from_arguments(args),
+                             bing_serch_module_args=BingSearch.Args.from_arguments(args),
                              command_args=command_args)
     cmd.execute()
 
-    if cmd.executed:
-        print("Executed successfully!")
-        print("Results:")
-        print(cmd.results)
-        print_children(cmd)
+    for ip, results in cmd.results.items():
+        for result in results:
+            print(json.dumps(dict(result, ip=ip)))
 
+    for result in cmd.unattributed_results:
+        print(json.dumps(dict(result, ip=None)))
 
-if __name__ == "__main__":
-    args = lambda: None
-    #args.record_type = sys.argv[1]
-    #args.dns_query = sys.argv[2]
 
-    args.ip_addresses = run_args
-    args.api_key = sys.argv[1]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Search Bing for what is hosted on some IPs, then DnsRecon it')
+    add_arguments(parser)
 
-    main(args)
+    main(parser.parse_args())
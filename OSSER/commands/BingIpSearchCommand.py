@@ -1,37 +1,63 @@
-import sys
+import argparse
+import json
+from typing import Iterable
 
 from OSSER.commands.AbstractCommand import AbstractCommand
+from OSSER.core.Journal import Journal
 from OSSER.modules.BingSearch import BingSearch
 
 
 class BingIpSearchCommand(AbstractCommand):
 
+    __slots__ = ('bing_search_module_args', 'command_args', 'journal')
+
     class Args(AbstractCommand.AbstractArgs):
-        def __init__(self, ip_address):
-            self.ip_address = ip_address
+        def __init__(self, ip_address: str = None, ip_addresses: Iterable[str] = None):
+            # Several addresses can be searched at once (ip:x OR ip:y ...)
+            self.ip_addresses = [ip_address] if ip_address else list(ip_addresses)
+
+        @property
+        def search_term(self):
+            return ' OR '.join('ip:' + ip for ip in self.ip_addresses)
 
     def __init__(self,
                  bing_search_module_args: BingSearch.Args = None,
                  command_args: Args = None,
+                 journal: Journal = None
                  ):
         super().__init__()
 
         self.bing_search_module_args = bing_search_module_args
         self.command_args = command_args
+        # If set, the search and its results are appended to it once completed
+        self.journal = journal
 
     @AbstractCommand.leaf_command
     def execute(self):
-        self._results = BingSearch(args=self.bing_search_module_args).do_search(search_term='ip:'+self.command_args.ip_address)
+        self._results = BingSearch(args=self.bing_search_module_args).do_search(
+                search_term=self.command_args.search_term)
 
+        if self.journal:
+            self.journal.append({'ip_addresses': self.command_args.ip_addresses, 'results': self._results})
+
+
+def add_arguments(parser):
+    parser.add_argument('ip_addresses', nargs='+', metavar='ip', help='searched all at once (ip:x OR ip:y ...)')
+    BingSearch.Args.add_arguments(parser)
 
-if __name__ == '__main__':
-    command_args = BingIpSearchCommand.Args(ip_address=sys.argv[2])
-    bing_args = BingSearch.Args(bing_api_key=sys.argv[1])
 
-    cmd = BingIpSearchCommand(bing_search_module_args=bing_args, command_args=command_args)
+def main(args):
+    """Print the results, one JSON object per line"""
+    cmd = BingIpSearchCommand(bing_search_module_args=BingSearch.Args.from_arguments(args),
+                              command_args=BingIpSearchCommand.Args(ip_addresses=args.ip_addresses))
     cmd.execute()
 
-    if cmd.executed:
-        print("Executed successfully!")
-        print("Results:")
-        print(cmd.results)
+    for result in cmd.results:
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search Bing for what is hosted on some IPs')
+    add_arguments(parser)
+
+    main(parser.parse_args())
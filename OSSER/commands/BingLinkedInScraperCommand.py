@@ -1,9 +1,12 @@
+import argparse
+import json
 import sys
 import time
-import json
 from typing import Iterable
 
+import OSSER.core.helpers as helpers
 from OSSER.commands.AbstractCommand import AbstractCommand
+from OSSER.core.ResultStore import ResultStore
 from OSSER.modules.BingSearch import BingSearch
 
 
@@ -13,10 +16,16 @@ class BingLinkedInScraperCommand(AbstractCommand):
 
         def __init__(self,
                      company: str,
-                     additional_query_args
+                     additional_query_args,
+                     output_path: str = None,
+                     results_path: str = None
                      ):
             self.company = company
             self.additional_query = additional_query_args
+            # If set, results are streamed to this JSONL file (one result per line) instead of kept in memory
+            self.output_path = output_path
+            # Results are also added to this ResultStore (sqlite file), page by page
+            self.results_path = results_path
 
     def __init__(self,
                  bing_search_module_args: BingSearch.Args,
@@ -25,6 +34,9 @@ class BingLinkedInScraperCommand(AbstractCommand):
         super().__init__()
         self.command_args = command_args
         self.bing_search_module_args = bing_search_module_args
+        self.result_count = 0
+        # Where the results were streamed to (then results is None), see Args.output_path
+        self.output_path = None
 
     @AbstractCommand.leaf_command
     def execute(self):
@@ -32,43 +44,85 @@ class BingLinkedInScraperCommand(AbstractCommand):
             company=self.command_args.company,
             add_query=self.command_args.additional_query)
 
-        self._results = BingSearch(args=self.bing_search_module_args).do_search(
-            search_term=search_term
-        )
+        pages = BingSearch(args=self.bing_search_module_args).iter_search(search_term=search_term)
+        seen_urls = set()
 
-if __name__ == '__main__':
-    if len(sys.argv) != 5:
-        api_key = input("api:")
-        max_pages = int(input("max_search_pages (50 results per pages):"))
-        company = input("company:")
-        additional_query_args = input("additional_query (ex: \"Location Florida\" Accounting):")
-    else:
-        api_key = sys.argv[1]
-        max_pages = int(sys.argv[2])
-        company = sys.argv[3]
-        additional_query_args = sys.argv[4]
-
-    bing_args = BingSearch.Args(
-            bing_api_key=api_key,
-            max_queries=max_pages
-            )
-    command_args = BingLinkedInScraperCommand.Args(company=company,
-                                                   additional_query_args=additional_query_args)
-
-    cmd = BingLinkedInScraperCommand(bing_search_module_args=bing_args,
+        # Only the results that are kept are stored
+        pages = BingLinkedInScraperCommand._new_results(pages, seen_urls)
+        if self.command_args.results_path:
+            pages = self._stored(pages, search_term)
+
+        if self.command_args.output_path:
+            # Flushing after every page, so a crash only loses the page in flight
+            with open(self.command_args.output_path, 'a') as f:
+                for page in pages:
+                    for result in page:
+                        f.write(json.dumps(result) + '\n')
+                    f.flush()
+
+            self.output_path = self.command_args.output_path
+        else:
+            self._results = [result for page in pages for result in page]
+
+        self.result_count = len(seen_urls)
+
+    def _stored(self, pages: Iterable[list], search_term: str):
+        """Add every page (once deduplicated) to the ResultStore as it goes through"""
+        store = ResultStore.shared(self.command_args.results_path)
+        run = store.begin_run('linkedin', {'company': self.command_args.company,
+                                           'additional_query': self.command_args.additional_query})
+        try:
+            for page in pages:
+                store.add_web_results(run, 'linkedin', search_term, page)
+                yield page
+        finally:
+            store.finish_run(run)
+
+    @staticmethod
+    def _new_results(pages: Iterable[list], seen_urls: set):
+        """Yield every page, minus the results whose URL was already seen (see helpers.normalize_url)"""
+        for page in pages:
+            new_results = []
+            for result in page:
+                url = helpers.normalize_url(result['url'])
+                if url not in seen_urls:
+                    seen_urls.add(url)
+                    new_results.append(result)
+
+            yield new_results
+
+
+def add_arguments(parser):
+    parser.add_argument('company', help='searched in the profile titles')
+    parser.add_argument('additional_query', nargs='?', default='',
+                        help='added to the search (ex: \'"Location Florida" Accounting\')')
+    parser.add_argument('--output', dest='output_path', metavar='PATH',
+                        help='JSONL file the results are appended to (default: linkedin_<company>_<timestamp>.jsonl)')
+    parser.add_argument('--results', dest='results_path', metavar='PATH',
+                        help='also add every result to this sqlite file (see python -m OSSER results)')
+    BingSearch.Args.add_arguments(parser, max_queries=15)
+
+
+def main(args):
+    output_path = args.output_path or "linkedin_{company}_{timestamp}.jsonl".format(
+        company=args.company.replace(' ', '-'),
+        timestamp=str(int(time.time()))
+    )
+
+    command_args = BingLinkedInScraperCommand.Args(company=args.company,
+                                                   additional_query_args=args.additional_query,
+                                                   output_path=output_path,
+                                                   results_path=args.results_path)
+
+    cmd = BingLinkedInScraperCommand(bing_search_module_args=BingSearch.Args.from_arguments(args),
                                      command_args=command_args)
-    print("Searching...")
+    print("Searching, storing results in {}...".format(output_path), file=sys.stderr)
     cmd.execute()
-    if cmd.executed:
-        print("Executed successfully!")
-        print("Results ({}):".format(len(cmd.results)))
+    print("{} results".format(cmd.result_count), file=sys.stderr)
 
-        filename = "linkedin_{company}_{timestamp}.json".format(
-            company=company.replace(' ', '-'),
-            timestamp=str(int(time.time()))
-        )
 
-        print("Storing results in ({}):".format(filename))
-        with open(filename, 'w') as f:
-            f.write(json.dumps(cmd.results))
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find the LinkedIn profiles of the employees of a company')
+    add_arguments(parser)
 
+    main(parser.parse_args())
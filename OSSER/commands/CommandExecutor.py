@@ -0,0 +1,110 @@
+import concurrent.futures
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from OSSER.commands.AbstractCommand import AbstractCommand
+
+
+class CommandExecutor:
+    """
+    Strategy used by composite commands to execute their (independent) leaf children.
+    See AbstractCommand.set_executor()
+
+    Executors may hold workers: close() them once done (or use them as context managers)
+    """
+
+    def run(self, commands: Iterable['AbstractCommand']):
+        """Execute every command, return once they are all executed"""
+        raise NotImplementedError()
+
+    def close(self):
+        """Release the workers, if any"""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def create(name: str, concurrency: int = 16) -> 'CommandExecutor':
+        """
+        :param name: One of EXECUTORS (serial, threads, asyncio)
+        :param concurrency: Commands run at the same time (ignored by serial)
+        """
+        if name == 'serial':
+            return SerialExecutor()
+
+        return EXECUTORS[name](concurrency)
+
+
+class SerialExecutor(CommandExecutor):
+    """One command at a time, in order (the default)"""
+
+    def run(self, commands: Iterable['AbstractCommand']):
+        for command in commands:
+            command.execute()
+
+
+class ThreadedExecutor(CommandExecutor):
+    """Up to concurrency commands at the same time, each one in its own thread"""
+
+    def __init__(self, concurrency: int = 16):
+        self.concurrency = concurrency
+        # Started on the first run
+        self._pool = None
+
+    def run(self, commands: Iterable['AbstractCommand']):
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+
+        futures = [self._pool.submit(command.execute) for command in commands]
+
+        # Re-raise the first error, if any
+        for future in futures:
+            future.result()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+class AsyncioExecutor(CommandExecutor):
+    """
+    Up to concurrency commands at the same time, scheduled by an asyncio event loop.
+    Commands are blocking, so they still run in worker threads (released at the end of every run).
+    """
+
+    def __init__(self, concurrency: int = 16):
+        self.concurrency = concurrency
+
+    def run(self, commands: Iterable['AbstractCommand']):
+        # Imported here, asyncio alone is a good part of the CLI startup time
+        import asyncio
+
+        commands = list(commands)
+        if commands:
+            asyncio.run(self._run(commands))
+
+    async def _run(self, commands: list):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.concurrency)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            async def run_one(command):
+                async with slots:
+                    await loop.run_in_executor(pool, command.execute)
+
+            await asyncio.gather(*(run_one(command) for command in commands))
+
+
+# --executor choices
+EXECUTORS = {
+    'serial': SerialExecutor,
+    'threads': ThreadedExecutor,
+    'asyncio': AsyncioExecutor,
+}
@@ -1,15 +1,44 @@
+import argparse
+import collections
+import concurrent.futures
+import copy
 import sys
+import zlib
+from typing import Callable, Iterable, List
 
 from OSSER.commands.AbstractCommand import AbstractCommand
+from OSSER.core.Metrics import Metrics
 from OSSER.modules.DnsQuery import DnsQuery
 
 
+def _resolve_chunk(dns_query_args: DnsQuery.Args, pairs: List[tuple]):
+    """
+    Runs in a shard's worker process, see DnsQueryCommand.execute_sharded()
+    :return: ({(query, record_type): answers as text}, the pairs that failed, metrics recorded by the worker meanwhile)
+    """
+    failed = []
+
+    def on_error(query: str, record_type: str, _):
+        failed.append((query, record_type))
+
+    results = DnsQuery(args=dns_query_args).do_query_batch(pairs=pairs, on_error=on_error)
+    answers = {pair: [x.to_text() for x in res] for pair, res in results.items()}
+
+    return answers, failed, Metrics.shared().snapshot(reset=True)
+
+
 class DnsQueryCommand(AbstractCommand):
 
-    class Args(AbstractCommand.AbstractArgs):
-        def __init__(self, record_type: str, dns_query: str):
-            self.record_type = record_type.upper()
-            self.dns_query = dns_query
+    __slots__ = ('dns_query_args', 'command_args')
+
+    class Args(collections.namedtuple('Args', ('record_type', 'dns_query')), AbstractCommand.AbstractArgs):
+        """Immutable, and a plain tuple in memory"""
+
+        __slots__ = ()
+
+        def __new__(cls, record_type: str, dns_query: str):
+            # A single string per record type, instead of one per command
+            return super().__new__(cls, sys.intern(record_type.upper()), dns_query)
 
     def __init__(self, dns_query_module_args: DnsQuery.Args, command_args: Args):
         super().__init__()
@@ -23,6 +52,134 @@ class DnsQueryCommand(AbstractCommand):
                 record_type=self.command_args.record_type,
                 query=self.command_args.dns_query)
 
+    def answers(self):
+        """The results as text (ex. '10.0.0.1' for A, 'www.test.com.' for PTR)"""
+        return [x if isinstance(x, str) else x.to_text() for x in self.results or []]
+
+    def restore(self, answers: Iterable[str]):
+        """Mark as executed with the answers (as text) of a previous run, without querying anything"""
+        self._results = tuple(answers)
+        self.executed = True
+
+    def compact(self):
+        """
+        Replace the dnspython records of the results by their text, in a tuple (a few times smaller),
+        once nothing needs more than answers() or targets()
+        """
+        if self.executed:
+            self._results = tuple(self.answers())
+
+    # Position of the target name in the text of a record (ex. '10 mail.test.com.' for MX)
+    _TARGET_FIELD = {'MX': -1, 'SRV': -1, 'SOA': 0}
+
+    def targets(self):
+        """The names this record points to (ex. 'mail.test.com.' for MX), for CNAME/MX/NS/PTR/SOA/SRV queries"""
+        return [DnsQueryCommand.target_of(self.command_args.record_type, answer) for answer in self.answers()]
+
+    @staticmethod
+    def target_of(record_type: str, answer: str):
+        """The name a record (as text) of this type points to, see targets()"""
+        field = DnsQueryCommand._TARGET_FIELD.get(record_type)
+
+        return answer if field is None else answer.split()[field]
+
+    @staticmethod
+    def execute_many(commands: Iterable['DnsQueryCommand'],
+                     on_executed: Callable[['DnsQueryCommand'], None] = None,
+                     on_failed: Callable[['DnsQueryCommand'], None] = None):
+        """
+        Execute a batch of commands at once instead of one blocking query at a time.
+        Commands are grouped by module args, and each group goes through DnsQuery.do_query_batch,
+        so the queries of every record type (ex. A, AAAA and MX of the same name) are in flight together.
+        Already executed commands are left untouched.
+        A command whose query failed (see DnsQuery.Args.skip_errors) is executed, with no result.
+
+        :param on_executed: Called with each command as soon as its query completes
+        :param on_failed: Called instead of on_executed with each command whose query failed
+        """
+        batches = {}
+        for cmd in commands:
+            if not cmd.executed:
+                batches.setdefault(cmd.dns_query_args, {}).setdefault(
+                        (cmd.command_args.dns_query, cmd.command_args.record_type), []).append(cmd)
+
+        for dns_query_args, cmds_by_query in batches.items():
+
+            def on_result(query: str, record_type: str, results: list):
+                for cmd in cmds_by_query[(query, record_type)]:
+                    cmd._results = results
+                    cmd.executed = True
+
+                    if on_executed:
+                        on_executed(cmd)
+
+            def on_error(query: str, record_type: str, _):
+                for cmd in cmds_by_query[(query, record_type)]:
+                    cmd.restore(())
+
+                    if on_failed:
+                        on_failed(cmd)
+
+            DnsQuery(args=dns_query_args).do_query_batch(pairs=cmds_by_query.keys(), on_result=on_result,
+                                                         on_error=on_error)
+
+    @staticmethod
+    def shard_of(record_type: str, query: str, shards: int):
+        """
+        Stable shard of a query: by IP for PTR, by zone (last two labels) otherwise,
+        so names of the same zone always end up in the same worker (and its cache)
+        """
+        key = query if record_type == 'PTR' else '.'.join(query.rstrip('.').split('.')[-2:])
+
+        return zlib.crc32(key.lower().encode()) % shards
+
+    @staticmethod
+    def execute_sharded(commands: Iterable['DnsQueryCommand'],
+                        workers: List[concurrent.futures.ProcessPoolExecutor],
+                        on_executed: Callable[['DnsQueryCommand'], None] = None,
+                        on_failed: Callable[['DnsQueryCommand'], None] = None,
+                        chunk_size: int = 1000):
+        """
+        Same as execute_many, but the queries are partitioned over worker processes (see shard_of()),
+        each one running its own resolver loop. Results are streamed back chunk by chunk and set here,
+        so everything else (visited sets, journal, ...) stays in this process.
+
+        Workers get the module args without cache_path: the sqlite cache is not shared between processes.
+
+        :param workers: One single-process pool per shard
+        :param on_executed: Called (in this process) with each command as soon as its chunk completes
+        :param on_failed: Called instead of on_executed with each command whose query failed
+        """
+        chunks = {}
+        for cmd in commands:
+            if not cmd.executed:
+                record_type, query = cmd.command_args.record_type, cmd.command_args.dns_query
+                shard = DnsQueryCommand.shard_of(record_type, query, len(workers))
+                chunks.setdefault((shard, cmd.dns_query_args), {}).setdefault((query, record_type), []).append(cmd)
+
+        futures = {}
+        for (shard, dns_query_args), cmds_by_query in chunks.items():
+            worker_args = copy.copy(dns_query_args)
+            worker_args.cache_path = None
+
+            pairs = list(cmds_by_query)
+            for start in range(0, len(pairs), chunk_size):
+                future = workers[shard].submit(_resolve_chunk, worker_args, pairs[start:start + chunk_size])
+                futures[future] = cmds_by_query
+
+        for future in concurrent.futures.as_completed(futures):
+            answers, failed, worker_metrics = future.result()
+            Metrics.shared().merge(worker_metrics)
+            failed = set(failed)
+
+            for pair, results in answers.items():
+                for cmd in futures[future][pair]:
+                    cmd.restore(results)
+
+                    callback = on_failed if pair in failed else on_executed
+                    if callback:
+                        callback(cmd)
+
     # @staticmethod
     # def get_record_obj(record_name: str):
     #     records = {
@@ -42,24 +199,32 @@ class DnsQueryCommand(AbstractCommand):
     #        return records[record_name.upper()]
 
 
+def add_arguments(parser):
+    parser.add_argument('record_type', type=str.upper, choices=list(DnsQuery.RecordTypes.__members__))
+    parser.add_argument('dns_queries', nargs='+', metavar='query', help='name (or IP for PTR) to query')
+    DnsQuery.Args.add_arguments(parser)
+
+
 def main(args):
-    command_args = DnsQueryCommand.Args(record_type=args.record_type, dns_query=args.dns_query)
-    dns_args = DnsQuery.Args()
+    """Print one "query<TAB>record type<TAB>answer" line per answer"""
+    dns_args = DnsQuery.Args.from_arguments(args)
 
-    cmd = DnsQueryCommand(dns_query_module_args=dns_args, command_args=command_args)
-    cmd.execute()
+    cmds = [DnsQueryCommand(dns_query_module_args=dns_args,
+                            command_args=DnsQueryCommand.Args(record_type=args.record_type, dns_query=dns_query))
+            for dns_query in args.dns_queries]
 
-    if cmd.executed:
-        print("Executed successfully!")
-        print("Results:")
-        print(cmd.results)
+    def on_executed(cmd: DnsQueryCommand):
+        for answer in cmd.answers():
+            print('{}\t{}\t{}'.format(cmd.command_args.dns_query, cmd.command_args.record_type, answer))
 
-if __name__ == "__main__":
-    args = lambda: None
-    #args.record_type = sys.argv[1]
-    #args.dns_query = sys.argv[2]
+    def on_failed(cmd: DnsQueryCommand):
+        print('{}\t{}\tfailed'.format(cmd.command_args.dns_query, cmd.command_args.record_type), file=sys.stderr)
 
-    args.record_type = run_args[0]
-    args.dns_query = run_args[1]
+    DnsQueryCommand.execute_many(cmds, on_executed=on_executed, on_failed=on_failed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Query a DNS record type for one or more names')
+    add_arguments(parser)
 
-    main(args)
+    main(parser.parse_args())
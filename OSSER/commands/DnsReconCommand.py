@@ -1,9 +1,25 @@
-import sys
+import argparse
+import concurrent.futures
+import functools
+import ipaddress
+import random
+import string
 from typing import Iterable
 
-import OSSER.core.helpers as helpers
+import dns.exception
+import dns.name
+import dns.rdatatype
+import dns.reversename
+
 from OSSER.commands.AbstractCommand import AbstractCommand
+import OSSER.core.helpers as helpers
 from OSSER.commands.DnsQueryCommand import DnsQueryCommand
+from OSSER.core.DiscoveryGraph import DiscoveryGraph
+from OSSER.core.Journal import Journal
+from OSSER.core.Metrics import Metrics
+from OSSER.core.ResultStore import ResultStore
+from OSSER.core.Wordlist import Wordlist
+from OSSER.core.ZoneTrie import ZoneTrie
 from OSSER.modules.DnsQuery import DnsQuery
 
 
@@ -32,8 +48,13 @@ class DnsReconCommand(AbstractCommand):
 
         That way, if PRT query yields a new fqdn, we feed it to A query, and vice-versa
 
-        Note: The "while" is performed with recursion and composite pattern, see self.execute()
-            If it's not stable after an iteration, this command will create a new command as a child
+        Note: The "while" is a frontier loop, see self.execute()
+            Every name ever queried is kept in a visited set, and each round only queries the names
+            discovered by the previous one, so the whole thing is linear in the number of distinct names.
+            FQDNs are queried for every type of Args.record_types at once (A by default, AAAA, CNAME, MX, NS...),
+            AAAA answers get an ip6.arpa PTR query, and CNAME/MX/NS targets within Args.scope are queried in turn.
+            With Args.processes > 1 the queries of a round are sharded over worker processes, but the visited
+            sets and the fixed point detection stay here.
 
     This would catch
         -misconfigured PTR records (ex. IP changed, but PTR still points to old IP)
@@ -42,14 +63,65 @@ class DnsReconCommand(AbstractCommand):
 
     """
 
+    # Once a query's answers are in the graph, the query (a child command) keeps:
+    #   full     its dnspython records
+    #   compact  its answers as text, in a tuple
+    #   none     nothing, it is not even kept as a child (the graph has everything)
+    RETAIN_RESULTS = ('full', 'compact', 'none')
+
     class Args(AbstractCommand.AbstractArgs):
-        def __init__(self, ip_addresses: Iterable[str], fully_qualified_domain_names: Iterable[str]):
+        def __init__(self,
+                     ip_addresses: Iterable[str],
+                     fully_qualified_domain_names: Iterable[str],
+                     journal_path: str = None,
+                     resume: bool = False,
+                     processes: int = 1,
+                     reverse_zone_probe_min: int = 8,
+                     wildcard_probes: int = 2,
+                     record_types: Iterable[str] = ('A',),
+                     scope: Iterable[str] = None,
+                     zone_transfers: bool = True,
+                     wordlist_path: str = None,
+                     brute_force_zones: Iterable[str] = None,
+                     results_path: str = None,
+                     retain_results: str = 'compact'):
+            fully_qualified_domain_names = [helpers.normalize_fqdn(x) for x in fully_qualified_domain_names]
+
             self.ip_addresses = set(ip_addresses)
             # Getting all zones as well: admin.test.com -> (admin.test.com, test.com)
-            # The sum part flattens the list (each calls returns a list of possible domains,
-            # otherwise its a list of list)
-            self.fully_qualified_domain_names = set(sum([helpers.expand_fqdn(x)
-                                                         for x in fully_qualified_domain_names], []))
+            self.fully_qualified_domain_names = set(ZoneTrie(fully_qualified_domain_names))
+            # Every completed query is appended to the journal.
+            # With resume, the queries found in it are not sent again, only the outstanding work is done.
+            self.journal_path = journal_path
+            self.resume = resume
+            # Above 1, the queries are sharded over that many worker processes (for very large scopes),
+            # this process only keeps track of what was seen, see DnsQueryCommand.execute_sharded()
+            self.processes = processes
+            # Before sweeping PTRs, the reverse zones (/16 then /24, /32 then /48 for IPv6) holding at least
+            # that many pending IPs are probed: a NXDOMAIN means none of their IPs has a PTR (0 disables it)
+            self.reverse_zone_probe_min = reverse_zone_probe_min
+            # Random names resolved in every zone to detect wildcard records (0 disables it)
+            self.wildcard_probes = wildcard_probes
+            # Queried for every FQDN, all at once: A/AAAA answers are fed back as IPs (PTR, ip6.arpa included),
+            # CNAME/MX/NS/SRV/SOA targets as FQDNs
+            self.record_types = tuple(DnsQuery.record_type_of(record_type) for record_type in record_types)
+            # Zones whose CNAME/MX/NS/SRV/SOA targets are followed (the names given as arguments by default).
+            # Targets out of scope (ex. the mail provider's MX) are kept in the graph, but not queried
+            self.scope = frozenset(helpers.normalize_fqdn(x) for x in scope) if scope is not None \
+                else frozenset(fully_qualified_domain_names)
+            # Try an AXFR of the names given as arguments, of their parents, and of the zones within scope that names
+            # were found below: when it works, the names of the zone are not queried one by one.
+            # A recon of IPs only has no FQDN arguments, nor scope unless given one: it does not try any transfer
+            self.zone_transfers = zone_transfers
+            # Before the first round, every label of the wordlist is tried in every brute force zone
+            # (the names given as arguments by default), and the names that resolve are added to the frontier
+            self.wordlist_path = wordlist_path
+            self.brute_force_zones = set(helpers.normalize_fqdn(x) for x in brute_force_zones) \
+                if brute_force_zones is not None else set(fully_qualified_domain_names)
+            # Every answer is also added to this ResultStore (sqlite file) as the rounds complete
+            self.results_path = results_path
+            # What is kept of the queries once their answers are in the graph (see DnsReconCommand.RETAIN_RESULTS)
+            self.retain_results = retain_results
 
     def __init__(self,
                  dns_query_module_args: DnsQuery.Args = None,
@@ -59,132 +131,612 @@ class DnsReconCommand(AbstractCommand):
         self.command_args = command_args
         self.dns_query_module_args = dns_query_module_args
 
+        # Visited sets: everything that was (or is about to be) queried
+        self.seen_ip_addresses = set()
+        self.seen_fqdns = ZoneTrie()
 
-        # Generate sub-commands for every IPs and FQDNs
-        for ip in self.command_args.ip_addresses:
-            ip_reverse_query = DnsQueryCommand(dns_query_module_args=self.dns_query_module_args,
-                                               command_args=DnsQueryCommand.Args(record_type='PTR', dns_query=ip))
-            self.add(ip_reverse_query)
+        # Tracability: every answer received (which query found what, in which round)
+        # Names given as arguments are found in round 0, by nothing
+        self.graph = DiscoveryGraph()
+        self.rounds = 0
 
-        for fqdn in self.command_args.fully_qualified_domain_names:
-            dns_query = DnsQueryCommand(dns_query_module_args=self.dns_query_module_args,
-                                        command_args=DnsQueryCommand.Args(record_type='A', dns_query=fqdn))
+        # Reverse zones already probed, and the ones that do not exist
+        self._probed_zones = set()
+        self._dead_zones = set()
 
-            self.add(dns_query)
+        # Zones whose transfer was attempted, and the ones that were actually transferred
+        self._transfer_attempted = set()
+        self.transferred_zones = set()
 
-    @AbstractCommand.composite_command
-    def execute(self):
+        # zone -> IPs its random names resolve to (empty if the zone has no wildcard)
+        self.wildcard_zones = {}
+        # Names whose A answers only matched their zone's wildcard: not fed back to the frontier
+        self.synthetic_fqdns = set()
+
+        # Queries that failed (timeout, SERVFAIL...): taken as unanswered, and sent again by a resumed run
+        self.failed_queries = 0
+
+        # Generate sub-commands for every IPs and FQDNs (the first frontier)
+        self._add_frontier(ip_addresses=self.command_args.ip_addresses,
+                           fqdns=self.command_args.fully_qualified_domain_names,
+                           source=None)
+
+    def _add_frontier(self, ip_addresses: Iterable[str], fqdns: Iterable[str], source: DnsQueryCommand):
         """
-        This one is a recursive mindfuck, but it's awesome!
-        First, we execute all the children ourselves.
-        If the condition to stop is not met, we build a new composite command, add it to childrens, return.
-        The decorator will take care of executing the "new" children we just append.
+        Record the answers of source in the graph, and create the sub-commands for every name
+        not seen before (FQDNs parent zones included)
+        :return: The list of newly created commands
+        """
+        frontier = []
 
-        That way, we have complete tracability over what commands were executed in order to find something.
-            Ex. google.com -> 8.8.8.8 was discovered in the third pass.
-            We can find that by getting its parents.
-                (Which IP lead to google.com previously?)
+        for ip in ip_addresses:
+            self._record(source, ip)
 
-        :return:
+            if ip not in self.seen_ip_addresses:
+                self.seen_ip_addresses.add(ip)
+                frontier.append(DnsQueryCommand(dns_query_module_args=self.dns_query_module_args,
+                                                command_args=DnsQueryCommand.Args(record_type='PTR', dns_query=ip)))
+
+        for name in fqdns:
+            name = helpers.normalize_fqdn(name)
+            self._record(source, name)
+
+            for fqdn in self.seen_fqdns.insert(name):
+                if fqdn != name:
+                    self.graph.add_edge(name, fqdn, 'ZONE', self.rounds)
+
+                for record_type in self.command_args.record_types:
+                    frontier.append(DnsQueryCommand(dns_query_module_args=self.dns_query_module_args,
+                                                    command_args=DnsQueryCommand.Args(record_type=record_type,
+                                                                                      dns_query=fqdn)))
+
+        for cmd in frontier:
+            self.add(cmd)
+
+        return frontier
+
+    def _checkpoint(self, journal: Journal, cmd: DnsQueryCommand):
+        journal.append({'round': self.rounds,
+                        'type': cmd.command_args.record_type,
+                        'query': cmd.command_args.dns_query,
+                        'answers': cmd.answers()})
+
+    def _failed(self, journal: Journal, cmd: DnsQueryCommand):
+        self._failed_query(journal, cmd.command_args.dns_query, cmd.command_args.record_type)
+
+    def _failed_query(self, journal: Journal, query: str, record_type: str, err: Exception = None):
+        self.failed_queries += 1
+        Metrics.shared().inc('recon_failed_queries_total', record_type=record_type)
+
+        if journal:
+            journal.append({'round': self.rounds, 'type': record_type, 'query': query, 'failed': True})
+
+    def _lookup(self, dns_query: DnsQuery, pairs: Iterable[tuple], completed: dict, journal: Journal):
+        """
+        Resolve queries that are not part of the frontier (ex. the nameservers of the zones to transfer):
+        like the frontier's, the ones answered by a previous run are not sent again, and the others are journaled
+        :param pairs: (query, record type)
+        :return: A dict of {(query, record type): [answers as text]}
         """
+        answers = {(query, record_type): completed[(record_type, query)] for query, record_type in pairs
+                   if (record_type, query) in completed}
 
-        # print("Executing the {} children of {}".format(len([x for x in self.children() if not x.executed]), self))
-        for child in self.children():
-            child.execute()
+        def on_result(query: str, record_type: str, results: list):
+            answers[(query, record_type)] = [x.to_text() for x in results]
+            if journal:
+                journal.append({'round': self.rounds, 'type': record_type, 'query': query,
+                                'answers': answers[(query, record_type)]})
 
-        # Get all the FQDN-> IPs
-        ip_results = set([res.address for cmd in self.children()
-                      if cmd.command_args.record_type == 'A' # Get all fqdn -> ip cmd
-                      and cmd.results                        # If results are not empty
-                      for res in cmd.results])
+        pending = [pair for pair in dict.fromkeys(pairs) if pair not in answers]
+        if pending:
+            dns_query.do_query_batch(pairs=pending, on_result=on_result,
+                                     on_error=functools.partial(self._failed_query, journal))
 
-        # The [:-1] is to skip the last '.' and get a usable fqdn (test.fqdn.com.)
-        fqdn_results = [res.to_text()[:-1] for cmd in self.children()
-                        if cmd.command_args.record_type == 'PTR'
-                        and cmd.results
-                        for res in cmd.results]
+        return {pair: answers.get(pair, []) for pair in pairs}
+
+    def _zone_transfers(self, frontier: Iterable[DnsQueryCommand], transfers: dict, completed: dict,
+                        journal: Journal):
+        """
+        Look up the NS of the in scope zones of this round, and try to transfer them (all at the same time)
+        :param transfers: Zone transfers of a previous run ({zone: records}, see the journal), zones it tried are
+                          not transferred again (the content of the ones it transferred is loaded from it instead)
+        :param completed: Queries of a previous run, see _lookup()
+        :return: (commands already answered by a transfer, new commands for what the transfers found)
+        """
+        if not self.command_args.zone_transfers:
+            return set(), []
+
+        # The names given as arguments and their parents, and the zones within scope with names found below them
+        zones = [fqdn for fqdn in dict.fromkeys(cmd.command_args.dns_query for cmd in frontier
+                                                 if cmd.command_args.record_type != 'PTR')
+                 if fqdn not in self._transfer_attempted and
+                 (fqdn in self.command_args.fully_qualified_domain_names or
+                  self.in_scope(fqdn) and self.seen_fqdns.has_children(fqdn))]
+        if not zones:
+            return set(), []
+
+        self._transfer_attempted.update(zones)
+
+        # zone -> records as text ({(name, record type): [answers]}, empty if the zone could not be transferred)
+        records_by_zone = {zone: {(name, record_type): answers for name, record_type, answers in transfers[zone]}
+                           for zone in zones if zone in transfers}
+        zones = [zone for zone in zones if zone not in records_by_zone]
+
+        if zones:
+            dns_query = DnsQuery(args=self.dns_query_module_args)
+            ns_answers = self._lookup(dns_query, [(zone, 'NS') for zone in zones], completed, journal)
+            nameservers = {zone: ns_answers[(zone, 'NS')] for zone in zones
+                           if ns_answers[(zone, 'NS')]}
+
+            # Resolved here rather than by do_zone_transfers, so they are journaled too
+            address_answers = self._lookup(dns_query, [(nameserver, record_type)
+                                                       for names in nameservers.values() for nameserver in names
+                                                       for record_type in ('A', 'AAAA')], completed, journal)
+            addresses = {zone: [address for nameserver in names for record_type in ('A', 'AAAA')
+                                for address in address_answers[(nameserver, record_type)]]
+                         for zone, names in nameservers.items()}
+
+            transferred = dns_query.do_zone_transfers(addresses)
+            for zone in zones:
+                records = DnsReconCommand._zone_records(transferred[zone]) if transferred.get(zone) else {}
+                records_by_zone[zone] = records
+
+                if journal:
+                    journal.append({'round': self.rounds, 'type': 'AXFR', 'query': zone,
+                                    'answers': [[name, record_type, answers]
+                                                for (name, record_type), answers in records.items()]})
+
+        answered, new_cmds = set(), []
+        for zone, records in records_by_zone.items():
+            if records:
+                self.transferred_zones.add(zone)
+                zone_answered, zone_cmds = self._load_zone(zone, records, frontier, journal)
+                answered |= zone_answered
+                new_cmds += zone_cmds
+
+        return answered, new_cmds
+
+    @staticmethod
+    def _zone_records(transferred):
+        """:return: The records of a dns.zone.Zone as text: {(name, record type): [answers]}"""
+        return {(helpers.normalize_fqdn(name.to_text()), dns.rdatatype.to_text(rdataset.rdtype)):
+                [x.to_text() for x in rdataset]
+                for name, rdataset in transferred.iterate_rdatasets()}
+
+    def _load_zone(self, zone: str, records: dict, frontier: Iterable[DnsQueryCommand], journal: Journal):
+        """
+        Bulk-load the records of a transferred zone in the graph, mark its names as seen, and answer the queries
+        of this round for them with the content of the zone
+        :return: (commands answered, new commands for the IPs and the out of zone names it points to)
+        """
+        edges, ip_addresses, fqdns, ptr_fqdns = [], [], [], []
+
+        # Names of the zone, in the order of their first record
+        names = dict.fromkeys(name for name, _ in records)
+        for name in names:
+            if name != zone:
+                edges.append((zone, name, 'AXFR'))
+            self.seen_fqdns.insert(name)
+
+        for (name, record_type), answers in records.items():
+            if record_type in ('A', 'AAAA'):
+                for address in answers:
+                    edges.append((name, address, record_type))
+                    ip_addresses.append(address)
+            elif record_type == 'PTR':
+                # A reverse zone: like a PTR query, the edge goes from the IP, and its targets are always followed
+                try:
+                    address = dns.reversename.to_address(dns.name.from_text(name))
+                except (dns.exception.SyntaxError, ValueError):
+                    continue
+
+                for answer in answers:
+                    target = helpers.normalize_fqdn(answer)
+                    edges.append((address, target, record_type))
+                    ptr_fqdns.append(target)
+            elif record_type in DnsQuery.Answer.TARGET_ATTRIBUTES:
+                for answer in answers:
+                    target = helpers.normalize_fqdn(DnsQueryCommand.target_of(record_type, answer))
+                    edges.append((name, target, record_type))
+                    fqdns.append(target)
+
+        self.graph.add_edges(edges, self.rounds)
+        Metrics.shared().inc('recon_transferred_names_total', len(records))
+
+        # Queries of this round for names of the zone: the transfer already answered them
+        answered = set()
+        for cmd in frontier:
+            if cmd.command_args.record_type != 'PTR' and not cmd.executed and cmd.command_args.dns_query in names:
+                cmd.restore(records.get((cmd.command_args.dns_query, cmd.command_args.record_type), []))
+                answered.add(cmd)
+
+                if journal:
+                    self._checkpoint(journal, cmd)
+
+        # Names of the zone are seen now, only the ones out of the zone (and the IPs) get new commands
+        return answered, self._add_frontier(ip_addresses=ip_addresses, fqdns=ptr_fqdns, source=None) + \
+            self._follow(None, fqdns)
+
+    # Labels to strip from a reverse name to get its enclosing zones, largest first
+    _REVERSE_ZONE_LEVELS = {4: (2, 1), 6: (24, 20)}
+
+    def _probe_reverse_zones(self, frontier: Iterable[DnsQueryCommand], completed: dict, journal: Journal):
+        """
+        Find the reverse zones that do not exist at all, and answer the PTR queries below them without sending them.
+        Sweeps then cost one query per populated IP (plus a few probes), not one per IP in range.
+        Every probe is journaled ({'type': 'PROBE', 'answers': whether the zone exists}), and not sent again on resume
+        """
+        ptr_cmds = [cmd for cmd in frontier if cmd.command_args.record_type == 'PTR' and not cmd.executed]
+        if not ptr_cmds or self.command_args.reverse_zone_probe_min <= 0:
+            return
+
+        dns_query = DnsQuery(args=self.dns_query_module_args)
+
+        reverse_names = {}
+        for cmd in ptr_cmds:
+            try:
+                address = ipaddress.ip_address(cmd.command_args.dns_query)
+            except ValueError:
+                continue
+
+            reverse_names[cmd] = (address.version, address.reverse_pointer.split('.'))
+
+        # One level at a time: no need to probe the /24s of a /16 that does not exist
+        for level in range(2):
+            pending = {}
+            for version, labels in reverse_names.values():
+                zone = '.'.join(labels[DnsReconCommand._REVERSE_ZONE_LEVELS[version][level]:]) + '.'
+                if zone not in self._probed_zones and not self._in_dead_zone(zone):
+                    pending[zone] = pending.get(zone, 0) + 1
+
+            zones = [zone for zone, count in pending.items() if count >= self.command_args.reverse_zone_probe_min]
+            self._probed_zones.update(zones)
+
+            exists = {zone: completed[('PROBE', zone)] for zone in zones if ('PROBE', zone) in completed}
+            probes = [zone for zone in zones if zone not in exists]
+            dns_query.do_query_many(queries=probes, record_type='SOA')
+
+            for zone in probes:
+                exists[zone] = not dns_query.known_nonexistent(zone)
+                if journal:
+                    journal.append({'round': self.rounds, 'type': 'PROBE', 'query': zone, 'answers': exists[zone]})
+
+            self._dead_zones.update(zone for zone, zone_exists in exists.items() if not zone_exists)
+
+        for cmd, (_, labels) in reverse_names.items():
+            name = '.'.join(labels) + '.'
+            if self._in_dead_zone(name) or dns_query.known_nonexistent(name):
+                cmd.restore([])
+                Metrics.shared().inc('recon_ptr_skipped_total')
+
+    def _in_dead_zone(self, name: str):
+        """Is name one of the reverse zones that do not exist, or below one?"""
+        labels = name.rstrip('.').split('.')
+
+        return any('.'.join(labels[i:]) + '.' in self._dead_zones for i in range(len(labels)))
+
+    @staticmethod
+    def _zone_of(fqdn: str):
+        """Zone a wildcard answering fqdn would be in (a.test.com -> test.com), None for TLDs"""
+        parts = fqdn.rstrip('.').split('.', 1)
+        return parts[1] if len(parts) == 2 and '.' in parts[1] else None
+
+    def _probe_wildcards(self, frontier: Iterable[DnsQueryCommand], completed: dict, journal: Journal):
+        """Resolve random names in the zones of this round's A/AAAA queries, once per zone"""
+        self._probe_wildcard_zones((DnsReconCommand._zone_of(cmd.command_args.dns_query) for cmd in frontier
+                                    if cmd.command_args.record_type in ('A', 'AAAA')), completed, journal)
+
+    def _probe_wildcard_zones(self, zones: Iterable[str], completed: dict, journal: Journal):
+        """
+        Every zone's probes are journaled ({'type': 'WILDCARD', 'answers': the IPs of its random names}),
+        and not sent again on resume (the names are random, the journal has no answer for the new ones)
+        """
+        if self.command_args.wildcard_probes <= 0:
+            return
 
-        # Get all possible new FQDN
-        # 'sum' is to flatten list of list (results of expand_fqdn is list)
-        fqdn_results = set(sum([helpers.expand_fqdn(x) for x in fqdn_results], []))
+        zones = [zone for zone in set(zones) if zone and zone not in self.wildcard_zones]
+        for zone in zones:
+            if ('WILDCARD', zone) in completed:
+                self.wildcard_zones[zone] = frozenset(completed[('WILDCARD', zone)])
 
-        # Getting all previously queried IPs using command args
-        previous_ip = set([cmd.command_args.dns_query for cmd in self.children()
-                       if cmd.command_args.record_type == 'PTR'])
+        zones = [zone for zone in zones if zone not in self.wildcard_zones]
+        if not zones:
+            return
 
-        # Getting all previously queried FQDNs using command args
-        previous_fqdn = set([cmd.command_args.dns_query for cmd in self.children()
-                       if cmd.command_args.record_type == 'A'])
+        probes = {}
+        for zone in zones:
+            for _ in range(self.command_args.wildcard_probes):
+                label = ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(16))
+                probes['{}.{}.'.format(label, zone)] = zone
 
-        if ip_results != previous_ip or not \
-            previous_fqdn.issuperset(fqdn_results):
+        record_types = [record_type for record_type in ('A', 'AAAA') if record_type in self.command_args.record_types]
+        answers = DnsQuery(args=self.dns_query_module_args).do_query_types_many(queries=probes,
+                                                                               record_types=record_types)
 
-            new_command = DnsReconCommand(
-                    command_args=DnsReconCommand.Args(ip_addresses=ip_results.difference(previous_ip),
-                                                      fully_qualified_domain_names=fqdn_results.difference(previous_fqdn)),
-                    dns_query_module_args=self.dns_query_module_args)
+        for zone in zones:
+            self.wildcard_zones[zone] = frozenset()
+        for probe, answer in answers.items():
+            self.wildcard_zones[probes[probe]] |= frozenset(answer.addresses())
 
-            # Adding already executed children so we can keep a track of previous commands run
-            for c in self.children():
-                new_command.add(c)
+        if journal:
+            for zone in zones:
+                journal.append({'round': self.rounds, 'type': 'WILDCARD', 'query': zone,
+                                'answers': sorted(self.wildcard_zones[zone])})
 
-            self.add(new_command)
+    def _is_synthetic(self, cmd: DnsQueryCommand):
+        """True if every answer of this A/AAAA query is one of its zone's wildcard answers"""
+        return self._matches_wildcard(cmd.command_args.dns_query, cmd.answers())
 
-    @property
-    def results(self):
+    def _matches_wildcard(self, fqdn: str, addresses: list):
+        wildcard = self.wildcard_zones.get(DnsReconCommand._zone_of(fqdn))
+
+        return bool(wildcard) and bool(addresses) and wildcard.issuperset(addresses)
+
+    def _brute_force(self, completed: dict, journal: Journal):
         """
-        Get a dict of ip-fqdn by crawling depth-first throught childrens
-        :return:
+        Resolve label.zone for every label of the wordlist and every brute force zone, streaming the names
+        to the resolver (no command is created for the ones that do not resolve)
+        :param completed: Journal entries of a previous run, zones brute-forced by it are not tried again
+        :return: The new commands for the names that resolved
         """
-        results = {}
-        for c in self.children():
-            # We know the only two types of commands in this composite are either
-            # another DnsReconCommand or some DnsQueryCommand
+        if not self.command_args.wordlist_path:
+            return []
 
-            # This is sketchy...
-            if type(c) is DnsReconCommand:
-                results += c.results
-            else:
-                pass
+        zones = sorted(self.command_args.brute_force_zones)
+        # Hits must not be the zone's wildcard
+        self._probe_wildcard_zones(zones, completed, journal)
 
+        dns_query = DnsQuery(args=self.dns_query_module_args)
+        frontier = []
 
+        with Wordlist(self.command_args.wordlist_path) as wordlist:
+            for zone in zones:
+                hits = completed.get(('BRUTE', zone))
+                if hits is None:
+                    hits = []
 
+                    def on_result(fqdn: str, results: list):
+                        addresses = [x.address for x in results]
+                        if addresses and not self._matches_wildcard(fqdn, addresses):
+                            hits.append(fqdn)
 
-def print_children(command: AbstractCommand):
-    """
-    Depth first print (print leafs up to the top)
-    """
-    for c in command.children():
-        print_children(c)
+                    tried = dns_query.do_query_stream(queries=(fqdn for fqdn in wordlist.names(zone)
+                                                               if fqdn not in self.seen_fqdns),
+                                                      record_type='A',
+                                                      on_result=on_result)
+                    Metrics.shared().inc('recon_brute_force_names_total', tried)
 
-    print(command, command.command_args)
+                    if journal:
+                        journal.append({'round': self.rounds, 'type': 'BRUTE', 'query': zone, 'answers': hits})
 
-def main(args):
-    command_args = DnsReconCommand.Args(ip_addresses=args.ip_addresses,
-                                        fully_qualified_domain_names=args.fully_qualified_domain_names)
-    dns_args = DnsQuery.Args()
+                Metrics.shared().inc('recon_brute_force_hits_total', len(hits))
+                self.graph.add_edges(((zone, fqdn, 'BRUTE') for fqdn in hits), self.rounds)
+                frontier += self._add_frontier(ip_addresses=[], fqdns=hits, source=None)
 
-    cmd = DnsReconCommand(dns_query_module_args=dns_args, command_args=command_args)
-    cmd.execute()
+        return frontier
+
+    def in_scope(self, fqdn: str):
+        """Is fqdn one of the Args.scope zones, or below one?"""
+        labels = helpers.normalize_fqdn(fqdn).split('.')
 
-    if cmd.executed:
-        print("Executed successfully!")
-        print("Results:")
-        print(cmd.results)
-        print_children(cmd)
+        return any('.'.join(labels[i:]) in self.command_args.scope for i in range(len(labels)))
 
+    def _follow(self, source: DnsQueryCommand, fqdns: Iterable[str]):
+        """
+        Add the targets within scope to the frontier, only record the others in the graph
+        :return: The list of newly created commands
+        """
+        followed = []
+        for fqdn in fqdns:
+            if self.in_scope(fqdn):
+                followed.append(fqdn)
+            else:
+                self._record(source, helpers.normalize_fqdn(fqdn))
+                Metrics.shared().inc('recon_out_of_scope_total')
 
-run_args = [
+        return self._add_frontier(ip_addresses=[], fqdns=followed, source=source)
 
-]
+    def _record(self, source: DnsQueryCommand, answer: str):
+        if source is None:
+            self.graph.add_node(answer)
+        else:
+            self.graph.add_edge(source.command_args.dns_query, answer, source.command_args.record_type, self.rounds)
 
+    @AbstractCommand.composite_command
+    def execute(self):
+        """
+        Frontier loop: every round resolves (all at once) the names discovered by the previous round.
+        Answers that were already seen are dropped, the others become the next frontier.
+        Stops when a round discovers nothing new.
+
+        That way, we have complete tracability over what commands were executed in order to find something.
+            Ex. google.com -> 8.8.8.8 was discovered in the third pass.
+            We can find that with self.trace('8.8.8.8')
+                (Which IP lead to google.com previously?)
+
+        :return:
+        """
+        frontier = [child for child in self.children() if not child.executed]
+
+        completed, transfers, journal = {}, {}, None
+        if self.command_args.journal_path:
+            if self.command_args.resume:
+                # Queries that failed are left out, so they are sent again.
+                # Zone transfers tried before are kept apart, by zone (see _zone_transfers)
+                for entry in Journal.replay(self.command_args.journal_path):
+                    if entry['type'] == 'AXFR':
+                        transfers[entry['query']] = entry['answers']
+                    elif not entry.get('failed'):
+                        completed[(entry['type'], entry['query'])] = entry['answers']
+
+            journal = Journal(self.command_args.journal_path, resume=self.command_args.resume)
+
+        on_executed = functools.partial(self._checkpoint, journal) if journal else None
+        on_failed = functools.partial(self._failed, journal)
+
+        store, run, stored_edges = None, None, 0
+        if self.command_args.results_path:
+            store = ResultStore.shared(self.command_args.results_path)
+            run = store.begin_run('dns-recon', {'ip_addresses': self.command_args.ip_addresses,
+                                                'fqdns': self.command_args.fully_qualified_domain_names})
+
+        # One process per shard, so a given zone (or IP) is always resolved by the same worker
+        workers = [concurrent.futures.ProcessPoolExecutor(max_workers=1)
+                   for _ in range(self.command_args.processes)] if self.command_args.processes > 1 else None
+
+        try:
+            frontier += self._brute_force(completed, journal)
+
+            while frontier:
+                self.rounds += 1
+                # How fast the fixed point is reached
+                Metrics.shared().set('recon_round_size', len(frontier), round=self.rounds)
+
+                # Queries completed by a previous run get their answers back from the journal
+                DnsReconCommand._restore(frontier, completed)
+
+                answered, transfer_cmds = self._zone_transfers(frontier, transfers, completed, journal)
+                DnsReconCommand._restore(transfer_cmds, completed)
+                frontier = [cmd for cmd in frontier if cmd not in answered] + transfer_cmds
+
+                self._probe_reverse_zones(frontier, completed, journal)
+                self._probe_wildcards(frontier, completed, journal)
+
+                # All the remaining PTR and A queries of this round are resolved concurrently
+                if workers:
+                    DnsQueryCommand.execute_sharded(frontier, workers=workers, on_executed=on_executed,
+                                                    on_failed=on_failed)
+                else:
+                    DnsQueryCommand.execute_many(frontier, on_executed=on_executed, on_failed=on_failed)
+
+                next_frontier = []
+                for cmd in frontier:
+                    if self.command_args.retain_results != 'full':
+                        cmd.compact()
+
+                    if cmd.command_args.record_type in ('A', 'AAAA'):
+                        if self._is_synthetic(cmd):
+                            # Any name in this zone resolves to that, it tells nothing about this name
+                            self.synthetic_fqdns.add(cmd.command_args.dns_query)
+                            Metrics.shared().inc('recon_wildcard_answers_total')
+                            continue
+
+                        next_frontier += self._add_frontier(ip_addresses=cmd.answers(), fqdns=[], source=cmd)
+                    elif cmd.command_args.record_type == 'PTR':
+                        # Parent zones are added as well by seen_fqdns
+                        fqdns = [fqdn for fqdn in cmd.targets() if fqdn.strip('.')]
+                        next_frontier += self._add_frontier(ip_addresses=[], fqdns=fqdns, source=cmd)
+                    else:
+                        # CNAME, MX... often point to a provider's zone, only followed within scope
+                        next_frontier += self._follow(cmd, (fqdn for fqdn in cmd.targets() if fqdn.strip('.')))
+
+                frontier = next_frontier
+
+                if self.command_args.retain_results == 'none':
+                    self.prune()
+
+                if store:
+                    store.add_dns_records(run, self.graph.edges(start=stored_edges))
+                    stored_edges = self.graph.edge_count()
+
+            Metrics.shared().set('recon_rounds', self.rounds)
+            Metrics.shared().set('recon_discovered', len(self.graph))
+        finally:
+            for worker in workers or []:
+                worker.shutdown()
+
+            if journal:
+                journal.close()
+
+            if store:
+                # What the last round (or a round that failed) found
+                store.add_dns_records(run, self.graph.edges(start=stored_edges))
+                store.finish_run(run)
+
+    @staticmethod
+    def _restore(commands: Iterable[DnsQueryCommand], completed: dict):
+        for cmd in commands:
+            answers = completed.get((cmd.command_args.record_type, cmd.command_args.dns_query))
+            if answers is not None:
+                cmd.restore(answers)
+
+    def trace(self, name: str):
+        """
+        Get the chain of answers that lead to this name, starting from one of the names given as arguments
+        :return: A list of (src, record_type, dst, round), empty if the name was given as argument
+        """
+        return self.graph.trace(name)
+
+    @property
+    def results(self):
+        """
+        Get every discovered IP and FQDN, and how they were found
+        :return: A DiscoveryGraph
+        """
+        return self.graph
+
+
+def _record_types(text: str):
+    try:
+        return [DnsQuery.record_type_of(record_type) for record_type in text.split(',')]
+    except NotImplementedError as err:
+        raise argparse.ArgumentTypeError(str(err))
+
+
+def add_arguments(parser):
+    parser.add_argument('targets', nargs='+', metavar='target', help='IP or FQDN to start from')
+    parser.add_argument('--record-types', type=_record_types, default=['A'],
+                        help='queried for every FQDN, comma separated (default: A, ex. A,AAAA,CNAME,MX,NS)')
+    parser.add_argument('--scope', action='append', metavar='ZONE',
+                        help='zone whose CNAME/MX/NS targets are followed, can be repeated (default: the FQDN targets)')
+    parser.add_argument('--journal', dest='journal_path', metavar='PATH',
+                        help='append every completed query to this file (an existing one is kept as PATH.1, ...)')
+    parser.add_argument('--resume', action='store_true', help="don't query again what is in the journal")
+    parser.add_argument('--results', dest='results_path', metavar='PATH',
+                        help='also add every answer to this sqlite file (see python -m OSSER results)')
+    parser.add_argument('--processes', type=int, default=1, help='shard the queries over worker processes')
+    parser.add_argument('--retain-results', choices=DnsReconCommand.RETAIN_RESULTS, default='compact',
+                        help='what is kept in memory of the answered queries (the graph has everything)')
+    parser.add_argument('--no-zone-transfers', dest='zone_transfers', action='store_false')
+    parser.add_argument('--wildcard-probes', type=int, default=2, help='random names per zone, 0 disables it')
+    parser.add_argument('--wordlist', dest='wordlist_path', metavar='PATH', help='subdomains to brute force')
+    parser.add_argument('--brute-force-zone', dest='brute_force_zones', action='append', metavar='ZONE',
+                        help='zone to brute force, can be repeated (default: the FQDN targets)')
+    DnsQuery.Args.add_arguments(parser)
 
-if __name__ == "__main__":
-    args = lambda: None
-    #args.record_type = sys.argv[1]
-    #args.dns_query = sys.argv[2]
 
-    args.ip_addresses = run_args[0]
-    args.fully_qualified_domain_names = run_args[1]
+def main(args):
+    """Print one "src<TAB>record type<TAB>dst<TAB>round" line per discovered edge"""
+    ip_addresses, fqdns = [], []
+    for target in args.targets:
+        try:
+            ip_addresses.append(str(ipaddress.ip_address(target)))
+        except ValueError:
+            fqdns.append(target)
+
+    command_args = DnsReconCommand.Args(ip_addresses=ip_addresses,
+                                        fully_qualified_domain_names=fqdns,
+                                        journal_path=args.journal_path,
+                                        resume=args.resume,
+                                        processes=args.processes,
+                                        wildcard_probes=args.wildcard_probes,
+                                        record_types=args.record_types,
+                                        scope=args.scope,
+                                        zone_transfers=args.zone_transfers,
+                                        wordlist_path=args.wordlist_path,
+                                        brute_force_zones=args.brute_force_zones,
+                                        results_path=args.results_path,
+                                        retain_results=args.retain_results)
+
+    cmd = DnsReconCommand(dns_query_module_args=DnsQuery.Args.from_arguments(args), command_args=command_args)
+    cmd.execute()
+
+    for edge in cmd.results.edges():
+        print('\t'.join(map(str, edge)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Resolve IPs <-> FQDNs back and forth until nothing new is found')
+    add_arguments(parser)
 
-    main(args)
+    main(parser.parse_args())
@@ -0,0 +1,181 @@
+from array import array
+from typing import Iterable
+
+
+class DiscoveryGraph:
+    """
+    What a recon found, as a graph of "query of src (record type) answered dst" edges between names and IPs.
+
+    Names and IPs are interned as integer ids, and edges are stored in parallel arrays (a few bytes each)
+    instead of Python objects:
+        src, dst      node ids
+        record type   index in RECORD_TYPES
+        round         fixed-point round in which the answer was received
+
+    The source query of an edge is (src, record type).
+    Every node also remembers the first edge that lead to it, so "what lead to this node" is a single lookup,
+    and per-node adjacency arrays make "IPs of FQDN" and "FQDNs of IP" proportional to the answer size.
+    """
+
+    # ZONE is not a record type: it links a name to its parent zones (a.test.com -> test.com)
+    # AXFR links a zone to the names found by transferring it, BRUTE to the ones found with a wordlist
+    RECORD_TYPES = ('A', 'AAAA', 'PTR', 'CNAME', 'MX', 'NS', 'SOA', 'SRV', 'ZONE', 'AXFR', 'BRUTE')
+    _RECORD_CODES = {record_type: code for code, record_type in enumerate(RECORD_TYPES)}
+
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+
+        # Per node: edge that discovered it (-1 for names given as arguments), round it was discovered in
+        self._origin = array('i')
+        self._node_round = array('H')
+        # Per node: ids of the edges going out of / coming into it
+        self._out = []
+        self._in = []
+
+        self._src = array('I')
+        self._dst = array('I')
+        self._record_type = array('B')
+        self._round = array('H')
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return '<DiscoveryGraph: {} nodes, {} edges>'.format(len(self._names), len(self._src))
+
+    def __contains__(self, name: str):
+        return name in self._ids
+
+    def nodes(self):
+        return iter(self._names)
+
+    def _intern(self, name: str, discovery_round: int):
+        node = self._ids.get(name)
+        if node is None:
+            node = len(self._names)
+            self._ids[name] = node
+            self._names.append(name)
+            self._origin.append(-1)
+            self._node_round.append(discovery_round)
+            self._out.append(array('I'))
+            self._in.append(array('I'))
+
+        return node
+
+    def add_node(self, name: str, discovery_round: int = 0):
+        """Add a name that was not found through a query (ex. given as argument)"""
+        self._intern(name, discovery_round)
+
+    def add_edge(self, src: str, dst: str, record_type: str, discovery_round: int):
+        """
+        Record that the record_type query of src answered dst
+        :return: True if dst was not known before
+        """
+        is_new = dst not in self._ids
+
+        src_node = self._intern(src, discovery_round)
+        dst_node = self._intern(dst, discovery_round)
+
+        edge = len(self._src)
+        self._src.append(src_node)
+        self._dst.append(dst_node)
+        self._record_type.append(DiscoveryGraph._RECORD_CODES[record_type])
+        self._round.append(discovery_round)
+
+        self._out[src_node].append(edge)
+        self._in[dst_node].append(edge)
+
+        if is_new and src_node != dst_node:
+            self._origin[dst_node] = edge
+
+        return is_new
+
+    def add_edges(self, edges: Iterable[tuple], discovery_round: int):
+        """
+        Same as add_edge for a whole batch of (src, dst, record_type), ex. the content of a zone transfer
+        :return: The number of names that were not known before
+        """
+        first_edge, first_node = len(self._src), len(self._names)
+        src, dst, record_types = array('I'), array('I'), array('B')
+
+        for src_name, dst_name, record_type in edges:
+            is_new = dst_name not in self._ids
+            src_node = self._intern(src_name, discovery_round)
+            dst_node = self._intern(dst_name, discovery_round)
+
+            edge = first_edge + len(src)
+            src.append(src_node)
+            dst.append(dst_node)
+            record_types.append(DiscoveryGraph._RECORD_CODES[record_type])
+
+            self._out[src_node].append(edge)
+            self._in[dst_node].append(edge)
+
+            if is_new and src_node != dst_node:
+                self._origin[dst_node] = edge
+
+        self._src.extend(src)
+        self._dst.extend(dst)
+        self._record_type.extend(record_types)
+        self._round.extend(array('H', [discovery_round]) * len(src))
+
+        return len(self._names) - first_node
+
+    def _edge(self, edge: int):
+        return (self._names[self._src[edge]],
+                DiscoveryGraph.RECORD_TYPES[self._record_type[edge]],
+                self._names[self._dst[edge]],
+                self._round[edge])
+
+    def edges(self, start: int = 0):
+        """:return: An iterator of (src, record_type, dst, round), from the start-th edge added (see edge_count())"""
+        return (self._edge(edge) for edge in range(start, len(self._src)))
+
+    def edge_count(self):
+        return len(self._src)
+
+    def answers(self, name: str, record_types=None):
+        """:return: The names answered by the queries of name (optionally only for some record types)"""
+        codes = None if record_types is None else set(DiscoveryGraph._RECORD_CODES[x] for x in record_types)
+
+        return [self._names[self._dst[edge]] for edge in self._out[self._ids[name]]
+                if codes is None or self._record_type[edge] in codes]
+
+    def queried_by(self, name: str, record_types=None):
+        """:return: The names whose queries answered name (optionally only for some record types)"""
+        codes = None if record_types is None else set(DiscoveryGraph._RECORD_CODES[x] for x in record_types)
+
+        return [self._names[self._src[edge]] for edge in self._in[self._ids[name]]
+                if codes is None or self._record_type[edge] in codes]
+
+    def ips_of(self, fqdn: str):
+        return set(self.answers(fqdn, ('A', 'AAAA')))
+
+    def fqdns_of(self, ip: str):
+        """FQDNs pointing to this IP, and the ones its PTR points to"""
+        return set(self.queried_by(ip, ('A', 'AAAA'))).union(self.answers(ip, ('PTR',)))
+
+    def round_of(self, name: str):
+        return self._node_round[self._ids[name]]
+
+    def origin(self, name: str):
+        """
+        What lead to this name
+        :return: (src, record_type, dst, round) of the edge that discovered it, None if it was given as argument
+        """
+        edge = self._origin[self._ids[name]]
+        return None if edge < 0 else self._edge(edge)
+
+    def trace(self, name: str):
+        """
+        :return: The chain of edges that lead to this name, starting from one of the names given as arguments
+        """
+        chain = []
+
+        origin = self.origin(name)
+        while origin is not None:
+            chain.insert(0, origin)
+            origin = self.origin(origin[0])
+
+        return chain
@@ -0,0 +1,68 @@
+import json
+import os
+import threading
+
+
+class Journal:
+    """
+    Append-only checkpoint file (one JSON object per line) of the work completed so far.
+
+    Every entry is flushed as soon as it is written, so a run that dies only loses the work in flight,
+    and replay() gives back every complete entry (a line cut in half by a crash is ignored).
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        """
+        :param resume: Keep the existing entries. Otherwise the journal starts empty, and the one of a previous run
+                       (if any) is kept aside as path.1 (path.2 if there is already a path.1, ...), see rotated_path
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        self.rotated_path = None
+        if not resume and os.path.exists(path) and os.path.getsize(path) > 0:
+            self.rotated_path = Journal._rotate(path)
+
+        self._file = open(path, 'a' if resume else 'w')
+
+        # Don't glue the first new entry to a line cut in half by a crash
+        if resume and self._file.tell() > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._file.write('\n')
+
+    @staticmethod
+    def _rotate(path: str):
+        """Move a journal to the first free path.<n>, :return: Its new path"""
+        n = 1
+        while os.path.exists('{}.{}'.format(path, n)):
+            n += 1
+
+        os.replace(path, '{}.{}'.format(path, n))
+        return '{}.{}'.format(path, n)
+
+    @staticmethod
+    def replay(path: str):
+        """:return: An iterator of every complete entry of the journal, in order"""
+        if not os.path.exists(path):
+            return
+
+        with open(path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Half-written line, the run died while writing it
+                    continue
+
+    def append(self, entry: dict):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
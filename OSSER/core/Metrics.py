@@ -0,0 +1,209 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms recorded by the commands and modules during a run.
+
+    Every metric has a name and optional labels (ex. record_type='A'), and the whole thing can be written
+    at the end of the run as a JSON summary and/or a Prometheus text file (node_exporter textfile format).
+
+    Usage:
+        metrics = Metrics.shared()
+        metrics.inc('dns_queries_total', record_type='A', outcome='nxdomain')
+        with metrics.timer('command_seconds', command='DnsReconCommand'):
+            ...
+        metrics.write(json_path='metrics.json', prometheus_path='osser.prom')
+    """
+
+    # Seconds, from a cached DNS answer to a slow Bing page
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    PROMETHEUS_PREFIX = 'osser_'
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @staticmethod
+    def shared() -> 'Metrics':
+        """Get (or create) the process-wide metrics, the ones every command and module records into"""
+        with Metrics._shared_lock:
+            if Metrics._shared is None:
+                Metrics._shared = Metrics()
+
+            return Metrics._shared
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+
+        # (name, sorted label items) -> value
+        self._counters = {}
+        self._gauges = {}
+        # (name, sorted label items) -> [count per bucket (+Inf last), sum, count]
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = Metrics._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[Metrics._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = Metrics._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+            histogram[0][bisect.bisect_left(self.buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the time spent in the with block (even if it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self, reset: bool = False):
+        """:return: The raw metrics (picklable), to be merged in another process' metrics, see merge()"""
+        with self._lock:
+            state = (dict(self._counters), dict(self._gauges),
+                     {key: [list(h[0]), h[1], h[2]] for key, h in self._histograms.items()})
+            if reset:
+                self._counters.clear()
+                self._gauges.clear()
+                self._histograms.clear()
+
+            return state
+
+    def merge(self, snapshot: tuple):
+        """Add the metrics recorded elsewhere (ex. a worker process) to these ones"""
+        counters, gauges, histograms = snapshot
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+
+            self._gauges.update(gauges)
+
+            for key, (counts, total, count) in histograms.items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+                histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+                histogram[1] += total
+                histogram[2] += count
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _label_text(labels: tuple):
+        if not labels:
+            return ''
+
+        return '{' + ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"'))
+                              for k, v in labels) + '}'
+
+    def _quantile(self, histogram: list, q: float):
+        """Upper bound of the bucket holding the q-th quantile (the last bucket has none, so its lower bound)"""
+        counts, _, count = histogram
+        rank, seen = q * count, 0
+        for i, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[min(i, len(self.buckets) - 1)]
+
+        return self.buckets[-1]
+
+    def summary(self):
+        """
+        :return: A JSON-able dict of {'counters': {...}, 'gauges': {...}, 'histograms': {...}},
+                 keyed by name{label="value",...}, histograms summarized as count, sum, mean and p50/p90/p99
+        """
+        with self._lock:
+            return {
+                'counters': {name + Metrics._label_text(labels): value
+                             for (name, labels), value in sorted(self._counters.items())},
+                'gauges': {name + Metrics._label_text(labels): value
+                           for (name, labels), value in sorted(self._gauges.items())},
+                'histograms': {name + Metrics._label_text(labels): {
+                                   'count': histogram[2],
+                                   'sum': histogram[1],
+                                   'mean': histogram[1] / histogram[2],
+                                   'p50': self._quantile(histogram, 0.5),
+                                   'p90': self._quantile(histogram, 0.9),
+                                   'p99': self._quantile(histogram, 0.99)}
+                               for (name, labels), histogram in sorted(self._histograms.items())},
+            }
+
+    def to_prometheus(self):
+        """:return: The metrics in the Prometheus text exposition format"""
+        lines, typed = [], set()
+
+        def type_line(name: str, metric_type: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append('# TYPE {} {}'.format(name, metric_type))
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                name = Metrics.PROMETHEUS_PREFIX + name
+                type_line(name, 'counter')
+                lines.append('{}{} {}'.format(name, Metrics._label_text(labels), value))
+
+            for (name, labels), value in sorted(self._gauges.items()):
+                name = Metrics.PROMETHEUS_PREFIX + name
+                type_line(name, 'gauge')
+                lines.append('{}{} {}'.format(name, Metrics._label_text(labels), value))
+
+            for (name, labels), (counts, total, count) in sorted(self._histograms.items()):
+                name = Metrics.PROMETHEUS_PREFIX + name
+                type_line(name, 'histogram')
+
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append('{}_bucket{} {}'.format(name, Metrics._label_text(labels + (('le', str(bound)),)),
+                                                         cumulative))
+
+                lines.append('{}_sum{} {}'.format(name, Metrics._label_text(labels), total))
+                lines.append('{}_count{} {}'.format(name, Metrics._label_text(labels), count))
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path: str = None, prometheus_path: str = None):
+        if json_path:
+            with open(json_path, 'w') as f:
+                json.dump(self.summary(), f, indent=2)
+
+        if prometheus_path:
+            # Textfile collectors may read it at any time: never expose a half written file
+            with open(prometheus_path + '.tmp', 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(prometheus_path + '.tmp', prometheus_path)
+
+    def write_at_exit(self, json_path: str = None, prometheus_path: str = None):
+        """Write the metrics once the run is over (even if it failed)"""
+        atexit.register(self.write, json_path=json_path, prometheus_path=prometheus_path)
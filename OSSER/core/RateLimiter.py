@@ -0,0 +1,78 @@
+import threading
+import time
+import warnings
+
+
+class RateLimiter:
+    """
+    Token bucket (rate requests/second, up to burst at once) shared by everything using the same key.
+
+    The rate adapts to the server: backoff() halves it and pauses every user for the given delay,
+    and each success() grows it back towards the configured rate.
+
+    throttled_time is the total time callers spent waiting on the limiter.
+    """
+
+    _limiters = {}
+    _limiters_lock = threading.Lock()
+
+    @staticmethod
+    def shared(key: str, rate: float, burst: int) -> 'RateLimiter':
+        """
+        Get (or create) the process-wide limiter for this key.
+        Everything using a key shares its budget: asked for with another rate or burst, the limiter keeps
+        the ones it was created with (and warns about it)
+        """
+        with RateLimiter._limiters_lock:
+            if key not in RateLimiter._limiters:
+                RateLimiter._limiters[key] = RateLimiter(rate=rate, burst=burst)
+
+            limiter = RateLimiter._limiters[key]
+            if (limiter.max_rate, limiter.burst) != (rate, burst):
+                warnings.warn("Rate limiter already set to {}/s (burst {}), {}/s (burst {}) is ignored".format(
+                        limiter.max_rate, limiter.burst, rate, burst), RuntimeWarning, stacklevel=2)
+
+            return limiter
+
+    def __init__(self, rate: float, burst: int = 1, min_rate: float = 0.1):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = burst
+        self.throttled_time = 0.0
+
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request can be made"""
+        waited = 0.0
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    self.throttled_time += waited
+                    return
+
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+
+            time.sleep(delay)
+            waited += delay
+
+    def backoff(self, delay: float):
+        """The server asked us to slow down: nobody sends anything for delay seconds, and the rate is halved"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0)
+
+    def success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
@@ -0,0 +1,304 @@
+import ipaddress
+import json
+import sqlite3
+import threading
+import time
+from typing import Iterable
+from urllib.parse import urlparse
+
+import OSSER.core.helpers as helpers
+
+
+class ResultStore:
+    """
+    Results of every run (DNS answers, Bing results) in a sqlite file, indexed to be queried across runs:
+        -by IP range: IPs are stored as 16 bytes (IPv4 as ::ffff:a.b.c.d), so a CIDR is a BETWEEN on the index
+        -by zone: FQDNs are also stored reversed (www.test.com -> com.test.www.), so a zone is a prefix range
+        -by run, and by the time a row was seen
+
+    Rows are buffered and written batch_size at a time, each batch in a single transaction.
+
+    Usage:
+        store = ResultStore.shared('results.db')
+        run = store.begin_run('dns-recon', {'fqdns': ['test.com']})
+        store.add_dns_records(run, graph.edges())
+        store.finish_run(run)
+
+        store.fqdns_in_range('10.20.0.0/16')
+        store.changed_ptrs(since=time.time() - 7 * 86400)
+    """
+
+    _stores = {}
+    _stores_lock = threading.Lock()
+
+    _IPV4_MAPPED = b'\x00' * 10 + b'\xff\xff'
+
+    @staticmethod
+    def shared(path: str, batch_size: int = 1000) -> 'ResultStore':
+        """Get (or create) the process-wide store for this sqlite file"""
+        with ResultStore._stores_lock:
+            if path not in ResultStore._stores:
+                ResultStore._stores[path] = ResultStore(path=path, batch_size=batch_size)
+
+            return ResultStore._stores[path]
+
+    def __init__(self, path: str, batch_size: int = 1000):
+        self.path = path
+        self.batch_size = batch_size
+
+        # table -> rows waiting to be written
+        self._pending = {'dns_records': [], 'web_results': []}
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # Readers (ex. a query while a recon is running) don't block the writer
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+
+        self._db.execute('CREATE TABLE IF NOT EXISTS runs ('
+                         'id INTEGER PRIMARY KEY, '
+                         'command TEXT NOT NULL, '
+                         'arguments TEXT NOT NULL, '
+                         'started REAL NOT NULL, '
+                         'finished REAL)')
+        # One row per answer: the record_type query of src answered dst.
+        # ip is the IP side of A/AAAA/PTR records, fqdn the name side (the discovered name for the other types)
+        self._db.execute('CREATE TABLE IF NOT EXISTS dns_records ('
+                         'run INTEGER NOT NULL, '
+                         'seen REAL NOT NULL, '
+                         'src TEXT NOT NULL, '
+                         'record_type TEXT NOT NULL, '
+                         'dst TEXT NOT NULL, '
+                         'round INTEGER NOT NULL, '
+                         'ip BLOB, '
+                         'fqdn TEXT)')
+        # ip is the IP the result was found for (if known), fqdn the host of the URL
+        self._db.execute('CREATE TABLE IF NOT EXISTS web_results ('
+                         'run INTEGER NOT NULL, '
+                         'seen REAL NOT NULL, '
+                         'source TEXT NOT NULL, '
+                         'query TEXT NOT NULL, '
+                         'url TEXT NOT NULL, '
+                         'name TEXT, '
+                         'description TEXT, '
+                         'ip BLOB, '
+                         'fqdn TEXT)')
+
+        for table in ('dns_records', 'web_results'):
+            for column in ('ip', 'fqdn', 'run', 'seen'):
+                self._db.execute('CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({1})'.format(table, column))
+
+        self._db.commit()
+
+    @staticmethod
+    def pack_ip(ip: str):
+        """:return: The IP as 16 bytes, IPv4 mapped in IPv6, so both sort (and compare) in the same index"""
+        address = ipaddress.ip_address(ip)
+        if address.version == 4:
+            return ResultStore._IPV4_MAPPED + address.packed
+
+        return address.packed
+
+    @staticmethod
+    def unpack_ip(packed: bytes):
+        if packed.startswith(ResultStore._IPV4_MAPPED):
+            return str(ipaddress.IPv4Address(packed[12:]))
+
+        return str(ipaddress.IPv6Address(packed))
+
+    @staticmethod
+    def ip_bounds(ip_range: str):
+        """:return: The first and last packed IPs of a CIDR range"""
+        network = ipaddress.ip_network(ip_range, strict=False)
+        return ResultStore.pack_ip(str(network[0])), ResultStore.pack_ip(str(network[-1]))
+
+    @staticmethod
+    def reverse_fqdn(fqdn: str):
+        """www.test.com -> com.test.www. (with the trailing dot, test.com is not a prefix of test.community)"""
+        return '.'.join(reversed(helpers.normalize_fqdn(fqdn).split('.'))) + '.'
+
+    @staticmethod
+    def unreverse_fqdn(reversed_fqdn: str):
+        return '.'.join(reversed(reversed_fqdn.rstrip('.').split('.')))
+
+    @staticmethod
+    def zone_bounds(zone: str):
+        """:return: The range of reversed FQDNs of the zone and the names below it ('/' comes right after '.')"""
+        prefix = ResultStore.reverse_fqdn(zone)
+        return prefix, prefix[:-1] + '/'
+
+    def begin_run(self, command: str, arguments: dict):
+        """:return: The id of the new run, to be given with the rows it adds"""
+        with self._lock:
+            with self._db:
+                return self._db.execute('INSERT INTO runs (command, arguments, started) VALUES (?, ?, ?)',
+                                        (command, json.dumps(arguments, default=list), time.time())).lastrowid
+
+    def finish_run(self, run: int):
+        with self._lock:
+            self._flush()
+            with self._db:
+                self._db.execute('UPDATE runs SET finished = ? WHERE id = ?', (time.time(), run))
+
+    def _add(self, table: str, rows: Iterable[tuple]):
+        with self._lock:
+            pending = self._pending[table]
+            for row in rows:
+                pending.append(row)
+                if len(pending) >= self.batch_size:
+                    self._flush()
+
+    def _flush(self):
+        with self._db:
+            for table, rows in self._pending.items():
+                if rows:
+                    self._db.executemany('INSERT INTO {} VALUES ({})'.format(table, ', '.join('?' * len(rows[0]))),
+                                         rows)
+                    rows.clear()
+
+    def flush(self):
+        """Write the buffered rows"""
+        with self._lock:
+            self._flush()
+
+    def add_dns_records(self, run: int, records: Iterable[tuple]):
+        """:param records: (src, record_type, dst, round), ex. DiscoveryGraph.edges()"""
+        seen = time.time()
+
+        def rows():
+            for src, record_type, dst, discovery_round in records:
+                if record_type in ('A', 'AAAA'):
+                    ip, fqdn = ResultStore.pack_ip(dst), ResultStore.reverse_fqdn(src)
+                elif record_type == 'PTR':
+                    ip, fqdn = ResultStore.pack_ip(src), ResultStore.reverse_fqdn(dst)
+                else:
+                    ip, fqdn = None, ResultStore.reverse_fqdn(dst)
+
+                yield run, seen, src, record_type, dst, discovery_round, ip, fqdn
+
+        self._add('dns_records', rows())
+
+    def add_web_results(self, run: int, source: str, query: str, results: Iterable[dict], ip: str = None):
+        """:param results: Parsed Bing results ({'name', 'description', 'url'}), found for ip if given"""
+        seen, packed_ip = time.time(), ResultStore.pack_ip(ip) if ip else None
+
+        def rows():
+            for x in results:
+                host = urlparse(x['url']).hostname
+                yield (run, seen, source, query, x['url'], x.get('name'), x.get('description'), packed_ip,
+                       ResultStore.reverse_fqdn(host) if host else None)
+
+        self._add('web_results', rows())
+
+    @staticmethod
+    def _where(ip_range: str = None, zone: str = None, run: int = None, since: float = None,
+               record_types: Iterable[str] = None):
+        clauses, params = [], []
+        if ip_range:
+            clauses.append('ip BETWEEN ? AND ?')
+            params += ResultStore.ip_bounds(ip_range)
+        if zone:
+            clauses.append('fqdn >= ? AND fqdn < ?')
+            params += ResultStore.zone_bounds(zone)
+        if run is not None:
+            clauses.append('run = ?')
+            params.append(run)
+        if since is not None:
+            clauses.append('seen >= ?')
+            params.append(since)
+        if record_types:
+            record_types = list(record_types)
+            clauses.append('record_type IN ({})'.format(', '.join('?' * len(record_types))))
+            params += record_types
+
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def _select(self, query: str, params: list):
+        with self._lock:
+            self._flush()
+            return self._db.execute(query, params).fetchall()
+
+    def dns_records(self, ip_range: str = None, zone: str = None, run: int = None, since: float = None,
+                    record_types: Iterable[str] = None):
+        """:return: The (run, seen, src, record_type, dst, round) rows matching every filter given"""
+        where, params = ResultStore._where(ip_range=ip_range, zone=zone, run=run, since=since,
+                                           record_types=record_types)
+        return self._select('SELECT run, seen, src, record_type, dst, round FROM dns_records' + where +
+                            ' ORDER BY seen', params)
+
+    def web_results(self, ip_range: str = None, zone: str = None, run: int = None, since: float = None):
+        """:return: The (run, seen, source, query, url, name, description, ip) rows matching every filter given"""
+        where, params = ResultStore._where(ip_range=ip_range, zone=zone, run=run, since=since)
+        return [row[:7] + (row[7] and ResultStore.unpack_ip(row[7]),)
+                for row in self._select('SELECT run, seen, source, query, url, name, description, ip '
+                                        'FROM web_results' + where + ' ORDER BY seen', params)]
+
+    def fqdns_in_range(self, ip_range: str, since: float = None):
+        """:return: Every FQDN ever seen pointing to, or pointed to by, an IP of the range (Bing results included)"""
+        where, params = ResultStore._where(ip_range=ip_range, since=since)
+        rows = self._select('SELECT fqdn FROM dns_records' + where + ' UNION '
+                            'SELECT fqdn FROM web_results' + where, params * 2)
+
+        return set(ResultStore.unreverse_fqdn(fqdn) for fqdn, in rows if fqdn)
+
+    def changed_ptrs(self, since: float, ip_range: str = None):
+        """
+        IPs whose PTR answers seen since then are not the ones seen before
+        :return: {ip: (targets before, targets since)}
+        """
+        where, params = ResultStore._where(ip_range=ip_range, since=since, record_types=['PTR'])
+        rows = self._select('SELECT ip, dst, seen >= ? FROM dns_records WHERE record_type = ? AND ip IN ('
+                            'SELECT ip FROM dns_records' + where + ')', [since, 'PTR'] + params)
+
+        targets = {}
+        for ip, dst, recent in rows:
+            targets.setdefault(ip, (set(), set()))[recent].add(dst)
+
+        return {ResultStore.unpack_ip(ip): (before, after) for ip, (before, after) in targets.items()
+                if before and before != after}
+
+    def runs(self):
+        """:return: The (id, command, arguments, started, finished) of every run"""
+        return self._select('SELECT id, command, arguments, started, finished FROM runs ORDER BY id', [])
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.close()
+
+
+def add_arguments(parser):
+    parser.add_argument('path', help='sqlite file written with --results')
+    parser.add_argument('--ip-range', metavar='CIDR', help='only what was seen for an IP of this range')
+    parser.add_argument('--zone', help='only the names of this zone (and below)')
+    parser.add_argument('--run', type=int, help='only what this run found')
+    parser.add_argument('--days', type=float, help='only what was seen in the last days')
+    parser.add_argument('--web', action='store_true', help='Bing results instead of DNS records')
+    parser.add_argument('--fqdns', action='store_true', help='only the FQDNs of the IP range')
+    parser.add_argument('--changed-ptrs', action='store_true',
+                        help='IPs whose PTR changed in the last days (7 by default)')
+    parser.add_argument('--runs', action='store_true', help='list the runs')
+
+
+def main(args):
+    """Print the matching rows, tab separated"""
+    store = ResultStore(args.path)
+    since = time.time() - args.days * 86400 if args.days is not None else None
+
+    if args.runs:
+        rows = store.runs()
+    elif args.changed_ptrs:
+        changes = store.changed_ptrs(since=since or time.time() - 7 * 86400, ip_range=args.ip_range)
+        rows = [(ip, ','.join(sorted(before)), ','.join(sorted(after))) for ip, (before, after) in changes.items()]
+    elif args.fqdns:
+        # IPv4 are mapped in IPv6, ::/0 is every IP
+        rows = [(fqdn,) for fqdn in sorted(store.fqdns_in_range(args.ip_range or '::/0', since=since))]
+    elif args.web:
+        rows = store.web_results(ip_range=args.ip_range, zone=args.zone, run=args.run, since=since)
+    else:
+        rows = store.dns_records(ip_range=args.ip_range, zone=args.zone, run=args.run, since=since)
+
+    for row in rows:
+        print('\t'.join('' if x is None else str(x) for x in row))
+
+    store.close()
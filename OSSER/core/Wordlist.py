@@ -0,0 +1,61 @@
+import mmap
+import os
+import re
+
+
+class Wordlist:
+    """
+    Subdomain labels read from a (possibly huge) wordlist file, one per line.
+
+    The file is memory-mapped and read line by line every time it is iterated,
+    so iterating it once per zone costs no memory, whatever its size.
+    Blank lines, comments (#) and lines that are not valid DNS names are skipped, labels are lower cased.
+
+    Usage:
+        with Wordlist('subdomains.txt') as wordlist:
+            for name in wordlist.names('test.com'):
+                ...
+    """
+
+    # One or more labels of letters, digits, '-' and '_' (ex. SRV style _ldap._tcp), at most 63 characters each
+    _VALID = re.compile(rb'^[a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?(\.[a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?)*$')
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        # mmap can't map an empty file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.fstat(self._file.fileno()).st_size else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __iter__(self):
+        if self._map is None:
+            return
+
+        # Positions are kept here rather than in the map, so several iterations can run at the same time
+        start, size = 0, len(self._map)
+        while start < size:
+            end = self._map.find(b'\n', start)
+            if end < 0:
+                end = size
+
+            label = self._map[start:end].strip().lower()
+            start = end + 1
+
+            if label and not label.startswith(b'#') and Wordlist._VALID.match(label):
+                yield label.decode('ascii')
+
+    def names(self, zone: str):
+        """:return: A lazy iterator of label.zone, for every label of the wordlist"""
+        suffix = '.' + zone.rstrip('.')
+        return (label + suffix for label in self)
@@ -0,0 +1,91 @@
+from typing import Iterable
+
+import OSSER.core.helpers as helpers
+
+
+class ZoneTrie:
+    """
+    Set of DNS names stored label by label, from the TLD down (www.test.com -> com -> test -> www).
+
+    Inserting a name also inserts its parent zones (same as helpers.expand_fqdn), and only the names
+    that were not known before are returned, so expansion and deduplication are done in a single pass.
+    Lookups ("is this name known", "is this name or one of its parents known") are O(labels).
+
+    Names are normalized (lower case, no trailing dot), TLDs alone are never inserted.
+    """
+
+    # Marks a node as being a known name (and not only a path to one). Labels are strings (maybe empty, ex. 'a..b'),
+    # so this can't be one
+    _KNOWN = None
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._root = {}
+        self._size = 0
+
+        for name in names:
+            self.insert(name)
+
+    def insert(self, name: str):
+        """
+        Add a name and its parent zones: admin.test.com -> (test.com, admin.test.com)
+        :return: The list of names that were not known before, parents first
+        """
+        labels = helpers.normalize_fqdn(name).split('.')
+        new_names = []
+
+        node = self._root
+        for depth, label in enumerate(reversed(labels), start=1):
+            node = node.setdefault(label, {})
+
+            # Skip the TLD, unless that's all we got
+            if ZoneTrie._KNOWN not in node and (depth >= 2 or len(labels) == 1):
+                node[ZoneTrie._KNOWN] = True
+                new_names.append('.'.join(labels[-depth:]))
+
+        self._size += len(new_names)
+
+        return new_names
+
+    def _node(self, name: str):
+        node = self._root
+        for label in reversed(helpers.normalize_fqdn(name).split('.')):
+            node = node.get(label)
+            if node is None:
+                return None
+
+        return node
+
+    def __contains__(self, name: str):
+        node = self._node(name)
+        return node is not None and ZoneTrie._KNOWN in node
+
+    def has_children(self, name: str):
+        """Is any name below this one known? (ex. test.com once www.test.com was inserted)"""
+        node = self._node(name)
+        return node is not None and any(label is not ZoneTrie._KNOWN for label in node)
+
+    def covers(self, name: str):
+        """Is this name, or any of its parent zones, known?"""
+        node = self._root
+        for label in reversed(helpers.normalize_fqdn(name).split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            if ZoneTrie._KNOWN in node:
+                return True
+
+        return False
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        stack = [(self._root, [])]
+        while stack:
+            node, labels = stack.pop()
+            if ZoneTrie._KNOWN in node:
+                yield '.'.join(reversed(labels))
+
+            for label, child in node.items():
+                if label is not ZoneTrie._KNOWN:
+                    stack.append((child, labels + [label]))
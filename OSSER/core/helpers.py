@@ -1,21 +1,82 @@
+import ipaddress
 from typing import Iterable
-from urllib.parse import urlparse
+from urllib.parse import parse_qsl, urlencode, urlparse, urlsplit
+
+# Query parameters that don't change the page (ex. ?utm_source=...), dropped by normalize_url()
+TRACKING_PARAMETERS = {'fbclid', 'gclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', 'trk', 'trkinfo'}
+
+def normalize_fqdn(fqdn: str):
+    """
+    :param fqdn: A domain name, as found in the wild (Admin.Test.COM.)
+    :return: The same name, lower case and without the trailing dot (admin.test.com)
+    """
+    return str(fqdn).strip().rstrip('.').lower()
+
+
+def normalize_url(url: str):
+    """
+    :param url: A URL, as found in the wild (https://www.Test.com:443/a/?utm_source=x&b=2&a=1#top)
+    :return: A key that is the same for every URL of the same page (test.com/a?a=1&b=2):
+             no scheme, www. or default port, no trailing slash, fragment or tracking parameters,
+             and the other parameters sorted
+    """
+    parts = urlsplit(url.strip())
+
+    host = (parts.hostname or '').rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port not in (80, 443):
+        host += ':{}'.format(port)
+
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if k.lower() not in TRACKING_PARAMETERS and not k.lower().startswith('utm_')))
+
+    return host + parts.path.rstrip('/') + ('?' + query if query else '')
+
 
 def expand_fqdn(fqdn: str):
     """
-    Moaaar recursive fuckery =D
     :param fqdn: A fully qualified domain name (this.is.sparta.com)
-    :return: A tuple of fqdns based on the original (sparta.com, is.sparta.com, this.is.sparta.com)
+    :return: A list of fqdns based on the original (sparta.com, is.sparta.com, this.is.sparta.com)
     """
+    zones = normalize_fqdn(fqdn).split('.')
 
-    zones = str(fqdn).split('.')
-    if len(zones) == 2:
-        return ['.'.join((zones.pop(0), zones.pop(0)))]
-    else:
-        new_fqdn = '.'.join((x for x in zones[1:]))
-        zones.pop(0)
-        return expand_fqdn(new_fqdn) + [fqdn]
+    return ['.'.join(zones[i:]) for i in range(max(len(zones) - 2, 0), -1, -1)]
 
 
 def extract_fqdn_from_bing_results(bing_results: Iterable[dict]):
-    return set([urlparse(x['url']).netloc for x in bing_results])
\ No newline at end of file
+    """
+    :return: The set of host names of the results' URLs, without their port (test.com:8080 -> test.com).
+             Hosts that are IPs (1.2.3.4, [::1]) are left out
+    """
+    fqdns = set()
+    for x in bing_results:
+        host = urlparse(x['url']).hostname
+        if not host:
+            continue
+
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            fqdns.add(normalize_fqdn(host))
+
+    return fqdns
+
+
+def iter_ip_addresses(ip_ranges: Iterable[str]):
+    """
+    Lazily expand IPs and CIDR ranges (10.0.0.1, 10.0.0.0/20) into IP addresses
+    The network and broadcast addresses of a range are skipped
+    """
+    for ip_range in ip_ranges:
+        network = ipaddress.ip_network(ip_range, strict=False)
+
+        if network.num_addresses <= 2:
+            yield from (str(ip) for ip in network)
+        else:
+            yield from (str(ip) for ip in network.hosts())
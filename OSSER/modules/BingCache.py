@@ -0,0 +1,98 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class BingCache:
+    """
+    Persistent cache of parsed Bing result pages, keyed by (search_term, offset, limit, custom_params).
+
+    Pages older than max_age seconds are never returned, and once the store holds more than max_entries pages,
+    the oldest ones are evicted (down to EVICT_RATIO * max_entries, so it only happens every so many puts).
+    """
+
+    # Share of max_entries kept by an eviction
+    EVICT_RATIO = 0.9
+
+    _caches = {}
+    _caches_lock = threading.Lock()
+
+    @staticmethod
+    def shared(path: str, max_entries: int = 100000) -> 'BingCache':
+        """
+        Get (or create) the process-wide cache for this sqlite file.
+        There is a single cache (and sqlite connection) per file: asked for with a larger max_entries, it grows to it
+        """
+        with BingCache._caches_lock:
+            if path not in BingCache._caches:
+                BingCache._caches[path] = BingCache(path=path, max_entries=max_entries)
+
+            cache = BingCache._caches[path]
+            with cache._lock:
+                cache.max_entries = max(cache.max_entries, max_entries)
+
+            return cache
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS bing_cache ('
+                         'key TEXT PRIMARY KEY, '
+                         'created REAL NOT NULL, '
+                         'results TEXT NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS bing_cache_created ON bing_cache (created)')
+        self._db.commit()
+
+        # Pages in the store (an upper bound: replacing a page counts as a new one), see put()
+        self._count = self._db.execute('SELECT COUNT(*) FROM bing_cache').fetchone()[0]
+
+    @staticmethod
+    def _key(search_term: str, offset: int, limit: int, custom_params: dict):
+        return json.dumps([search_term, offset, limit, custom_params], sort_keys=True)
+
+    def get(self, search_term: str, offset: int, limit: int, custom_params: dict, max_age: float):
+        """
+        :return: The cached list of parsed results, or None if missing or older than max_age
+        """
+        with self._lock:
+            row = self._db.execute('SELECT results FROM bing_cache WHERE key = ? AND created >= ?',
+                                   (BingCache._key(search_term, offset, limit, custom_params),
+                                    time.time() - max_age)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, search_term: str, offset: int, limit: int, custom_params: dict, results: list):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO bing_cache VALUES (?, ?, ?)',
+                             (BingCache._key(search_term, offset, limit, custom_params),
+                              time.time(),
+                              json.dumps(results, separators=(',', ':'))))
+
+            self._count += 1
+
+            if self._count > self.max_entries:
+                self._evict()
+
+            self._db.commit()
+
+    def _evict(self):
+        """Delete the oldest pages (walking the created index, no sort), to make room for the next puts"""
+        self._count = self._db.execute('SELECT COUNT(*) FROM bing_cache').fetchone()[0]
+        excess = self._count - int(self.max_entries * BingCache.EVICT_RATIO)
+
+        if self._count > self.max_entries and excess > 0:
+            self._db.execute('DELETE FROM bing_cache WHERE key IN ('
+                             'SELECT key FROM bing_cache ORDER BY created LIMIT ?)', (excess,))
+            self._count -= excess
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
@@ -1,28 +1,168 @@
+import os
 import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Iterable
 
+import OSSER.core.helpers as helpers
+from OSSER.core.Metrics import Metrics
+from OSSER.core.RateLimiter import RateLimiter
 from OSSER.modules.AbstractModule import AbstractModule
+from OSSER.modules.BingCache import BingCache
 from py_ms_cognitive import PyMsCognitiveWebSearch as MsWeb
 
 
 class BingSearch(AbstractModule):
 
+    class Throttled(Exception):
+        """The API answered 429 (or 5xx): the request can be retried, after retry_after seconds if known"""
+
+        def __init__(self, status_code: int, retry_after: float = None):
+            super().__init__("CODE {}".format(status_code))
+            self.status_code = status_code
+            self.retry_after = retry_after
+
+    class _WebSearch(MsWeb):
+        """py_ms_cognitive sleeps by itself on 429 (and ignores Retry-After), we want to handle it ourselves"""
+
+        def get_json_results(self, response):
+            if response.status_code == 429 or response.status_code >= 500:
+                try:
+                    retry_after = float(response.headers.get('Retry-After'))
+                except (TypeError, ValueError):
+                    retry_after = None
+
+                raise BingSearch.Throttled(status_code=response.status_code, retry_after=retry_after)
+
+            return super().get_json_results(response)
+
+    class Novelty:
+        """
+        Every URL seen by a paged search (normalized, see helpers.normalize_url), to tell when to stop paging
+        """
+
+        def __init__(self, min_novelty: float, low_novelty_pages: int):
+            self.min_novelty = min_novelty
+            self.low_novelty_pages = low_novelty_pages
+            self.seen_urls = set()
+            self._low_pages = 0
+            self.exhausted = False
+
+        def add(self, page: list):
+            """:return: The ratio of the page results with a URL not seen before"""
+            urls = set(helpers.normalize_url(x['url']) for x in page)
+            new_urls = urls - self.seen_urls
+            self.seen_urls |= new_urls
+
+            ratio = len(new_urls) / len(page) if page else 0.0
+            self._low_pages = self._low_pages + 1 if ratio < self.min_novelty else 0
+            self.exhausted = not new_urls or self._low_pages >= self.low_novelty_pages
+
+            return ratio
+
     class Args(AbstractModule.AbstractArgs):
         def __init__(self,
                      bing_api_key: str = '',
                      limit: int = 50,
                      offset: int = None,
                      find_all: bool = True,
-                     max_queries: int = 15):
+                     max_queries: int = 15,
+                     concurrent_pages: int = 1,
+                     cache_path: str = None,
+                     cache_max_age: int = 86400,
+                     cache_max_entries: int = 100000,
+                     cache_bypass: bool = False,
+                     requests_per_second: float = 3,
+                     burst: int = 3,
+                     max_retries: int = 5,
+                     backoff: float = 1,
+                     endpoint: str = None,
+                     min_novelty: float = 0.1,
+                     low_novelty_pages: int = 2):
             self.bing_api_key = bing_api_key
             self.limit = limit
             self.offset = offset
             self.find_all = find_all
             self.max_queries = max_queries
+            # Number of pages fetched at the same time when find_all is set (1 = one page after the other)
+            self.concurrent_pages = concurrent_pages
+            # Result pages cache (sqlite file, disabled if None).
+            # cache_bypass skips lookups (fresh results), but still stores what was fetched
+            self.cache_path = cache_path
+            self.cache_max_age = cache_max_age
+            self.cache_max_entries = cache_max_entries
+            self.cache_bypass = cache_bypass
+            # Shared by every BingSearch using the same API key, see RateLimiter
+            self.requests_per_second = requests_per_second
+            self.burst = burst
+            # Retries of a throttled page, waiting Retry-After if given, backoff * 2^attempt otherwise
+            self.max_retries = max_retries
+            self.backoff = backoff
+            # Web Search API URL, if not py_ms_cognitive's (ex. a local stand-in)
+            self.endpoint = endpoint
+            # With find_all, paging stops at the first page without any new URL, or once low_novelty_pages pages
+            # in a row had less than min_novelty of new URLs (Bing mostly repeating itself)
+            self.min_novelty = min_novelty
+            self.low_novelty_pages = low_novelty_pages
+
+        # Read when --api-key is not given, so the key doesn't end up in the shell history
+        API_KEY_VARIABLE = 'BING_API_KEY'
+
+        @staticmethod
+        def add_arguments(parser, max_queries: int = 15):
+            """Command line options shared by every Bing command (see python -m OSSER)"""
+            api_key = os.environ.get(BingSearch.Args.API_KEY_VARIABLE)
+
+            group = parser.add_argument_group('bing')
+            group.add_argument('--api-key', default=api_key, required=not api_key,
+                               help='Bing API key (default: ${})'.format(BingSearch.Args.API_KEY_VARIABLE))
+            group.add_argument('--max-queries', type=int, default=max_queries,
+                               help='maximum pages (50 results each) per search')
+            group.add_argument('--concurrent-pages', type=int, default=1)
+            group.add_argument('--requests-per-second', type=float, default=3)
+            group.add_argument('--min-novelty', type=float, default=0.1,
+                               help='ratio of new URLs under which a page is mostly repeats')
+            group.add_argument('--low-novelty-pages', type=int, default=2,
+                               help='stop paging after that many such pages in a row')
+            group.add_argument('--bing-cache', dest='bing_cache_path', metavar='PATH',
+                               help='sqlite file keeping the result pages between runs')
+            group.add_argument('--bing-cache-bypass', action='store_true',
+                               help='always fetch fresh pages (they are still cached)')
+            group.add_argument('--endpoint', help='Web Search API URL (ex. a local stand-in)')
+
+        @staticmethod
+        def from_arguments(args) -> 'BingSearch.Args':
+            """:param args: Namespace parsed by a parser set up with add_arguments()"""
+            return BingSearch.Args(bing_api_key=args.api_key,
+                                   max_queries=args.max_queries,
+                                   concurrent_pages=args.concurrent_pages,
+                                   requests_per_second=args.requests_per_second,
+                                   min_novelty=args.min_novelty,
+                                   low_novelty_pages=args.low_novelty_pages,
+                                   cache_path=args.bing_cache_path,
+                                   cache_bypass=args.bing_cache_bypass,
+                                   endpoint=args.endpoint)
 
     def __init__(self, args: Args):
         self.args = args
+        # Number of pages actually requested to the API (cached pages are free), and time spent doing it
         self.query_count = 0
+        self.work_time = 0.0
+        self._stats_lock = threading.Lock()
+        self.metrics = Metrics.shared()
+
+        self.rate_limiter = RateLimiter.shared(key=self.args.bing_api_key,
+                                               rate=self.args.requests_per_second,
+                                               burst=self.args.burst)
+
+        self.cache = None
+        if self.args.cache_path:
+            self.cache = BingCache.shared(path=self.args.cache_path, max_entries=self.args.cache_max_entries)
+
+        # URLs seen by the last search, see iter_search()
+        self.novelty = None
 
     @staticmethod
     def _parse_results(bing_search_results: Iterable):
@@ -31,60 +171,138 @@ class BingSearch(AbstractModule):
             'description': x.description,
             'url': x.url} for x in bing_search_results]
 
-    def do_search(self, search_term):
-        """ Perform paged searches while we find new FQDN """
+    def _fetch_page(self, search_term: str, offset: int):
+        """Fetch a single page at an explicit offset (stateless, so pages can be fetched concurrently)"""
+        custom_params = {'safeSearch': 'Off'}
 
-        print(search_term)
+        if self.cache and not self.args.cache_bypass:
+            results = self.cache.get(search_term, offset, self.args.limit, custom_params,
+                                     max_age=self.args.cache_max_age)
+            self.metrics.inc('bing_cache_total', result='hit' if results is not None else 'miss')
+            if results is not None:
+                self.metrics.inc('bing_pages_total')
+                return results
 
-        custom_params = {'safeSearch': 'Off'}
-        if self.args.offset:
-            custom_params['offset'] = self.args.offset
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
 
-        search_service = MsWeb(self.args.bing_api_key, query=search_term,
-                               custom_params=custom_params)
+            search_service = BingSearch._WebSearch(self.args.bing_api_key, query=search_term,
+                                                   custom_params=custom_params)
+            search_service.current_offset = offset
+            if self.args.endpoint:
+                search_service.QUERY_URL = self.args.endpoint
 
-        bing_results = search_service.search(limit=self.args.limit, format='json')
-        self.query_count += 1
-        results = BingSearch._parse_results(bing_results)
+            started, status = time.time(), 'error'
+            try:
+                bing_results = search_service.search(limit=self.args.limit, format='json')
+                status = 'ok'
+                break
+            except BingSearch.Throttled as err:
+                status = 'throttled'
+                if attempt >= self.args.max_retries:
+                    raise
+
+                self.rate_limiter.backoff(err.retry_after if err.retry_after is not None
+                                          else self.args.backoff * 2 ** attempt)
+                attempt += 1
+            finally:
+                elapsed = time.time() - started
+                with self._stats_lock:
+                    self.query_count += 1
+                    self.work_time += elapsed
+
+                self.metrics.observe('bing_request_seconds', elapsed)
+                self.metrics.inc('bing_requests_total', status=status)
 
-        # Find all the things until we can't find new URLs anymore
-        # We have the first result set, do a new search and compare it to the previous one.
-        if self.args.find_all and self.query_count < self.args.max_queries:
+        self.rate_limiter.success()
+        results = BingSearch._parse_results(bing_results)
+        self.metrics.inc('bing_pages_total')
 
-            result_set = set(
-                    (x["url"] for x in results)
-            )
+        if self.cache:
+            self.cache.put(search_term, offset, self.args.limit, custom_params, results)
 
-            # Internal py_ms_cognitive object deals with the offset
-            bing_results = search_service.search(limit=self.args.limit, format='json')
-            self.query_count += 1
-            new_results = BingSearch._parse_results(bing_results)
+        return results
 
-            new_result_set = set(
-                    (x["url"] for x in new_results)
-            )
+    def stats(self):
+        """Time spent waiting on the (shared) rate limiter vs time spent on our own requests"""
+        return {'query_count': self.query_count,
+                'work_time': self.work_time,
+                'throttled_time': self.rate_limiter.throttled_time}
 
-            # New result contains everything already inside result_set
-            while not result_set.issuperset(new_result_set):
+    def _novelty(self, page: list):
+        """:return: Whether the page brings new URLs (see Novelty.add)"""
+        ratio = self.novelty.add(page)
+        self.metrics.observe('bing_page_novelty', ratio)
+        if ratio:
+            self.metrics.inc('bing_new_pages_total')
 
-                results += new_results
+        return ratio > 0
 
-                if self.query_count < self.args.max_queries:
-                    # Internal py_ms_cognitive object deals with the offset
-                    bing_results = search_service.search(limit=self.args.limit, format='json')
-                    self.query_count += 1
-                    new_results = BingSearch._parse_results(bing_results)
+    def _iter_search_concurrent(self, search_term: str):
+        """
+        Same as iter_search, but up to args.concurrent_pages pages are in flight at any time.
+        Pages are consumed in order, and once paging should stop, the pages not started yet are cancelled.
+        """
+        start = self.args.offset or 0
 
-                    new_result_set = set(
-                            (tuple(x) for x in results)
-                    )
+        pool = ThreadPoolExecutor(max_workers=self.args.concurrent_pages)
+        pending = deque()
+        next_page = 0
 
+        try:
+            while not self.novelty.exhausted:
+                # Keep the window full, without going over max_queries
+                while len(pending) < self.args.concurrent_pages and next_page < self.args.max_queries:
+                    pending.append(pool.submit(self._fetch_page, search_term, start + next_page * self.args.limit))
+                    next_page += 1
 
-                else:
-                    # Do not perform a search, but previous results were added
-                    # Stop looping, exit
+                if not pending:
                     break
 
+                new_results = pending.popleft().result()
+                if self._novelty(new_results):
+                    yield new_results
+        finally:
+            # Pages already on the wire can't be cancelled, they are just ignored
+            for future in pending:
+                future.cancel()
+
+            pool.shutdown(wait=False)
+
+    def iter_search(self, search_term):
+        """
+        Perform paged searches while we find new URLs, yielding the parsed results page by page as they arrive.
+        Pages without any new URL are not yielded, see Args.min_novelty for when paging stops.
+        Pages fetched (bing_pages_total) vs pages that brought something new (bing_new_pages_total) are recorded,
+        and the URLs seen are left in self.novelty.seen_urls
+        """
+        self.novelty = BingSearch.Novelty(min_novelty=self.args.min_novelty,
+                                          low_novelty_pages=self.args.low_novelty_pages)
+
+        if self.args.find_all and self.args.concurrent_pages > 1:
+            yield from self._iter_search_concurrent(search_term)
+            return
+
+        offset = self.args.offset or 0
+
+        for _ in range(self.args.max_queries if self.args.find_all else 1):
+            results = self._fetch_page(search_term, offset)
+            # Bing may return less than limit results
+            offset += min(self.args.limit, len(results))
+
+            if self._novelty(results):
+                yield results
+
+            if self.novelty.exhausted:
+                break
+
+    def do_search(self, search_term):
+        """ Perform paged searches while we find new FQDN """
+        results = []
+        for page in self.iter_search(search_term):
+            results += page
+
         return results
 
 
@@ -92,17 +310,16 @@ if __name__ == '__main__':
     args = BingSearch.Args(bing_api_key=sys.argv[1],
                            find_all=True)
     bir = BingSearch(args)
-    #if len(sys.argv) <= 2:
-    #    search_term = input("SearchTerm:")
-    #else:
-    #    search_term = sys.argv[2]
+    if len(sys.argv) <= 2:
+        search_term = input("SearchTerm:")
+    else:
+        search_term = sys.argv[2]
 
     search_results = bir.do_search(search_term)
 
     print("Number of queries: {}".format(bir.query_count))
-    print("Results (){}".format(len(search_results)))
+    print("Results ({})".format(len(search_results)))
     print()
     for x in search_results:
         for k, v in x.items():
             print(k, ":\t", v)
-
@@ -0,0 +1,165 @@
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+import dns.rdata
+import dns.rdataclass
+import dns.rdatatype
+
+
+class DnsCache:
+    """
+    TTL-aware cache of DNS answers, keyed by (qname, record type, nameservers).
+
+    Positive answers are kept for the TTL of their records, NXDOMAIN/NODATA answers (stored as an empty list)
+    for the negative TTL of the zone's SOA.
+    Entries are kept in a bounded LRU in memory and, if a path is given, in a sqlite file that survives between runs.
+
+    hits/misses count lookups, so the number of queries saved is visible at the end of a run.
+
+    Names that got a NXDOMAIN are also remembered (in memory only), whatever the record type queried,
+    since nothing exists below them either (RFC 8020), see nxdomain_ancestor().
+    """
+
+    _caches = {}
+    _caches_lock = threading.Lock()
+
+    @staticmethod
+    def shared(max_entries: int = 10000, path: str = None) -> 'DnsCache':
+        """
+        Get (or create) the process-wide cache for this sqlite file (or the in-memory only one).
+        There is a single cache (and sqlite connection) per file: asked for with a larger size, it grows to it.
+        max_entries <= 0 disables the cache, so it gets an empty one of its own
+        """
+        if max_entries <= 0:
+            return DnsCache(max_entries=0)
+
+        with DnsCache._caches_lock:
+            if path not in DnsCache._caches:
+                DnsCache._caches[path] = DnsCache(max_entries=max_entries, path=path)
+
+            cache = DnsCache._caches[path]
+            cache.max_entries = max(cache.max_entries, max_entries)
+
+            return cache
+
+    def __init__(self, max_entries: int = 10000, path: str = None):
+        """
+        :param max_entries: Of the LRU in memory. <= 0 disables the whole cache (path is then ignored),
+                            and with it the NXDOMAIN cut (nothing is remembered for nxdomain_ancestor())
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db = None
+        self._pending_writes = 0
+        if path and max_entries > 0:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS dns_cache ('
+                             'key TEXT PRIMARY KEY, '
+                             'rdtype TEXT NOT NULL, '
+                             'expires REAL NOT NULL, '
+                             'answers TEXT NOT NULL)')
+            self._db.execute('DELETE FROM dns_cache WHERE expires < ?', (time.time(),))
+            self._db.commit()
+            atexit.register(self.flush)
+
+    @staticmethod
+    def _key(qname, rdtype: str, nameservers: Iterable[str]):
+        return '{}|{}|{}'.format(str(qname).lower().rstrip('.'), rdtype.upper(), ','.join(nameservers))
+
+    def get(self, qname, rdtype: str, nameservers: Iterable[str]):
+        """
+        :return: The cached list of rdata (empty for negative answers), or None on a miss
+        """
+        key = DnsCache._key(qname, rdtype, nameservers)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+
+                del self._entries[key]
+
+            if self._db:
+                row = self._db.execute('SELECT expires, answers FROM dns_cache WHERE key = ?', (key,)).fetchone()
+                if row and row[0] > now:
+                    results = [dns.rdata.from_text(dns.rdataclass.IN, rdtype, text) for text in json.loads(row[1])]
+                    self._remember(key, row[0], results)
+                    self.hits += 1
+                    return results
+
+            self.misses += 1
+            return None
+
+    def put(self, qname, rdtype: str, nameservers: Iterable[str], results: list, ttl: float):
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+
+        key = DnsCache._key(qname, rdtype, nameservers)
+        expires = time.time() + ttl
+
+        with self._lock:
+            self._remember(key, expires, results)
+
+            if self._db:
+                self._db.execute('INSERT OR REPLACE INTO dns_cache VALUES (?, ?, ?, ?)',
+                                 (key, rdtype.upper(), expires, json.dumps([x.to_text() for x in results])))
+                # Committing every write would make the cache slower than the network
+                self._pending_writes += 1
+                if self._pending_writes >= 500:
+                    self._db.commit()
+                    self._pending_writes = 0
+
+    def put_nxdomain(self, qname, nameservers: Iterable[str], ttl: float):
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._remember(DnsCache._key(qname, 'NXDOMAIN', nameservers), time.time() + ttl, [])
+
+    def nxdomain_ancestor(self, qname, nameservers: Iterable[str]):
+        """:return: qname or its closest parent that is known not to exist, None if there is none"""
+        labels = str(qname).lower().rstrip('.').split('.')
+        nameservers = list(nameservers)
+        now = time.time()
+
+        with self._lock:
+            for i in range(len(labels)):
+                name = '.'.join(labels[i:])
+                entry = self._entries.get(DnsCache._key(name, 'NXDOMAIN', nameservers))
+                if entry is not None and entry[0] > now:
+                    return name
+
+        return None
+
+    def _remember(self, key: str, expires: float, results: list):
+        if self.max_entries <= 0:
+            return
+
+        self._entries[key] = (expires, results)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def flush(self):
+        with self._lock:
+            if self._db:
+                self._db.commit()
+                self._pending_writes = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
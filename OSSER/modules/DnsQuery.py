@@ -1,5 +1,10 @@
+import asyncio
+import concurrent.futures
+import ipaddress
+import socket
+import time
 from enum import Enum
-from typing import Iterable
+from typing import Callable, Iterable
 
 from dns.rdtypes.ANY import NS as dns_NS, \
     CNAME as dns_CNAME,\
@@ -10,10 +15,17 @@ from dns.rdtypes.IN import A as dns_A,\
     AAAA as dns_AAAA,\
     SRV as dns_SRV
 
-from dns.resolver import Resolver, NXDOMAIN
+from dns.resolver import NXDOMAIN
+import dns.exception
+import dns.query
+import dns.rdatatype
 import dns.reversename
+import dns.zone
 
+from OSSER.core.Metrics import Metrics
 from OSSER.modules.AbstractModule import AbstractModule
+from OSSER.modules.DnsCache import DnsCache
+from OSSER.modules.ResolverPool import ResolverPool
 
 
 class DnsQuery(AbstractModule):
@@ -29,37 +41,452 @@ class DnsQuery(AbstractModule):
         SOA = dns_SOA
         MX = dns_MX
 
+    class Answer(dict):
+        """Answers of a single name for several record types: {record_type: [rdata, ...]}"""
+
+        # Attribute holding the name a record points to
+        TARGET_ATTRIBUTES = {'CNAME': 'target', 'NS': 'target', 'PTR': 'target', 'SRV': 'target',
+                             'MX': 'exchange', 'SOA': 'mname'}
+
+        def addresses(self):
+            """:return: The IPs of the A and AAAA records"""
+            return [x.address for record_type in ('A', 'AAAA') for x in self.get(record_type, [])]
+
+        def targets(self):
+            """:return: The names pointed to by the other records (CNAME target, MX exchange, ...)"""
+            return [getattr(x, attribute).to_text()
+                    for record_type, attribute in DnsQuery.Answer.TARGET_ATTRIBUTES.items()
+                    for x in self.get(record_type, [])]
+
     class Args(AbstractModule.AbstractArgs):
-        def __init__(self, nameservers: Iterable[str] = None, ttl: int = 3, timeout: int = 3):
+        def __init__(self,
+                     nameservers: Iterable[str] = None,
+                     ttl: int = 3,
+                     timeout: int = 3,
+                     max_in_flight: int = 64,
+                     balancing: str = ResolverPool.ROUND_ROBIN,
+                     cache_size: int = 10000,
+                     cache_path: str = None,
+                     negative_ttl: int = 60,
+                     port: int = 53,
+                     nxdomain_cut: bool = True,
+                     nxdomain_cut_forward: bool = False,
+                     transfer_lifetime: int = 60,
+                     max_transfers: int = 8,
+                     skip_errors: bool = True):
             self.ttl = ttl
             self.nameservers = nameservers
+            self.port = port
             self.timeout = timeout
+            # Maximum number of outstanding queries per nameserver when using do_query_many()
+            self.max_in_flight = max_in_flight
+            # How queries are spread over the nameservers (ResolverPool.ROUND_ROBIN or ResolverPool.LEAST_LOAD)
+            self.balancing = balancing
+            # Answers cache: max entries in memory, and optional sqlite file to keep it between runs.
+            # 0 disables the whole cache (the sqlite file too), and with it the NXDOMAIN cut
+            self.cache_size = cache_size
+            self.cache_path = cache_path
+            # How long to remember a NXDOMAIN when the response carries no SOA
+            self.negative_ttl = negative_ttl
+            # Names below a NXDOMAIN don't exist either (RFC 8020): answer them without querying anything.
+            # Only for reverse names (in-addr.arpa, ip6.arpa) unless nxdomain_cut_forward is set: some nameservers
+            # answer NXDOMAIN to empty non-terminals, the cut would then drop the forward names below them
+            self.nxdomain_cut = nxdomain_cut
+            self.nxdomain_cut_forward = nxdomain_cut_forward
+            # Maximum duration of a whole zone transfer (do_zone_transfer), and zones transferred at the same time
+            self.transfer_lifetime = transfer_lifetime
+            self.max_transfers = max_transfers
+            # Queries of a batch that fail (timeout, SERVFAIL everywhere...) are answered with no record instead of
+            # failing the whole batch (see do_query_batch). Turn it off to get all the answers or an exception
+            self.skip_errors = skip_errors
+
+        @staticmethod
+        def add_arguments(parser):
+            """Command line options shared by every DNS command (see python -m OSSER)"""
+            group = parser.add_argument_group('dns')
+            group.add_argument('--nameserver', dest='nameservers', action='append', metavar='IP',
+                               help='nameserver to query, can be repeated (default: the system ones)')
+            group.add_argument('--port', type=int, default=53)
+            group.add_argument('--timeout', type=float, default=3, help='seconds per query attempt')
+            group.add_argument('--lifetime', type=float, default=3, help='seconds per query, retries included')
+            group.add_argument('--max-in-flight', type=int, default=64, help='outstanding queries per nameserver')
+            group.add_argument('--dns-cache', dest='dns_cache_path', metavar='PATH',
+                               help='sqlite file keeping the answers between runs')
+            group.add_argument('--fail-on-error', dest='skip_errors', action='store_false',
+                               help='stop at the first query that fails, instead of counting it as unanswered')
+
+        @staticmethod
+        def from_arguments(args) -> 'DnsQuery.Args':
+            """:param args: Namespace parsed by a parser set up with add_arguments()"""
+            return DnsQuery.Args(nameservers=args.nameservers,
+                                 port=args.port,
+                                 timeout=args.timeout,
+                                 ttl=args.lifetime,
+                                 max_in_flight=args.max_in_flight,
+                                 cache_path=args.dns_cache_path,
+                                 skip_errors=args.skip_errors)
 
     def __init__(self, args: Args):
         self.args = args
 
-        if self.args.nameservers:
-            self._resolver = Resolver(configure=False)
-            self._resolver.nameservers = args.nameservers
-        else:
-            self._resolver = Resolver(configure=True)
+        # Resolvers are shared by every DnsQuery with the same settings, so this is cheap
+        self._pool = ResolverPool.get(nameservers=self.args.nameservers,
+                                      port=self.args.port,
+                                      timeout=self.args.timeout,
+                                      lifetime=self.args.ttl,
+                                      balancing=self.args.balancing)
+
+        self.cache = DnsCache.shared(max_entries=self.args.cache_size, path=self.args.cache_path)
+        self.metrics = Metrics.shared()
+
+    @staticmethod
+    def _canonical_query(query: str, record_type: str):
+        if record_type.upper() == 'PTR':
+            # Get canonical ptr name
+            return dns.reversename.from_address(query)
+
+        return query
+
+    @staticmethod
+    def _answer_ttl(answer):
+        # dnspython already takes the SOA negative TTL into account for NODATA answers
+        return answer.expiration - time.time()
+
+    def _nxdomain_ttl(self, err: NXDOMAIN):
+        for response in err.responses().values():
+            for rrset in response.authority:
+                if rrset.rdtype == dns.rdatatype.SOA:
+                    return min(rrset.ttl, rrset[0].minimum)
+
+        return self.args.negative_ttl
+
+    def _record_query(self, record_type: str, index: int, started: float, outcome: str):
+        """
+        Latency by record type and nameserver, and outcome counters
+        :param outcome: answer, nodata (no record of this type), nxdomain, timeout or error
+        """
+        nameserver = self._pool.endpoints[index]
+        self.metrics.observe('dns_query_seconds', time.perf_counter() - started,
+                             record_type=record_type, nameserver=nameserver)
+        self.metrics.inc('dns_queries_total', record_type=record_type, nameserver=nameserver, outcome=outcome)
+
+    def _cached(self, query, record_type: str):
+        """:return: The cached answer, [] if query is below a NXDOMAIN, None if we have to ask"""
+        cached = self.cache.get(query, record_type, self._pool.endpoints)
+        self.metrics.inc('dns_cache_total', record_type=record_type, result='hit' if cached is not None else 'miss')
+
+        if cached is None and self.known_nonexistent(query):
+            self.metrics.inc('dns_nxdomain_cut_total', record_type=record_type)
+            return []
+
+        return cached
+
+    def _remember_nxdomain(self, err: NXDOMAIN, ttl: float):
+        for qname in err.qnames():
+            self.cache.put_nxdomain(qname, self._pool.endpoints, ttl)
 
-        self._resolver.timeout = self.args.timeout
-        self._resolver.lifetime = self.args.ttl
+    # Reverse trees, where the NXDOMAIN cut is on by default (see Args.nxdomain_cut)
+    REVERSE_ZONES = ('.in-addr.arpa', '.ip6.arpa')
+
+    def known_nonexistent(self, query):
+        """True if query (or one of its parents) got a NXDOMAIN, and the cut applies to it (see Args.nxdomain_cut)"""
+        if not self.args.nxdomain_cut:
+            return False
+
+        if not self.args.nxdomain_cut_forward and \
+                not ('.' + str(query).lower().rstrip('.')).endswith(DnsQuery.REVERSE_ZONES):
+            return False
+
+        return self.cache.nxdomain_ancestor(query, self._pool.endpoints) is not None
 
     def do_query(self, query: str, record_type: str = 'A'):
         # Testing purposes
         # return 'dig -t {} @{} {}'.format(record_type._name_, self.args.nameservers[0], query)
 
-        if record_type.upper() == 'PTR':
-            # Get canonical ptr name
-            query = dns.reversename.from_address(query)
+        query = DnsQuery._canonical_query(query, record_type)
 
-        # print('dig -t {} @{} {}'.format(record_type, self._resolver.nameservers[0], query))
+        cached = self._cached(query, record_type)
+        if cached is not None:
+            return cached
 
+        # print('dig -t {} @{} {}'.format(record_type, self._pool.nameservers[0], query))
+
+        index = self._pool.acquire()
+        started, outcome = time.perf_counter(), 'error'
         try:
-            results = [x for x in self._resolver.query(qname=query, rdtype=record_type, raise_on_no_answer=False)]
+            answer = self._pool.resolver(index).resolve(qname=query,
+                                                        rdtype=record_type,
+                                                        raise_on_no_answer=False,
+                                                        search=True)
+            results, ttl = [x for x in answer], DnsQuery._answer_ttl(answer)
+            outcome = 'answer' if results else 'nodata'
         except NXDOMAIN as err:
-            results = []
+            results, ttl = [], self._nxdomain_ttl(err)
+            outcome = 'nxdomain'
+            self._remember_nxdomain(err, ttl)
+        except dns.exception.Timeout:
+            outcome = 'timeout'
+            raise
+        finally:
+            self._pool.release(index)
+            self._record_query(record_type, index, started, outcome)
+
+        self.cache.put(query, record_type, self._pool.endpoints, results, ttl)
 
         return results
+
+    @staticmethod
+    def record_type_of(record_type: str):
+        """:return: The record type name, if we know about it"""
+        if record_type.upper() not in DnsQuery.RecordTypes.__members__:
+            raise NotImplementedError("This type of record is not implemented: {}".format(record_type))
+
+        return DnsQuery.RecordTypes[record_type.upper()].name
+
+    def do_query_many(self,
+                      queries: Iterable[str],
+                      record_type: str = 'A',
+                      on_result: Callable[[str, list], None] = None):
+        """
+        Resolve a whole batch of queries of the same record type concurrently.
+
+        Queries are spread over the configured nameservers by the shared ResolverPool, and at most
+        args.max_in_flight queries are outstanding against a given nameserver at any time.
+        The other nameservers are still used as fallback, same as do_query().
+        Cached answers, and names below a known NXDOMAIN, are returned without going on the network.
+        Queries that fail get no record, see do_query_batch.
+
+        :param on_result: Called with (query, results) as soon as each query completes
+        :return: A dict of {query: results}, where results are the same as do_query() would return
+        """
+        results = self.do_query_batch(pairs=[(query, record_type) for query in dict.fromkeys(queries)],
+                                      on_result=on_result and (lambda query, _, res: on_result(query, res)))
+
+        return {query: res for (query, _), res in results.items()}
+
+    def do_query_types(self, query: str, record_types: Iterable[str] = ('A', 'AAAA', 'CNAME', 'MX', 'NS')):
+        """
+        Resolve several record types of a single name at once (all the queries are in flight together)
+        :return: A DnsQuery.Answer
+        """
+        return self.do_query_types_many(queries=[query], record_types=record_types)[query]
+
+    def do_query_types_many(self,
+                            queries: Iterable[str],
+                            record_types: Iterable[str] = ('A', 'AAAA', 'CNAME', 'MX', 'NS'),
+                            on_result: Callable[[str, str, list], None] = None):
+        """
+        Same as do_query_many, but every record type of every query is resolved in the same batch
+        :param on_result: Called with (query, record_type, results) as soon as each query completes
+        :return: A dict of {query: DnsQuery.Answer}
+        """
+        record_types = [DnsQuery.record_type_of(record_type) for record_type in record_types]
+        queries = list(dict.fromkeys(queries))
+
+        results = self.do_query_batch(pairs=[(query, record_type) for query in queries for record_type in record_types],
+                                      on_result=on_result)
+
+        answers = {query: DnsQuery.Answer() for query in queries}
+        for (query, record_type), res in results.items():
+            answers[query][record_type] = res
+
+        return answers
+
+    def do_query_batch(self,
+                       pairs: Iterable[tuple],
+                       on_result: Callable[[str, str, list], None] = None,
+                       on_error: Callable[[str, str, Exception], None] = None):
+        """
+        Resolve any mix of (query, record type) concurrently, see do_query_many.
+        With args.skip_errors, a query that fails is answered with no record (and given to on_error instead of
+        on_result), the others go on. Without it, the first failure is raised and the batch is lost.
+
+        :param on_result: Called with (query, record_type, results) as soon as each query completes
+        :param on_error: Called with (query, record_type, exception) for each query that failed
+        :return: A dict of {(query, record_type): results}
+        """
+        results = dict.fromkeys(pairs)
+
+        def collect(query: str, record_type: str, res: list):
+            results[(query, record_type)] = res
+            if on_result:
+                on_result(query, record_type, res)
+
+        def failed(query: str, record_type: str, err: Exception):
+            results[(query, record_type)] = []
+            self.metrics.inc('dns_failed_queries_total', record_type=record_type)
+            if on_error:
+                on_error(query, record_type, err)
+
+        asyncio.run(self._do_query_window(pairs=iter(results), on_result=collect,
+                                          on_error=failed if self.args.skip_errors else None))
+
+        return results
+
+    async def _lookup(self, query: str, record_type: str, in_flight: list):
+        """Resolve one query, waiting for a slot on its nameserver (in_flight: one semaphore per nameserver)"""
+        qname = DnsQuery._canonical_query(query, record_type)
+
+        cached = self._cached(qname, record_type)
+        if cached is not None:
+            return cached
+
+        index = self._pool.acquire()
+        try:
+            async with in_flight[index]:
+                # Time spent waiting for a slot is not the nameserver's latency
+                started, outcome = time.perf_counter(), 'error'
+                try:
+                    answer = await self._pool.async_resolver(index).resolve(qname=qname,
+                                                                            rdtype=record_type,
+                                                                            raise_on_no_answer=False,
+                                                                            search=True)
+                    results, ttl = [x for x in answer], DnsQuery._answer_ttl(answer)
+                    outcome = 'answer' if results else 'nodata'
+                except NXDOMAIN as err:
+                    results, ttl = [], self._nxdomain_ttl(err)
+                    outcome = 'nxdomain'
+                    self._remember_nxdomain(err, ttl)
+                except dns.exception.Timeout:
+                    outcome = 'timeout'
+                    raise
+                finally:
+                    self._record_query(record_type, index, started, outcome)
+        finally:
+            self._pool.release(index)
+
+        self.cache.put(qname, record_type, self._pool.endpoints, results, ttl)
+
+        return results
+
+    def do_query_stream(self,
+                        queries: Iterable[str],
+                        record_type: str = 'A',
+                        on_result: Callable[[str, list], None] = None):
+        """
+        Same as do_query_many for a lazy (and possibly huge) iterable of queries, ex. a brute-force wordlist.
+        Queries are pulled from the iterable only when there is room for them, so memory use only depends on
+        args.max_in_flight. Results are only given to on_result (nothing is accumulated), and queries that
+        time out or fail are skipped whatever args.skip_errors (they are counted in dns_failed_queries_total).
+
+        :return: The number of queries resolved
+        """
+        def forward(query: str, _, results: list):
+            if on_result:
+                on_result(query, results)
+
+        def skip(_, record_type: str, __):
+            self.metrics.inc('dns_failed_queries_total', record_type=record_type)
+
+        return asyncio.run(self._do_query_window(pairs=((query, record_type) for query in queries),
+                                                 on_result=forward, on_error=skip))
+
+    async def _do_query_window(self,
+                               pairs,
+                               on_result: Callable[[str, str, list], None],
+                               on_error: Callable[[str, str, Exception], None] = None):
+        """
+        Resolve the (query, record type) pairs of an iterator, pulling them only when there is room for them:
+        at most max_in_flight tasks per nameserver exist at any time, whatever the number of queries.
+        :param on_error: Called with the queries that time out or fail, which are then dropped. If None, they raise
+        :return: The number of queries resolved
+        """
+        in_flight = [asyncio.Semaphore(self.args.max_in_flight) for _ in range(len(self._pool))]
+        window = self.args.max_in_flight * len(self._pool)
+        pending, count = set(), 0
+
+        async def resolve(query: str, record_type: str):
+            try:
+                results = await self._lookup(query, record_type, in_flight)
+            except dns.exception.DNSException as err:
+                if on_error is None:
+                    raise
+                on_error(query, record_type, err)
+                return
+
+            on_result(query, record_type, results)
+
+        for query, record_type in pairs:
+            if len(pending) >= window:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Re-raise the errors (of on_result, or of the queries if not skipped), if any
+                for task in done:
+                    task.result()
+
+            pending.add(asyncio.ensure_future(resolve(query, record_type)))
+            count += 1
+
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            for task in done:
+                task.result()
+
+        return count
+
+    def do_zone_transfer(self, zone: str, nameservers: Iterable[str]):
+        """
+        Try a zone transfer (AXFR) of zone against each of its nameservers, until one accepts.
+        Nameservers can be names (ex. the zone's NS targets), they are resolved first.
+        :return: A dns.zone.Zone (absolute names), None if every nameserver refused or failed
+        """
+        return self.do_zone_transfers({zone: nameservers})[zone]
+
+    def do_zone_transfers(self, nameservers_by_zone: dict):
+        """
+        Same as do_zone_transfer for several zones: the nameserver names of every zone are resolved in a single
+        batch, then up to args.max_transfers zones are transferred at the same time (the nameservers of a given
+        zone are still tried one after the other)
+        :param nameservers_by_zone: {zone: nameservers}
+        :return: A dict of {zone: dns.zone.Zone or None}
+        """
+        nameservers_by_zone = {zone: list(nameservers) for zone, nameservers in nameservers_by_zone.items()}
+
+        names = set()
+        for nameservers in nameservers_by_zone.values():
+            for nameserver in nameservers:
+                try:
+                    ipaddress.ip_address(nameserver)
+                except ValueError:
+                    names.add(nameserver)
+
+        answers = self.do_query_types_many(queries=names, record_types=('A', 'AAAA')) if names else {}
+
+        def addresses_of(nameserver: str):
+            return answers[nameserver].addresses() if nameserver in names else [nameserver]
+
+        addresses_by_zone = {zone: list(dict.fromkeys(address for nameserver in nameservers
+                                                      for address in addresses_of(nameserver)))
+                             for zone, nameservers in nameservers_by_zone.items()}
+
+        if not addresses_by_zone:
+            return {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.args.max_transfers,
+                                                                   len(addresses_by_zone))) as pool:
+            futures = {zone: pool.submit(self._transfer, zone, addresses)
+                       for zone, addresses in addresses_by_zone.items()}
+
+            return {zone: future.result() for zone, future in futures.items()}
+
+    def _transfer(self, zone: str, addresses: Iterable[str]):
+        """:return: The zone from the first of these nameservers that accepts to transfer it, None if none does"""
+        for address in addresses:
+            started = time.perf_counter()
+            try:
+                # xfr's lifetime also bounds its TCP connect: check the nameserver answers on TCP at all first,
+                # so one that drops it costs timeout seconds, not transfer_lifetime
+                socket.create_connection((address, self.args.port), timeout=self.args.timeout).close()
+
+                transfer = dns.query.xfr(where=address, zone=zone, port=self.args.port, relativize=False,
+                                         timeout=self.args.timeout, lifetime=self.args.transfer_lifetime)
+                result = dns.zone.from_xfr(transfer, relativize=False)
+            except (dns.exception.DNSException, OSError, EOFError):
+                self.metrics.inc('dns_zone_transfers_total', result='failed')
+                continue
+            finally:
+                self.metrics.observe('dns_zone_transfer_seconds', time.perf_counter() - started)
+
+            self.metrics.inc('dns_zone_transfers_total', result='ok')
+            return result
+
+        return None
@@ -0,0 +1,111 @@
+import itertools
+import threading
+from typing import Iterable
+
+from dns.resolver import Resolver
+import dns.asyncresolver
+
+
+class ResolverPool:
+    """
+    Process-wide pool of resolvers shared by every DnsQuery having the same nameservers, port, timeout and lifetime.
+
+    The system configuration (/etc/resolv.conf) is parsed once per pool instead of once per query, and
+    every query is assigned to one of the configured nameservers, either round-robin or to the least loaded one.
+    The other nameservers are still used as fallback if the chosen one fails.
+
+    Usage:
+        pool = ResolverPool.get(nameservers=None, timeout=3, lifetime=3)
+        index = pool.acquire()
+        try:
+            pool.resolver(index).resolve(...)
+        finally:
+            pool.release(index)
+    """
+
+    ROUND_ROBIN = 'round_robin'
+    LEAST_LOAD = 'least_load'
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @staticmethod
+    def get(nameservers: Iterable[str] = None,
+            port: int = 53,
+            timeout: float = 3,
+            lifetime: float = 3,
+            balancing: str = ROUND_ROBIN) -> 'ResolverPool':
+        """Get (or create) the shared pool for these settings"""
+        key = (tuple(nameservers) if nameservers else None, port, timeout, lifetime, balancing)
+
+        with ResolverPool._pools_lock:
+            if key not in ResolverPool._pools:
+                ResolverPool._pools[key] = ResolverPool(*key)
+
+            return ResolverPool._pools[key]
+
+    def __init__(self, nameservers: Iterable[str], port: int, timeout: float, lifetime: float, balancing: str):
+        if balancing not in (ResolverPool.ROUND_ROBIN, ResolverPool.LEAST_LOAD):
+            raise NotImplementedError("Unknown balancing strategy: {}".format(balancing))
+
+        self.balancing = balancing
+
+        if nameservers:
+            self._system = Resolver(configure=False)
+            self._system.nameservers = list(nameservers)
+        else:
+            # Only place where the system configuration gets parsed
+            self._system = Resolver(configure=True)
+
+        self._system.port = port
+        self.nameservers = list(self._system.nameservers)
+        # Identifies the nameservers actually queried (ex. for caching)
+        self.endpoints = tuple('{}#{}'.format(nameserver, port) for nameserver in self.nameservers)
+
+        # Resolver i starts with nameserver i, and falls back on the others
+        self._resolvers = [self._build(Resolver(configure=False), i, timeout, lifetime)
+                           for i in range(len(self.nameservers))]
+        self._async_resolvers = [self._build(dns.asyncresolver.Resolver(configure=False), i, timeout, lifetime)
+                                 for i in range(len(self.nameservers))]
+
+        self._load = [0] * len(self.nameservers)
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def _build(self, resolver, index: int, timeout: float, lifetime: float):
+        resolver.nameservers = self.nameservers[index:] + self.nameservers[:index]
+        resolver.search = self._system.search
+        resolver.domain = self._system.domain
+        resolver.ndots = self._system.ndots
+        resolver.port = self._system.port
+        resolver.timeout = timeout
+        resolver.lifetime = lifetime
+        return resolver
+
+    def __len__(self):
+        return len(self.nameservers)
+
+    def acquire(self) -> int:
+        """Pick a nameserver for the next query, return its index"""
+        with self._lock:
+            if self.balancing == ResolverPool.LEAST_LOAD:
+                # Ties are broken round-robin so idle nameservers all get used
+                start = next(self._next)
+                index = min((self._load[(start + i) % len(self)], (start + i) % len(self))
+                            for i in range(len(self)))[1]
+            else:
+                index = next(self._next) % len(self)
+
+            self._load[index] += 1
+
+            return index
+
+    def release(self, index: int):
+        with self._lock:
+            self._load[index] -= 1
+
+    def resolver(self, index: int) -> Resolver:
+        return self._resolvers[index]
+
+    def async_resolver(self, index: int) -> dns.asyncresolver.Resolver:
+        return self._async_resolvers[index]
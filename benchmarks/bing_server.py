@@ -0,0 +1,92 @@
+"""
+Local HTTP stand-in for the Bing Web Search API, to benchmark OSSER without a (paid) API key.
+
+Answers GET ?q=...&count=...&offset=... with {"webPages": {"value": [...]}}:
+    -for ip:x queries, results_per_ip pages hosted on host<i>.<zone>, where x = 10.0.0.0 + i (see dns_server)
+    -for anything else, results_per_query synthetic profiles (https://www.linkedin.com/in/person-<k>)
+
+Like Bing, past the last result the last page is returned again (with a tracking parameter added to its URLs).
+Every request is delayed by latency seconds, and a throttle_ratio of them get a 429 with Retry-After.
+"""
+import ipaddress
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BASE_IP = int(ipaddress.ip_address('10.0.0.0'))
+
+
+class BingStandIn(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 8089, zone: str = 'bench.test', results_per_ip: int = 3,
+                 results_per_query: int = 400, latency: float = 0.0, throttle_ratio: float = 0.0, counter=None):
+        super().__init__(('127.0.0.1', port), BingStandIn._Handler)
+        self.zone = zone
+        self.results_per_ip = results_per_ip
+        self.results_per_query = results_per_query
+        self.latency = latency
+        self.throttle_ratio = throttle_ratio
+        self.counter = counter
+
+    def results(self, query: str):
+        ips = re.findall(r'ip:(\S+)', query)
+        if ips:
+            return [{'name': 'page {} of {}'.format(k, ip),
+                     'snippet': 'Hosted on {}'.format(ip),
+                     'url': 'http://host{}.{}/page{}'.format(int(ipaddress.ip_address(ip)) - BASE_IP, self.zone, k)}
+                    for ip in ips for k in range(self.results_per_ip)]
+
+        return [{'name': 'Person {} - {}'.format(k, query[:32]),
+                 'snippet': 'Profile {}'.format(k),
+                 'url': 'https://www.linkedin.com/in/person-{}'.format(k)}
+                for k in range(self.results_per_query)]
+
+    class _Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: dict, headers: dict = None):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            server = self.server
+            if server.counter is not None:
+                with server.counter.get_lock():
+                    server.counter.value += 1
+
+            if server.latency:
+                time.sleep(server.latency)
+
+            if random.random() < server.throttle_ratio:
+                self._send(429, {'message': 'Rate limit is exceeded.'}, {'Retry-After': '1'})
+                return
+
+            params = parse_qs(urlparse(self.path).query)
+            offset = int(params.get('offset', ['0'])[0])
+            count = int(params.get('count', ['50'])[0])
+
+            results = server.results(params.get('q', [''])[0])
+            if results and offset >= len(results):
+                results = [dict(x, url=x['url'] + '?trk=repeat') for x in results[-count:]]
+            else:
+                results = results[offset:offset + count]
+
+            self._send(200, {'webPages': {'value': results}} if results else {})
+
+
+def serve(port: int, latency: float, throttle_ratio: float, counter=None):
+    """Entry point for a separate process (see benchmarks.run)"""
+    BingStandIn(port=port, latency=latency, throttle_ratio=throttle_ratio, counter=counter).serve_forever()
@@ -0,0 +1,223 @@
+"""
+Local authoritative DNS server serving a synthetic zone, to benchmark OSSER without hitting real resolvers.
+
+Zone layout (zone = bench.test by default, N = hosts):
+    host<i>.<zone>  A    10.0.0.0 + i      (unless host i is one of the NXDOMAIN ones)
+    10.0.0.0 + i    PTR  host<i>.<zone>    (host<i+1> for every cross_link-th host, so the recon needs more rounds)
+    <zone>          SOA/NS
+    ns1.<zone>      A    127.0.0.1         (so the NS can be found, ex. to try a zone transfer)
+    Reverse zones (ex. 0.0.10.in-addr.arpa) exist (NODATA) if one of the hosts is in their range, NXDOMAIN otherwise
+
+Every reply is delayed by latency seconds, without blocking the other queries.
+Zone transfers (AXFR, over TCP) are refused unless allow_transfer is set.
+With wildcard (an IP), any other name of the zone resolves to it (*.<zone> A wildcard) instead of NXDOMAIN.
+"""
+import asyncio
+import ipaddress
+import struct
+
+import dns.exception
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdatatype
+import dns.reversename
+import dns.rrset
+
+
+class SyntheticZone:
+
+    BASE_IP = int(ipaddress.ip_address('10.0.0.0'))
+
+    # Records per AXFR message
+    TRANSFER_CHUNK = 500
+
+    def __init__(self, zone: str = 'bench.test', hosts: int = 1000, cross_link: int = 10, nxdomain_ratio: float = 0.1,
+                 allow_transfer: bool = False, wildcard: str = None):
+        self.zone = dns.name.from_text(zone)
+        self.hosts = hosts
+        self.cross_link = cross_link
+        self.nxdomain_ratio = nxdomain_ratio
+        self.allow_transfer = allow_transfer
+        self.wildcard = wildcard
+
+        self.soa = dns.rrset.from_text(self.zone, 300, 'IN', 'SOA',
+                                       'ns1.{0} admin.{0} 1 3600 600 86400 60'.format(self.zone))
+        self.ns = dns.rrset.from_text(self.zone, 300, 'IN', 'NS', 'ns1.{}'.format(self.zone))
+        self.ns_a = dns.rrset.from_text('ns1.{}'.format(self.zone), 300, 'IN', 'A', '127.0.0.1')
+
+    def ip(self, i: int):
+        return str(ipaddress.ip_address(SyntheticZone.BASE_IP + i))
+
+    def host(self, i: int):
+        return 'host{}.{}'.format(i, self.zone)
+
+    def exists(self, i: int):
+        # Spread the NXDOMAIN hosts evenly
+        return 0 <= i < self.hosts and int(i * self.nxdomain_ratio) == int((i + 1) * self.nxdomain_ratio)
+
+    def ptr_target(self, i: int):
+        return self.host(i + 1 if self.cross_link and i % self.cross_link == 0 else i)
+
+    def _host_index(self, qname: dns.name.Name):
+        if not qname.is_subdomain(self.zone) or len(qname) != len(self.zone) + 1:
+            return None
+
+        label = qname.labels[0].decode()
+        if label.startswith('host') and label[4:].isdigit():
+            return int(label[4:])
+
+        return None
+
+    def _ip_index(self, qname: dns.name.Name):
+        try:
+            i = int(ipaddress.ip_address(dns.reversename.to_address(qname))) - SyntheticZone.BASE_IP
+        except (dns.exception.SyntaxError, ValueError):
+            return None
+
+        return i if self.exists(i) else None
+
+    def _reverse_zone_populated(self, qname: dns.name.Name):
+        """None if qname is not a partial in-addr.arpa name, else whether one of the hosts is in its range"""
+        reverse_zone = dns.name.from_text('in-addr.arpa')
+        if not qname.is_subdomain(reverse_zone) or len(qname) - len(reverse_zone) >= 4:
+            return None
+
+        octets = [int(label) for label in reversed(qname.relativize(reverse_zone).labels)]
+        first = int(ipaddress.ip_address('.'.join(map(str, octets + [0] * (4 - len(octets))))))
+        last = first + 2 ** (8 * (4 - len(octets))) - 1
+
+        return first <= SyntheticZone.BASE_IP + self.hosts - 1 and SyntheticZone.BASE_IP <= last
+
+    def answer(self, qname: dns.name.Name, rdtype: int):
+        """:return: (rcode, answer rrsets, authority rrsets)"""
+        if qname == self.zone:
+            if rdtype == dns.rdatatype.SOA:
+                return dns.rcode.NOERROR, [self.soa], []
+            if rdtype == dns.rdatatype.NS:
+                return dns.rcode.NOERROR, [self.ns], []
+            return dns.rcode.NOERROR, [], [self.soa]
+
+        if qname == self.ns_a.name:
+            return dns.rcode.NOERROR, [self.ns_a] if rdtype == dns.rdatatype.A else [], [self.soa]
+
+        i = self._host_index(qname)
+        if i is not None and self.exists(i):
+            if rdtype == dns.rdatatype.A:
+                return dns.rcode.NOERROR, [dns.rrset.from_text(qname, 300, 'IN', 'A', self.ip(i))], []
+            return dns.rcode.NOERROR, [], [self.soa]
+
+        if self._reverse_zone_populated(qname):
+            return dns.rcode.NOERROR, [], [self.soa]
+
+        i = self._ip_index(qname)
+        if i is not None:
+            if rdtype == dns.rdatatype.PTR:
+                return dns.rcode.NOERROR, [dns.rrset.from_text(qname, 300, 'IN', 'PTR', self.ptr_target(i))], []
+            return dns.rcode.NOERROR, [], [self.soa]
+
+        if self.wildcard and qname.is_subdomain(self.zone):
+            if rdtype == dns.rdatatype.A:
+                return dns.rcode.NOERROR, [dns.rrset.from_text(qname, 300, 'IN', 'A', self.wildcard)], []
+            return dns.rcode.NOERROR, [], [self.soa]
+
+        return dns.rcode.NXDOMAIN, [], [self.soa]
+
+    def transfer(self):
+        """:return: Every record of the zone, SOA first and last (AXFR order)"""
+        records = [self.soa, self.ns, self.ns_a]
+        records += [dns.rrset.from_text(self.host(i), 300, 'IN', 'A', self.ip(i))
+                    for i in range(self.hosts) if self.exists(i)]
+
+        return records + [self.soa]
+
+    def respond(self, wire: bytes, tcp: bool = False):
+        """:return: The replies to a query (several for a zone transfer)"""
+        query = dns.message.from_wire(wire)
+        question = query.question[0]
+
+        if question.rdtype == dns.rdatatype.AXFR:
+            if not (tcp and self.allow_transfer and question.name == self.zone):
+                response = dns.message.make_response(query)
+                response.set_rcode(dns.rcode.REFUSED)
+                return [response.to_wire()]
+
+            records, replies = self.transfer(), []
+            for start in range(0, len(records), SyntheticZone.TRANSFER_CHUNK):
+                response = dns.message.make_response(query)
+                response.flags |= dns.flags.AA
+                response.answer += records[start:start + SyntheticZone.TRANSFER_CHUNK]
+                replies.append(response.to_wire(max_size=65535))
+
+            return replies
+
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.AA
+
+        rcode, answer, authority = self.answer(question.name, question.rdtype)
+        response.set_rcode(rcode)
+        response.answer += answer
+        response.authority += authority
+
+        return [response.to_wire()]
+
+
+class DnsServer:
+    """UDP and TCP server for a SyntheticZone, counting the queries it answered in counter (a multiprocessing.Value)"""
+
+    def __init__(self, zone: SyntheticZone, host: str = '127.0.0.1', port: int = 5353, latency: float = 0.0,
+                 counter=None):
+        self.zone = zone
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.counter = counter
+
+    def _reply(self, wire: bytes, send, tcp: bool = False):
+        if self.counter is not None:
+            self.counter.value += 1
+
+        for reply in self.zone.respond(wire, tcp=tcp):
+            if self.latency:
+                asyncio.get_running_loop().call_later(self.latency, send, reply)
+            else:
+                send(reply)
+
+    class _Udp(asyncio.DatagramProtocol):
+        def __init__(self, server: 'DnsServer'):
+            self.server = server
+            self.transport = None
+
+        def connection_made(self, transport):
+            self.transport = transport
+
+        def datagram_received(self, data, addr):
+            self.server._reply(data, lambda reply: self.transport.sendto(reply, addr))
+
+    async def _tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        def send(reply: bytes):
+            writer.write(struct.pack('!H', len(reply)) + reply)
+
+        try:
+            while True:
+                length = struct.unpack('!H', await reader.readexactly(2))[0]
+                self._reply(await reader.readexactly(length), send, tcp=True)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: DnsServer._Udp(self), local_addr=(self.host, self.port))
+        server = await asyncio.start_server(self._tcp, self.host, self.port)
+
+        async with server:
+            await server.serve_forever()
+
+
+def serve(port: int, hosts: int, cross_link: int, nxdomain_ratio: float, latency: float, counter=None,
+          allow_transfer: bool = False):
+    """Entry point for a separate process (see benchmarks.run)"""
+    zone = SyntheticZone(hosts=hosts, cross_link=cross_link, nxdomain_ratio=nxdomain_ratio,
+                         allow_transfer=allow_transfer)
+    asyncio.run(DnsServer(zone, port=port, latency=latency, counter=counter).serve())
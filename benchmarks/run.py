@@ -0,0 +1,451 @@
+"""
+Benchmark OSSER against local stand-ins (benchmarks.dns_server, benchmarks.bing_server).
+
+    python -m benchmarks.run [--hosts 2000] [--dns-latency 0.005] [--scenarios dns-recon,linkedin]
+                             [--executor threads --concurrency 16]
+                             [--compare benchmarks/results/<previous>.json]
+
+Every scenario runs in its own process (so peak RSS is its own), with its own servers.
+Results are saved in benchmarks/results/<timestamp>-<commit>.json, to compare between commits.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import bing_server, dns_server
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10, host: str = '127.0.0.1'):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+    raise RuntimeError('Stand-in server on port {} did not start'.format(port))
+
+
+def percentiles(samples: list):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    return {'p{}'.format(p): samples[min(len(samples) - 1, int(len(samples) * p / 100))] for p in (50, 90, 99)}
+
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def bytes_per_query(rss_before_kb: int, queries: int):
+    """Peak RSS growth since rss_before_kb (taken before the run), per DNS query answered by the stand-in"""
+    return (peak_rss_kb() - rss_before_kb) * 1024 / max(queries, 1)
+
+
+class StandIns:
+    """Start the stand-in servers in separate processes, count the requests they answered"""
+
+    def __init__(self, options, allow_transfer: bool = False):
+        self.options = options
+        self.allow_transfer = allow_transfer
+        self.dns_port = free_port()
+        self.bing_port = free_port()
+        self.dns_queries = multiprocessing.Value('L', 0)
+        self.bing_requests = multiprocessing.Value('L', 0)
+        self._processes = []
+
+    def __enter__(self):
+        self._processes = [
+            multiprocessing.Process(target=dns_server.serve, daemon=True, kwargs=dict(
+                    port=self.dns_port, hosts=self.options.hosts, cross_link=self.options.cross_link,
+                    nxdomain_ratio=self.options.nxdomain_ratio, latency=self.options.dns_latency,
+                    counter=self.dns_queries, allow_transfer=self.allow_transfer)),
+            multiprocessing.Process(target=bing_server.serve, daemon=True, kwargs=dict(
+                    port=self.bing_port, latency=self.options.bing_latency,
+                    throttle_ratio=self.options.throttle_ratio, counter=self.bing_requests)),
+        ]
+        for process in self._processes:
+            process.start()
+
+        wait_for_port(self.dns_port)
+        wait_for_port(self.bing_port)
+
+        return self
+
+    def __exit__(self, *args):
+        for process in self._processes:
+            process.terminate()
+
+    def dns_args(self, **kwargs):
+        from OSSER.modules.DnsQuery import DnsQuery
+        return DnsQuery.Args(nameservers=['127.0.0.1'], port=self.dns_port, **kwargs)
+
+    def bing_args(self, **kwargs):
+        from OSSER.modules.BingSearch import BingSearch
+        return BingSearch.Args(bing_api_key='benchmark',
+                               endpoint='http://127.0.0.1:{}/search'.format(self.bing_port),
+                               requests_per_second=1000, burst=100, **kwargs)
+
+
+def scenario_dns_recon(servers: StandIns, options):
+    from OSSER.commands.DnsReconCommand import DnsReconCommand
+    from OSSER.core.helpers import iter_ip_addresses
+
+    ips = list(iter_ip_addresses(['10.0.0.0/{}'.format(32 - (options.hosts - 1).bit_length())]))[:options.hosts]
+
+    rss_before = peak_rss_kb()
+    started = time.perf_counter()
+    cmd = DnsReconCommand(dns_query_module_args=servers.dns_args(),
+                          command_args=DnsReconCommand.Args(ip_addresses=ips,
+                                                            fully_qualified_domain_names=['bench.test'],
+                                                            processes=options.processes,
+                                                            retain_results=options.retain_results))
+    cmd.execute()
+    elapsed = time.perf_counter() - started
+
+    return {'seconds': elapsed,
+            'queries': servers.dns_queries.value,
+            'queries_per_second': servers.dns_queries.value / elapsed,
+            'rounds': cmd.rounds,
+            'discovered': len(cmd.results),
+            'peak_rss_bytes_per_query': bytes_per_query(rss_before, servers.dns_queries.value)}
+
+
+def scenario_results_store(servers: StandIns, options):
+    """Write the answers of a recon store_runs times to a ResultStore, then time lookups, indexed vs full scans"""
+    from OSSER.commands.DnsReconCommand import DnsReconCommand
+    from OSSER.core.ResultStore import ResultStore
+    from OSSER.core.helpers import iter_ip_addresses
+
+    ips = list(iter_ip_addresses(['10.0.0.0/{}'.format(32 - (options.hosts - 1).bit_length())]))[:options.hosts]
+    cmd = DnsReconCommand(dns_query_module_args=servers.dns_args(),
+                          command_args=DnsReconCommand.Args(ip_addresses=ips, fully_qualified_domain_names=[]))
+    cmd.execute()
+    edges = list(cmd.results.edges())
+
+    def timed(function, runs: int = 20):
+        started = time.perf_counter()
+        for _ in range(runs):
+            function()
+        return (time.perf_counter() - started) / runs
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ResultStore(os.path.join(directory, 'results.db'))
+
+        started = time.perf_counter()
+        for _ in range(options.store_runs):
+            run = store.begin_run('dns-recon', {})
+            store.add_dns_records(run, edges)
+            store.finish_run(run)
+        write_seconds = time.perf_counter() - started
+
+        low, high = ResultStore.ip_bounds('10.0.1.0/24')
+        zone_low, zone_high = ResultStore.zone_bounds('host1.bench.test')
+        lookups = {
+            'fqdns_in_range': timed(lambda: store.fqdns_in_range('10.0.1.0/24')),
+            'zone': timed(lambda: store.dns_records(zone='host1.bench.test')),
+            'changed_ptrs': timed(lambda: store.changed_ptrs(since=time.time() - 60, ip_range='10.0.1.0/24')),
+            'fqdns_in_range_scan': timed(lambda: store._select(
+                    'SELECT fqdn FROM dns_records NOT INDEXED WHERE ip BETWEEN ? AND ?', [low, high])),
+            'zone_scan': timed(lambda: store._select(
+                    'SELECT * FROM dns_records NOT INDEXED WHERE fqdn >= ? AND fqdn < ?', [zone_low, zone_high])),
+        }
+
+        store.close()
+        size = os.path.getsize(os.path.join(directory, 'results.db'))
+
+    return {'rows': len(edges) * options.store_runs,
+            'rows_per_second': len(edges) * options.store_runs / write_seconds,
+            'bytes_per_row': size / (len(edges) * options.store_runs),
+            'lookup_seconds': lookups}
+
+
+def scenario_dns_sweep(servers: StandIns, options):
+    """PTR sweep of a whole range, mostly empty (only the first hosts IPs are populated)"""
+    from OSSER.commands.DnsReconCommand import DnsReconCommand
+    from OSSER.core.helpers import iter_ip_addresses
+
+    rss_before = peak_rss_kb()
+    started = time.perf_counter()
+    cmd = DnsReconCommand(dns_query_module_args=servers.dns_args(),
+                          command_args=DnsReconCommand.Args(
+                                  ip_addresses=iter_ip_addresses(['10.0.0.0/{}'.format(options.sweep_prefix)]),
+                                  fully_qualified_domain_names=[],
+                                  processes=options.processes,
+                                  retain_results=options.retain_results))
+    cmd.execute()
+    elapsed = time.perf_counter() - started
+
+    return {'seconds': elapsed,
+            'queries': servers.dns_queries.value,
+            'discovered': len(cmd.results),
+            'peak_rss_bytes_per_query': bytes_per_query(rss_before, servers.dns_queries.value)}
+
+
+def scenario_dns_zone(servers: StandIns, options):
+    """Recon of the zone name alone: finds the hosts only if a transfer is allowed (dns-axfr)"""
+    from OSSER.commands.DnsReconCommand import DnsReconCommand
+
+    started = time.perf_counter()
+    cmd = DnsReconCommand(dns_query_module_args=servers.dns_args(),
+                          command_args=DnsReconCommand.Args(ip_addresses=[],
+                                                            fully_qualified_domain_names=['bench.test'],
+                                                            processes=options.processes,
+                                                            retain_results=options.retain_results))
+    cmd.execute()
+    elapsed = time.perf_counter() - started
+
+    return {'seconds': elapsed,
+            'queries': servers.dns_queries.value,
+            'rounds': cmd.rounds,
+            'discovered': len(cmd.results)}
+
+
+def scenario_dns_brute(servers: StandIns, options):
+    """Recon of the zone name seeded with a wordlist (host0 .. host<wordlist_size>, the first hosts exist)"""
+    from OSSER.commands.DnsReconCommand import DnsReconCommand
+
+    with tempfile.NamedTemporaryFile('w', suffix='.txt') as wordlist:
+        for i in range(options.wordlist_size):
+            wordlist.write('host{}\n'.format(i))
+        wordlist.flush()
+
+        started = time.perf_counter()
+        cmd = DnsReconCommand(dns_query_module_args=servers.dns_args(),
+                              command_args=DnsReconCommand.Args(ip_addresses=[],
+                                                                fully_qualified_domain_names=['bench.test'],
+                                                                wordlist_path=wordlist.name))
+        cmd.execute()
+        elapsed = time.perf_counter() - started
+
+    return {'seconds': elapsed,
+            'queries': servers.dns_queries.value,
+            'queries_per_second': servers.dns_queries.value / elapsed,
+            'rounds': cmd.rounds,
+            'discovered': len(cmd.results)}
+
+
+def scenario_dns_latency(servers: StandIns, options):
+    from OSSER.modules.DnsQuery import DnsQuery
+
+    dns_query = DnsQuery(args=servers.dns_args(cache_size=0))
+    latencies = []
+    for i in range(options.samples):
+        started = time.perf_counter()
+        dns_query.do_query(query='host{}.bench.test'.format(i % options.hosts), record_type='A')
+        latencies.append(time.perf_counter() - started)
+
+    return {'queries': len(latencies), 'latency': percentiles(latencies)}
+
+
+def scenario_bing_ip_recon(servers: StandIns, options):
+    from OSSER.commands.BingIpReconCommand import BingIpReconCommand
+
+    prefix = 32 - (options.bing_hosts - 1).bit_length()
+
+    started = time.perf_counter()
+    cmd = BingIpReconCommand(dns_query_module_args=servers.dns_args(),
+                             bing_serch_module_args=servers.bing_args(max_queries=2),
+                             command_args=BingIpReconCommand.Args(ip_addresses=['10.0.0.0/{}'.format(prefix)]))
+    cmd.execute()
+    elapsed = time.perf_counter() - started
+
+    return {'seconds': elapsed,
+            'api_calls': servers.bing_requests.value,
+            'dns_queries': servers.dns_queries.value,
+            'ips_with_results': len(cmd.results),
+            'api_calls_per_second': servers.bing_requests.value / elapsed}
+
+
+def scenario_linkedin(servers: StandIns, options):
+    from OSSER.commands.BingLinkedInScraperCommand import BingLinkedInScraperCommand
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        cmd = BingLinkedInScraperCommand(
+                bing_search_module_args=servers.bing_args(max_queries=15, concurrent_pages=options.concurrent_pages),
+                command_args=BingLinkedInScraperCommand.Args(company='Bench', additional_query_args='',
+                                                             output_path=os.path.join(directory, 'out.jsonl')))
+        cmd.execute()
+        elapsed = time.perf_counter() - started
+
+    return {'seconds': elapsed,
+            'api_calls': servers.bing_requests.value,
+            'results': cmd.result_count}
+
+
+def scenario_bing_latency(servers: StandIns, options):
+    from OSSER.modules.BingSearch import BingSearch
+
+    bing_search = BingSearch(args=servers.bing_args(find_all=False))
+    latencies = []
+    for i in range(options.samples // 4):
+        started = time.perf_counter()
+        bing_search.do_search('ip:10.0.0.{}'.format(i % 250))
+        latencies.append(time.perf_counter() - started)
+
+    return {'requests': len(latencies), 'latency': percentiles(latencies)}
+
+
+def scenario_startup(servers: StandIns, options):
+    """Time to python -m OSSER <command> --help, i.e. interpreter start + imports + argument parsing"""
+    from OSSER.__main__ import COMMANDS
+
+    result = {}
+    for command in [None] + list(COMMANDS):
+        argv = [sys.executable, '-m', 'OSSER'] + ([command] if command else []) + ['--help']
+        timings = []
+        for _ in range(options.startup_runs):
+            started = time.perf_counter()
+            subprocess.run(argv, check=True, stdout=subprocess.DEVNULL)
+            timings.append(time.perf_counter() - started)
+
+        result[command or 'registry'] = percentiles(timings)['p50']
+
+    return {'seconds': result}
+
+
+SCENARIOS = {
+    'dns-recon': scenario_dns_recon,
+    'dns-sweep': scenario_dns_sweep,
+    'dns-axfr': scenario_dns_zone,
+    'dns-brute': scenario_dns_brute,
+    'dns-latency': scenario_dns_latency,
+    'bing-ip-recon': scenario_bing_ip_recon,
+    'linkedin': scenario_linkedin,
+    'bing-latency': scenario_bing_latency,
+    'startup': scenario_startup,
+    'results-store': scenario_results_store,
+}
+
+
+def run_child(options):
+    """Run a single scenario in this process, print its result as JSON on the last line"""
+    from OSSER.commands.AbstractCommand import AbstractCommand
+    from OSSER.commands.CommandExecutor import CommandExecutor
+
+    with StandIns(options, allow_transfer=options.child == 'dns-axfr') as servers, \
+            CommandExecutor.create(options.executor, options.concurrency) as executor:
+        AbstractCommand.set_executor(executor)
+        result = SCENARIOS[options.child](servers, options)
+
+    from OSSER.core.Metrics import Metrics
+
+    result['peak_rss_kb'] = peak_rss_kb()
+    # Where the time went, as seen by OSSER itself
+    result['metrics'] = Metrics.shared().summary()
+    print(json.dumps(result))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def flatten(values: dict, prefix: str = ''):
+    """:return: {'a.b.c': number} for every number nested in values"""
+    flat = {}
+    for name, value in values.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + name + '.'))
+        elif isinstance(value, (int, float)):
+            flat[prefix + name] = value
+
+    return flat
+
+
+def compare(previous: dict, current: dict):
+    """Print every numeric result next to its value in a previous run"""
+    old_values = flatten(previous.get('scenarios', {}))
+    for name, value in flatten(current['scenarios']).items():
+        print_comparison(name, old_values.get(name), value)
+
+
+def print_comparison(name: str, old_value, value):
+    if isinstance(old_value, (int, float)) and old_value:
+        print('{:<80} {:>14.4f} -> {:>14.4f} ({:+.1f}%)'.format(name, old_value, value,
+                                                                 (value - old_value) * 100 / old_value))
+    else:
+        print('{:<80} {:>14} -> {:>14.4f}'.format(name, '-', value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma separated, among: ' +
+                                                                         ', '.join(SCENARIOS))
+    parser.add_argument('--hosts', type=int, default=2000, help='Hosts in the synthetic DNS zone')
+    parser.add_argument('--cross-link', type=int, default=10, help='Every n-th PTR points to the next host')
+    parser.add_argument('--nxdomain-ratio', type=float, default=0.1)
+    parser.add_argument('--dns-latency', type=float, default=0.005, help='Seconds added to every DNS reply')
+    parser.add_argument('--bing-hosts', type=int, default=256, help='IPs searched by the bing-ip-recon scenario')
+    parser.add_argument('--bing-latency', type=float, default=0.05, help='Seconds added to every Bing reply')
+    parser.add_argument('--throttle-ratio', type=float, default=0.0, help='Ratio of Bing replies that are 429')
+    parser.add_argument('--concurrent-pages', type=int, default=4)
+    parser.add_argument('--executor', choices=('serial', 'threads', 'asyncio'), default='serial',
+                        help='How composite commands run their children (see python -m OSSER --executor)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Children run at the same time by the executor')
+    parser.add_argument('--processes', type=int, default=1, help='Worker processes of the dns-recon scenario')
+    parser.add_argument('--retain-results', default='compact', help='Of the dns-recon and dns-sweep scenarios')
+    parser.add_argument('--sweep-prefix', type=int, default=16, help='Size of the range swept by dns-sweep')
+    parser.add_argument('--wordlist-size', type=int, default=20000, help='Labels in the dns-brute wordlist')
+    parser.add_argument('--samples', type=int, default=400, help='Queries for the latency scenarios')
+    parser.add_argument('--store-runs', type=int, default=10, help='Runs written by the results-store scenario')
+    parser.add_argument('--startup-runs', type=int, default=7, help='Runs per command of the startup scenario')
+    parser.add_argument('--output', default=RESULTS_DIR, help='Directory where results are saved')
+    parser.add_argument('--compare', help='Previous results file to compare with')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        run_child(options)
+        return
+
+    results = {'commit': git_commit(),
+               'timestamp': int(time.time()),
+               'options': {k: v for k, v in vars(options).items() if k not in ('output', 'compare', 'child')},
+               'scenarios': {}}
+
+    for scenario in options.scenarios.split(','):
+        child = subprocess.run([sys.executable, '-m', 'benchmarks.run', '--child', scenario] + sys.argv[1:],
+                               stdout=subprocess.PIPE, universal_newlines=True)
+        if child.returncode != 0:
+            print('{}: failed (exit code {})'.format(scenario, child.returncode))
+            continue
+
+        results['scenarios'][scenario] = json.loads(child.stdout.strip().splitlines()[-1])
+        print('{}: {}'.format(scenario, json.dumps({k: v for k, v in results['scenarios'][scenario].items()
+                                                    if k != 'metrics'})))
+
+    os.makedirs(options.output, exist_ok=True)
+    path = os.path.join(options.output, '{}-{}.json'.format(results['timestamp'], results['commit']))
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Saved in {}'.format(path))
+
+    if options.compare:
+        with open(options.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Fixtures running the benchmark stand-ins (benchmarks.dns_server, benchmarks.bing_server) in a thread,
+so DNS and Bing commands can be tested without the network
+"""
+import asyncio
+import threading
+
+import pytest
+
+from benchmarks.bing_server import BingStandIn
+from benchmarks.dns_server import DnsServer, SyntheticZone
+from benchmarks.run import free_port, wait_for_port
+
+
+class Counter:
+    """Stands for the multiprocessing.Value the servers count their requests in"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def get_lock(self):
+        return self._lock
+
+
+@pytest.fixture
+def dns_server():
+    """
+    Factory: dns_server(hosts=10, ...) starts a DnsServer for a SyntheticZone (same arguments) on a free port
+    (or on host and port, ex. a second nameserver on 127.0.0.2 and the port of the first one)
+    The server's counter.value is the number of queries it answered
+    """
+    running = []
+
+    def start(latency: float = 0.0, host: str = '127.0.0.1', port: int = None, **zone_args):
+        server = DnsServer(SyntheticZone(**zone_args), host=host, port=port or free_port(), latency=latency,
+                           counter=Counter())
+        loop = asyncio.new_event_loop()
+
+        def run():
+            try:
+                loop.run_until_complete(server.serve())
+            except asyncio.CancelledError:
+                pass
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        wait_for_port(server.port, host=host)
+
+        running.append((loop, thread))
+        return server
+
+    yield start
+
+    for loop, thread in running:
+        loop.call_soon_threadsafe(lambda loop=loop: [task.cancel() for task in asyncio.all_tasks(loop)])
+        thread.join()
+        loop.close()
+
+
+@pytest.fixture
+def dns_args(dns_server):
+    """Factory: dns_args(server, **DnsQuery.Args) for the DnsQuery.Args querying a dns_server()"""
+    from OSSER.modules.DnsQuery import DnsQuery
+
+    def args(server: DnsServer, **kwargs):
+        kwargs.setdefault('nameservers', [server.host])
+        return DnsQuery.Args(port=server.port, **kwargs)
+
+    return args
+
+
+@pytest.fixture
+def bing_server():
+    """
+    Factory: bing_server(results_per_query=400, ...) starts a BingStandIn (same arguments) on a free port
+    The server's endpoint is the URL to give to BingSearch.Args, and counter.value the number of requests it answered
+    """
+    running = []
+
+    def start(**kwargs):
+        server = BingStandIn(port=free_port(), counter=Counter(), **kwargs)
+        server.endpoint = 'http://127.0.0.1:{}/search'.format(server.server_port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        running.append(server)
+        return server
+
+    yield start
+
+    for server in running:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,76 @@
+import time
+
+from OSSER.modules.BingCache import BingCache
+from OSSER.modules.BingSearch import BingSearch
+
+
+def put_pages(cache: BingCache, count: int, start: int = 0):
+    for offset in range(start, start + count):
+        cache.put('test', offset, 50, {}, [{'url': 'http://test.com/{}'.format(offset)}])
+        # Distinct creation times
+        time.sleep(0.001)
+
+
+def test_get_put(tmp_path):
+    cache = BingCache(str(tmp_path / 'bing.db'))
+    put_pages(cache, 1)
+
+    assert cache.get('test', 0, 50, {}, max_age=60) == [{'url': 'http://test.com/0'}]
+    # Any part of the key
+    assert cache.get('test', 1, 50, {}, max_age=60) is None
+    assert cache.get('test', 0, 10, {}, max_age=60) is None
+    assert cache.get('test', 0, 50, {'safeSearch': 'Off'}, max_age=60) is None
+    # Too old
+    assert cache.get('test', 0, 50, {}, max_age=0) is None
+    assert cache.stats() == {'hits': 1, 'misses': 4}
+
+
+def test_eviction_of_the_oldest_pages(tmp_path):
+    cache = BingCache(str(tmp_path / 'bing.db'), max_entries=10)
+    put_pages(cache, 10)
+    assert cache._count == 10
+
+    # Over max_entries: back to EVICT_RATIO * max_entries, the oldest pages first
+    put_pages(cache, 1, start=10)
+    offsets = [offset for offset in range(11) if cache.get('test', offset, 50, {}, max_age=60) is not None]
+    assert offsets == list(range(2, 11))
+
+    # Not again before the store is full
+    put_pages(cache, 1, start=11)
+    assert cache.get('test', 2, 50, {}, max_age=60) is not None
+
+
+def test_count_survives_between_runs(tmp_path):
+    put_pages(BingCache(str(tmp_path / 'bing.db'), max_entries=10), 10)
+    cache = BingCache(str(tmp_path / 'bing.db'), max_entries=10)
+    put_pages(cache, 1, start=10)
+
+    assert cache.get('test', 1, 50, {}, max_age=60) is None
+
+
+def test_shared_by_path(tmp_path):
+    path = str(tmp_path / 'bing.db')
+    cache = BingCache.shared(path, max_entries=10)
+
+    # A single connection per file, grown to the largest size asked for
+    assert BingCache.shared(path, max_entries=100) is cache
+    assert BingCache.shared(path, max_entries=10) is cache
+    assert cache.max_entries == 100
+
+
+def test_bing_search_cached_pages(bing_server, tmp_path):
+    server = bing_server(results_per_query=100)
+
+    def search(**kwargs):
+        return BingSearch(args=BingSearch.Args(bing_api_key='test_bing_search_cached_pages', endpoint=server.endpoint,
+                                               requests_per_second=1000, burst=100,
+                                               cache_path=str(tmp_path / 'bing.db'), **kwargs)).do_search('test')
+
+    results = search()
+    requests = server.counter.value
+
+    assert search() == results
+    assert server.counter.value == requests
+    # Fresh pages
+    assert search(cache_bypass=True) == results
+    assert server.counter.value == 2 * requests
@@ -0,0 +1,46 @@
+from OSSER.commands.BingIpReconCommand import BingIpReconCommand
+from OSSER.modules.BingSearch import BingSearch
+
+
+def bing_ip_recon(dns_server, dns_args, bing_server, **kwargs):
+    # host<i>.bench.test is 10.0.0.<i>, and the Bing stand-in has 3 pages hosted on it
+    dns = dns_server(hosts=20, nxdomain_ratio=0)
+    bing = bing_server()
+    return BingIpReconCommand(dns_query_module_args=dns_args(dns),
+                              bing_serch_module_args=BingSearch.Args(bing_api_key='test_bing_ip_recon',
+                                                                     endpoint=bing.endpoint, max_queries=1,
+                                                                     requests_per_second=1000, burst=100),
+                              command_args=BingIpReconCommand.Args(**kwargs))
+
+
+def test_results_attributed_to_their_ip(dns_server, dns_args, bing_server, monkeypatch):
+    monkeypatch.setattr(BingIpReconCommand, 'SEARCHES_PER_ROUND', 2)
+    # 2 IPs per search
+    cmd = bing_ip_recon(dns_server, dns_args, bing_server, ip_addresses=['10.0.0.0/29'], max_query_length=26)
+    cmd.execute()
+
+    assert sorted(cmd.results) == ['10.0.0.{}'.format(i) for i in range(1, 7)]
+    assert [x['url'] for x in cmd.results['10.0.0.3']] == ['http://host3.bench.test/page{}'.format(k)
+                                                          for k in range(3)]
+    assert cmd.unattributed_results == []
+    # The DnsRecon of the hosts found
+    assert cmd.children()[-1].results.ips_of('host3.bench.test') == {'10.0.0.3'}
+
+
+def test_searches_are_created_as_consumed(dns_server, dns_args, bing_server):
+    cmd = bing_ip_recon(dns_server, dns_args, bing_server, ip_addresses=['10.0.0.0/8'])
+
+    assert not cmd.children()
+
+
+def test_empty_ranges_are_merged(dns_server, dns_args, bing_server, tmp_path):
+    path = tmp_path / 'empty.txt'
+    path.write_text('10.0.1.0/25\n10.0.1.0/25\n2001:db8::/64\n')
+    cmd = bing_ip_recon(dns_server, dns_args, bing_server, ip_addresses=['10.0.1.0/24'],
+                        empty_ranges_path=str(path))
+
+    # Only the upper half of the range is searched
+    assert [ip for batch in cmd._batches(cmd.empty_ranges, set()) for ip in batch][0] == '10.0.1.128'
+
+    cmd._save_empty_ranges([['10.0.1.{}'.format(i) for i in range(128, 256)], ['10.0.2.1']])
+    assert path.read_text() == '10.0.1.0/24\n10.0.2.1/32\n2001:db8::/64\n'
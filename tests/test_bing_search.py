@@ -0,0 +1,83 @@
+from OSSER.modules.BingSearch import BingSearch
+
+
+def page(*urls):
+    return [{'name': '', 'description': '', 'url': url} for url in urls]
+
+
+def test_novelty_ratio():
+    novelty = BingSearch.Novelty(min_novelty=0.1, low_novelty_pages=2)
+
+    assert novelty.add(page('http://a.test/', 'http://b.test/')) == 1.0
+    # Same pages, once normalized
+    assert novelty.add(page('https://www.a.test', 'http://c.test/')) == 0.5
+    assert novelty.seen_urls == {'a.test', 'b.test', 'c.test'}
+    assert not novelty.exhausted
+
+
+def test_novelty_stops_on_page_without_new_url():
+    novelty = BingSearch.Novelty(min_novelty=0.1, low_novelty_pages=2)
+    novelty.add(page('http://a.test/'))
+    novelty.add(page('http://a.test/?utm_source=bing'))
+
+    assert novelty.exhausted
+
+
+def test_novelty_stops_on_empty_page():
+    novelty = BingSearch.Novelty(min_novelty=0.1, low_novelty_pages=2)
+
+    assert novelty.add([]) == 0.0
+    assert novelty.exhausted
+
+
+def test_novelty_stops_after_low_novelty_pages_in_a_row():
+    novelty = BingSearch.Novelty(min_novelty=0.5, low_novelty_pages=2)
+    novelty.add(page(*('http://test.com/{}'.format(i) for i in range(10))))
+
+    # 1 new URL out of 10, twice in a row
+    novelty.add(page(*('http://test.com/{}'.format(i) for i in range(1, 11))))
+    assert not novelty.exhausted
+
+    novelty.add(page(*('http://test.com/{}'.format(i) for i in range(2, 12))))
+    assert novelty.exhausted
+
+
+def test_novelty_low_pages_must_be_in_a_row():
+    novelty = BingSearch.Novelty(min_novelty=0.5, low_novelty_pages=2)
+    novelty.add(page(*('http://test.com/{}'.format(i) for i in range(10))))
+    novelty.add(page(*('http://test.com/{}'.format(i) for i in range(1, 11))))
+    # Mostly new again: the count starts over
+    novelty.add(page(*('http://test.com/{}'.format(i) for i in range(11, 21))))
+    novelty.add(page(*('http://test.com/{}'.format(i) for i in range(12, 22))))
+
+    assert not novelty.exhausted
+
+
+def bing_args(server, test: str, **kwargs):
+    # A limiter of its own (shared by API key)
+    return BingSearch.Args(bing_api_key=test, endpoint=server.endpoint, requests_per_second=1000, burst=100, **kwargs)
+
+
+def test_concurrent_pages_same_results(bing_server):
+    server = bing_server(results_per_query=400)
+    serial = BingSearch(args=bing_args(server, 'test_concurrent_pages_same_results')).do_search('test')
+    serial_requests = server.counter.value
+
+    concurrent = BingSearch(args=bing_args(server, 'test_concurrent_pages_same_results',
+                                           concurrent_pages=4)).do_search('test')
+
+    # In order, and paging stops at the first page repeating the last one
+    assert concurrent == serial
+    assert [x['url'] for x in serial] == ['https://www.linkedin.com/in/person-{}'.format(k) for k in range(400)]
+    assert serial_requests == 9
+    # The pages already in flight when paging stops are wasted, nothing more
+    assert server.counter.value - serial_requests <= 9 + 3
+
+
+def test_concurrent_pages_max_queries(bing_server):
+    server = bing_server(results_per_query=400)
+    results = BingSearch(args=bing_args(server, 'test_concurrent_pages_max_queries', concurrent_pages=4,
+                                        max_queries=3)).do_search('test')
+
+    assert len(results) == 150
+    assert server.counter.value == 3
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from OSSER.commands.AbstractCommand import AbstractCommand
+from OSSER.commands.CommandExecutor import AsyncioExecutor, CommandExecutor, SerialExecutor, ThreadedExecutor
+
+
+class Sleep(AbstractCommand):
+    """Leaf sleeping a bit, records when it ran and how many leafs were running with it"""
+
+    __slots__ = ('log', 'name')
+
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def __init__(self, log: list, name: str):
+        super().__init__()
+        self.log = log
+        self.name = name
+
+    @AbstractCommand.leaf_command
+    def execute(self):
+        with Sleep.lock:
+            Sleep.running += 1
+            Sleep.max_running = max(Sleep.max_running, Sleep.running)
+
+        time.sleep(0.05)
+        self.log.append(self.name)
+
+        with Sleep.lock:
+            Sleep.running -= 1
+
+
+class Parent(AbstractCommand):
+
+    __slots__ = ('log', 'name')
+
+    def __init__(self, log: list, name: str, children: list):
+        super().__init__()
+        self.log = log
+        self.name = name
+        for child in children:
+            self.add(child)
+
+    @AbstractCommand.composite_command
+    def execute(self):
+        pass
+
+
+@pytest.fixture(params=['serial', 'threads', 'asyncio'])
+def executor(request):
+    Sleep.running = Sleep.max_running = 0
+
+    with CommandExecutor.create(request.param, concurrency=4) as executor:
+        AbstractCommand.set_executor(executor)
+        yield executor
+
+    AbstractCommand.set_executor(SerialExecutor())
+
+
+def test_create():
+    assert type(CommandExecutor.create('serial')) is SerialExecutor
+    assert type(CommandExecutor.create('threads', 2)) is ThreadedExecutor
+    assert CommandExecutor.create('asyncio', 3).concurrency == 3
+
+
+def test_every_leaf_runs_once(executor):
+    log = []
+    done = Sleep(log, 'done')
+    done.execute()
+    parent = Parent(log, 'root', [Sleep(log, str(i)) for i in range(8)] + [done])
+
+    parent.execute()
+
+    assert parent.executed
+    assert all(child.executed for child in parent.children())
+    assert sorted(log) == ['0', '1', '2', '3', '4', '5', '6', '7', 'done']
+
+
+def test_concurrency_is_bounded(executor):
+    Parent([], 'root', [Sleep([], str(i)) for i in range(12)]).execute()
+
+    assert Sleep.max_running == (1 if isinstance(executor, SerialExecutor) else 4)
+
+
+def test_composite_children_run_after_leafs(executor):
+    log = []
+    nested = Parent(log, 'nested', [Sleep(log, 'nested leaf')])
+    Parent(log, 'root', [nested, Sleep(log, 'leaf')]).execute()
+
+    # The leaf siblings first (handed to the executor), then the composite ones
+    assert log.index('leaf') < log.index('nested leaf')
+    assert nested.executed
+
+
+def test_errors_are_raised(executor):
+    class Failing(Sleep):
+        __slots__ = ()
+
+        @AbstractCommand.leaf_command
+        def execute(self):
+            raise RuntimeError('failed')
+
+    with pytest.raises(RuntimeError):
+        Parent([], 'root', [Sleep([], 'ok'), Failing([], 'failing')]).execute()
+
+
+def test_threaded_executor_close():
+    executor = ThreadedExecutor(concurrency=2)
+    executor.run([Sleep([], 'a')])
+    executor.close()
+
+    assert executor._pool is None
+    # Usable again after close, with new workers
+    executor.run([Sleep([], 'b')])
+    executor.close()
+
+
+def test_asyncio_executor_releases_its_workers():
+    before = threading.active_count()
+    AsyncioExecutor(concurrency=4).run([Sleep([], str(i)) for i in range(4)])
+
+    assert threading.active_count() == before
@@ -0,0 +1,50 @@
+from OSSER.core.DiscoveryGraph import DiscoveryGraph
+
+
+def recon_graph():
+    """test.com (argument) -A-> 10.0.0.1 -PTR-> www.test.com -A-> 10.0.0.2, and test.com -AAAA-> 2001:db8::1"""
+    graph = DiscoveryGraph()
+    graph.add_node('test.com')
+    graph.add_edge('test.com', '10.0.0.1', 'A', 1)
+    graph.add_edge('test.com', '2001:db8::1', 'AAAA', 1)
+    graph.add_edge('10.0.0.1', 'www.test.com', 'PTR', 2)
+    graph.add_edges([('www.test.com', '10.0.0.2', 'A'), ('www.test.com', '10.0.0.1', 'A')], 3)
+
+    return graph
+
+
+def test_ips_of():
+    graph = recon_graph()
+
+    assert graph.ips_of('test.com') == {'10.0.0.1', '2001:db8::1'}
+    assert graph.ips_of('www.test.com') == {'10.0.0.1', '10.0.0.2'}
+    assert graph.ips_of('10.0.0.1') == set()
+
+
+def test_fqdns_of():
+    graph = recon_graph()
+
+    # Names resolving to it, and what its PTR points to
+    assert graph.fqdns_of('10.0.0.1') == {'test.com', 'www.test.com'}
+    assert graph.fqdns_of('10.0.0.2') == {'www.test.com'}
+
+
+def test_trace():
+    graph = recon_graph()
+
+    assert graph.trace('test.com') == []
+    assert graph.trace('10.0.0.2') == [('test.com', 'A', '10.0.0.1', 1),
+                                       ('10.0.0.1', 'PTR', 'www.test.com', 2),
+                                       ('www.test.com', 'A', '10.0.0.2', 3)]
+    # Found again later: still traced through the edge that discovered it first
+    assert graph.trace('10.0.0.1') == [('test.com', 'A', '10.0.0.1', 1)]
+    assert graph.round_of('10.0.0.2') == 3
+
+
+def test_edges_from():
+    graph = recon_graph()
+    start = graph.edge_count()
+    graph.add_edge('10.0.0.2', 'mail.test.com', 'PTR', 4)
+
+    assert list(graph.edges(start=start)) == [('10.0.0.2', 'PTR', 'mail.test.com', 4)]
+    assert len(list(graph.edges())) == start + 1
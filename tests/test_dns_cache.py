@@ -0,0 +1,102 @@
+import time
+
+import dns.rdata
+import dns.rdataclass
+
+from OSSER.modules.DnsCache import DnsCache
+
+NAMESERVERS = ['127.0.0.1:53']
+
+
+def a(address: str):
+    return dns.rdata.from_text(dns.rdataclass.IN, 'A', address)
+
+
+def test_hit_until_ttl():
+    cache = DnsCache(max_entries=10)
+    cache.put('www.test.com.', 'A', NAMESERVERS, [a('10.0.0.1')], ttl=0.2)
+
+    # Same name, whatever the case or trailing dot
+    assert cache.get('WWW.test.com', 'A', NAMESERVERS) == [a('10.0.0.1')]
+    # Other type, other nameservers
+    assert cache.get('www.test.com', 'AAAA', NAMESERVERS) is None
+    assert cache.get('www.test.com', 'A', ['10.0.0.53:53']) is None
+
+    time.sleep(0.25)
+    assert cache.get('www.test.com', 'A', NAMESERVERS) is None
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'entries': 0}
+
+
+def test_negative_answer():
+    cache = DnsCache(max_entries=10)
+    cache.put('nodata.test.com', 'MX', NAMESERVERS, [], ttl=60)
+    cache.put('zero.test.com', 'A', NAMESERVERS, [a('10.0.0.1')], ttl=0)
+
+    assert cache.get('nodata.test.com', 'MX', NAMESERVERS) == []
+    assert cache.get('zero.test.com', 'A', NAMESERVERS) is None
+
+
+def test_lru_eviction():
+    cache = DnsCache(max_entries=2)
+    cache.put('a.test.com', 'A', NAMESERVERS, [a('10.0.0.1')], ttl=60)
+    cache.put('b.test.com', 'A', NAMESERVERS, [a('10.0.0.2')], ttl=60)
+    # a is now the most recently used
+    cache.get('a.test.com', 'A', NAMESERVERS)
+    cache.put('c.test.com', 'A', NAMESERVERS, [a('10.0.0.3')], ttl=60)
+
+    assert cache.get('b.test.com', 'A', NAMESERVERS) is None
+    assert cache.get('a.test.com', 'A', NAMESERVERS) == [a('10.0.0.1')]
+    assert cache.get('c.test.com', 'A', NAMESERVERS) == [a('10.0.0.3')]
+
+
+def test_nxdomain_ancestor():
+    cache = DnsCache(max_entries=10)
+    cache.put_nxdomain('gone.test.com.', NAMESERVERS, ttl=0.2)
+
+    assert cache.nxdomain_ancestor('a.b.gone.test.com', NAMESERVERS) == 'gone.test.com'
+    assert cache.nxdomain_ancestor('gone.test.com', NAMESERVERS) == 'gone.test.com'
+    assert cache.nxdomain_ancestor('test.com', NAMESERVERS) is None
+    assert cache.nxdomain_ancestor('agone.test.com', NAMESERVERS) is None
+
+    time.sleep(0.25)
+    assert cache.nxdomain_ancestor('a.gone.test.com', NAMESERVERS) is None
+
+
+def test_sqlite_survives_between_runs(tmp_path):
+    path = str(tmp_path / 'dns.db')
+    cache = DnsCache(max_entries=10, path=path)
+    cache.put('www.test.com', 'A', NAMESERVERS, [a('10.0.0.1')], ttl=60)
+    cache.put('expired.test.com', 'A', NAMESERVERS, [a('10.0.0.2')], ttl=0.1)
+    cache.flush()
+    time.sleep(0.15)
+
+    # A new run: nothing in memory
+    cache = DnsCache(max_entries=10, path=path)
+
+    assert cache.get('www.test.com', 'A', NAMESERVERS) == [a('10.0.0.1')]
+    assert cache.get('expired.test.com', 'A', NAMESERVERS) is None
+    assert cache.stats()['entries'] == 1
+
+
+def test_shared_by_path(tmp_path):
+    path = str(tmp_path / 'dns.db')
+    cache = DnsCache.shared(max_entries=10, path=path)
+
+    # Same file, a single connection, grown to the largest size asked for
+    assert DnsCache.shared(max_entries=100, path=path) is cache
+    assert cache.max_entries == 100
+    assert DnsCache.shared(max_entries=10, path=path) is cache
+    assert cache.max_entries == 100
+    assert DnsCache.shared(max_entries=10, path=str(tmp_path / 'other.db')) is not cache
+
+
+def test_disabled(tmp_path):
+    path = str(tmp_path / 'dns.db')
+    cache = DnsCache.shared(max_entries=0, path=path)
+    cache.put('www.test.com', 'A', NAMESERVERS, [a('10.0.0.1')], ttl=60)
+    cache.put_nxdomain('gone.test.com', NAMESERVERS, ttl=60)
+
+    assert cache is not DnsCache.shared(max_entries=0, path=path)
+    assert cache.get('www.test.com', 'A', NAMESERVERS) is None
+    assert cache.nxdomain_ancestor('gone.test.com', NAMESERVERS) is None
+    assert not (tmp_path / 'dns.db').exists()
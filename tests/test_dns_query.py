@@ -0,0 +1,147 @@
+import time
+
+import dns.exception
+import pytest
+
+from OSSER.modules.DnsQuery import DnsQuery
+
+
+def texts(results: list):
+    return [x.to_text() for x in results]
+
+
+def test_query_many(dns_server, dns_args):
+    server = dns_server(hosts=10)
+    dns_query = DnsQuery(args=dns_args(server, cache_size=0))
+    queries = ['host{}.bench.test.'.format(i) for i in range(12)]
+    seen = []
+
+    results = dns_query.do_query_many(queries + queries[:3], 'A', on_result=lambda query, res: seen.append(query))
+
+    # Each query once, with the same answers as one by one
+    assert sorted(seen) == sorted(queries)
+    assert server.counter.value == 12
+    assert {query: texts(res) for query, res in results.items()} == \
+        {query: texts(dns_query.do_query(query, 'A')) for query in queries}
+    assert results['host1.bench.test.'][0].address == '10.0.0.1'
+    assert results['host11.bench.test.'] == []
+
+
+def test_query_many_max_in_flight(dns_server, dns_args):
+    server = dns_server(hosts=20, nxdomain_ratio=0, latency=0.1)
+    queries = ['host{}.bench.test.'.format(i) for i in range(20)]
+
+    # 5 rounds of 4 queries
+    started = time.monotonic()
+    DnsQuery(args=dns_args(server, cache_size=0, max_in_flight=4)).do_query_many(queries)
+    assert time.monotonic() - started >= 0.5
+
+    # A single one
+    started = time.monotonic()
+    DnsQuery(args=dns_args(server, cache_size=0, max_in_flight=20)).do_query_many(queries)
+    assert time.monotonic() - started < 0.4
+
+
+def test_query_stream_window(dns_server, dns_args):
+    server = dns_server(hosts=100, nxdomain_ratio=0)
+    dns_query = DnsQuery(args=dns_args(server, cache_size=0, max_in_flight=4))
+    pulled, resolved, outstanding = [0], [], []
+
+    def queries():
+        for i in range(100):
+            pulled[0] += 1
+            yield 'host{}.bench.test.'.format(i)
+
+    def on_result(query: str, _):
+        outstanding.append(pulled[0] - len(resolved))
+        resolved.append(query)
+
+    assert dns_query.do_query_stream(queries(), 'A', on_result=on_result) == 100
+    assert len(resolved) == 100
+    # Never more queries pulled than the window, plus the one waiting for a slot
+    assert max(outstanding) == 4 + 1
+
+
+def test_query_types_many(dns_server, dns_args):
+    server = dns_server(hosts=10, nxdomain_ratio=0)
+    dns_query = DnsQuery(args=dns_args(server, cache_size=0))
+    seen = []
+
+    answers = dns_query.do_query_types_many(['bench.test.', 'host1.bench.test.'], ('a', 'AAAA', 'NS', 'MX'),
+                                            on_result=lambda query, record_type, _: seen.append((query, record_type)))
+
+    # Every type of every name, in a single batch
+    assert server.counter.value == len(seen) == 8
+    assert answers['bench.test.'].targets() == ['ns1.bench.test.']
+    assert answers['host1.bench.test.'].addresses() == ['10.0.0.1']
+    assert answers['host1.bench.test.']['MX'] == []
+
+    with pytest.raises(NotImplementedError):
+        dns_query.do_query_types('bench.test.', ('A', 'NOPE'))
+
+
+def test_failed_queries(dns_server, dns_args):
+    # Every answer comes after the query's lifetime
+    server = dns_server(hosts=10, latency=0.5)
+    dns_query = DnsQuery(args=dns_args(server, cache_size=0, timeout=0.1, ttl=0.2))
+    failed = []
+
+    results = dns_query.do_query_batch([('host1.bench.test.', 'A'), ('bench.test.', 'NS')],
+                                       on_error=lambda query, record_type, err: failed.append((query, record_type)))
+
+    # Answered with no record, and given to on_error
+    assert results == {('host1.bench.test.', 'A'): [], ('bench.test.', 'NS'): []}
+    assert sorted(failed) == [('bench.test.', 'NS'), ('host1.bench.test.', 'A')]
+
+    dns_query = DnsQuery(args=dns_args(server, cache_size=0, timeout=0.1, ttl=0.2, skip_errors=False))
+    with pytest.raises(dns.exception.Timeout):
+        dns_query.do_query_many(['host1.bench.test.'])
+
+
+def test_nxdomain_cut_of_reverse_names(dns_server, dns_args):
+    # 10.1.0.0/16 has no reverse zone
+    server = dns_server(hosts=10)
+    dns_query = DnsQuery(args=dns_args(server))
+    assert dns_query.do_query('1.10.in-addr.arpa.', 'SOA') == []
+    queries = server.counter.value
+
+    assert dns_query.known_nonexistent('5.0.1.10.in-addr.arpa.')
+    assert dns_query.do_query('10.1.0.5', 'PTR') == []
+    assert server.counter.value == queries
+
+
+def test_no_nxdomain_cut_of_forward_names(dns_server, dns_args):
+    # Some nameservers answer NXDOMAIN to empty non-terminals: names below one may still exist
+    server = dns_server(hosts=10)
+    dns_query = DnsQuery(args=dns_args(server))
+    assert dns_query.do_query('gone.bench.test.', 'A') == []
+    queries = server.counter.value
+
+    assert not dns_query.known_nonexistent('a.gone.bench.test')
+    dns_query.do_query('a.gone.bench.test.', 'A')
+    assert server.counter.value == queries + 1
+
+    # Unless asked for
+    dns_query = DnsQuery(args=dns_args(server, nxdomain_cut_forward=True))
+    assert dns_query.do_query('b.gone.bench.test.', 'A') == []
+    assert server.counter.value == queries + 1
+
+
+def test_zone_transfer(dns_server, dns_args):
+    server = dns_server(hosts=10, nxdomain_ratio=0, allow_transfer=True)
+    dns_query = DnsQuery(args=dns_args(server))
+
+    # By name: ns1.bench.test is resolved (A and AAAA) first
+    zone = dns_query.do_zone_transfer('bench.test', ['ns1.bench.test.'])
+    assert zone.get_rdataset('host5.bench.test.', 'A')[0].address == '10.0.0.5'
+
+    # Refused (the zone is not transferable), or nothing listening
+    assert dns_query.do_zone_transfers({'host1.bench.test': ['127.0.0.1'], 'bench.test': []}) == \
+        {'host1.bench.test': None, 'bench.test': None}
+
+
+def test_zone_transfer_refused(dns_server, dns_args):
+    server = dns_server(hosts=10)
+    dns_query = DnsQuery(args=dns_args(server))
+
+    assert dns_query.do_zone_transfer('bench.test', ['127.0.0.1']) is None
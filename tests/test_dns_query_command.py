@@ -0,0 +1,67 @@
+import sys
+
+from OSSER.commands.AbstractCommand import AbstractCommand
+from OSSER.commands.DnsQueryCommand import DnsQueryCommand
+from OSSER.commands.DnsReconCommand import DnsReconCommand
+from OSSER.core.helpers import iter_ip_addresses
+from OSSER.modules.DnsQuery import DnsQuery
+
+
+def test_no_instance_dict():
+    cmd = DnsQueryCommand(dns_query_module_args=DnsQuery.Args(),
+                          command_args=DnsQueryCommand.Args(record_type='a', dns_query='www.test.com'))
+
+    assert not hasattr(cmd, '__dict__')
+    assert not hasattr(cmd.command_args, '__dict__')
+    assert isinstance(cmd.command_args, tuple)
+    # A single string per record type
+    assert cmd.command_args.record_type is sys.intern('A')
+
+
+def test_args_repr():
+    class Slotted(AbstractCommand.AbstractArgs):
+        __slots__ = ('a', 'b')
+
+        def __init__(self):
+            self.a = 1
+            self.b = 'x'
+
+    assert repr(Slotted()) == "test_args_repr.<locals>.Slotted(a=1, b='x')"
+    assert str(DnsQueryCommand.Args(record_type='A', dns_query='test.com')) == \
+        "{'record_type': 'A', 'dns_query': 'test.com'}"
+    assert str(DnsQuery.Args(port=5353)).startswith("{'ttl': 3, 'nameservers': None, 'port': 5353")
+
+
+def test_retain_results(dns_server, dns_args):
+    server = dns_server(hosts=10, nxdomain_ratio=0)
+
+    def recon(retain_results: str):
+        cmd = DnsReconCommand(dns_query_module_args=dns_args(server),
+                              command_args=DnsReconCommand.Args(ip_addresses=iter_ip_addresses(['10.0.0.0/28']),
+                                                                fully_qualified_domain_names=[],
+                                                                retain_results=retain_results))
+        cmd.execute()
+        return cmd
+
+    full, compact, none = recon('full'), recon('compact'), recon('none')
+
+    # The same graph, whatever is kept of the queries
+    assert sorted(full.results.edges()) == sorted(compact.results.edges()) == sorted(none.results.edges())
+
+    ptr = next(cmd for cmd in full.children() if cmd.command_args == ('PTR', '10.0.0.1'))
+    assert not isinstance(ptr.results[0], str)
+
+    ptr = next(cmd for cmd in compact.children() if cmd.command_args == ('PTR', '10.0.0.1'))
+    assert ptr.results == ('host1.bench.test.',)
+
+    assert not none.children()
+
+
+def test_shard_of():
+    shards = {DnsQueryCommand.shard_of('A', 'host{}.bench.test.'.format(i), 4) for i in range(50)}
+    # A zone in a single shard, whatever the case or trailing dot
+    assert shards == {DnsQueryCommand.shard_of('A', 'BENCH.test', 4)}
+    assert DnsQueryCommand.shard_of('MX', 'www.bench.test', 4) in shards
+
+    # PTRs by IP, spread over every shard
+    assert {DnsQueryCommand.shard_of('PTR', '10.0.0.{}'.format(i), 4) for i in range(50)} == {0, 1, 2, 3}
@@ -0,0 +1,163 @@
+from OSSER.commands.DnsReconCommand import DnsReconCommand
+from OSSER.core.Journal import Journal
+from OSSER.core.ResultStore import ResultStore
+from OSSER.core.helpers import iter_ip_addresses
+
+
+def recon(server, dns_args, ip_addresses=(), fqdns=(), **kwargs):
+    """:return: The executed DnsReconCommand, against a dns_server()"""
+    cmd = DnsReconCommand(dns_query_module_args=dns_args(server),
+                          command_args=DnsReconCommand.Args(ip_addresses=ip_addresses,
+                                                            fully_qualified_domain_names=fqdns, **kwargs))
+    cmd.execute()
+
+    return cmd
+
+
+def test_sweep_skips_dead_reverse_zones(dns_server, dns_args):
+    # 10.0.0.0 - 10.0.0.9, the other /24s of the /22 have no reverse zone
+    server = dns_server(hosts=10, nxdomain_ratio=0)
+    cmd = recon(server, dns_args, ip_addresses=iter_ip_addresses(['10.0.0.0/22']), wildcard_probes=0)
+
+    assert cmd.results.fqdns_of('10.0.0.5') == {'host5.bench.test'}
+    assert {ip for ip in cmd.seen_ip_addresses if cmd.results.fqdns_of(ip)} == \
+        set('10.0.0.{}'.format(i) for i in range(1, 10))
+    # The PTRs of the first /24, a few probes, and the A queries of the hosts found, not one PTR per IP
+    assert server.counter.value < 254 + 10 + 10
+
+
+def test_sweep_without_probes(dns_server, dns_args):
+    server = dns_server(hosts=10, nxdomain_ratio=0)
+    cmd = recon(server, dns_args, ip_addresses=iter_ip_addresses(['10.0.0.0/22']), wildcard_probes=0,
+                reverse_zone_probe_min=0)
+
+    assert cmd.results.fqdns_of('10.0.0.5') == {'host5.bench.test'}
+    assert server.counter.value >= 1022
+
+
+def test_zone_transfer(dns_server, dns_args, tmp_path):
+    server = dns_server(hosts=10, nxdomain_ratio=0, cross_link=0, allow_transfer=True)
+    cmd = recon(server, dns_args, fqdns=['bench.test'], wildcard_probes=0, results_path=str(tmp_path / 'results.db'))
+
+    assert cmd.transferred_zones == {'bench.test'}
+    assert cmd.results.ips_of('host5.bench.test') == {'10.0.0.5'}
+    assert cmd.trace('host5.bench.test') == [('bench.test', 'AXFR', 'host5.bench.test', 1)]
+    # NS, A/AAAA of the nameserver, the transfer, 2 reverse zone probes and the PTRs of the 11 IPs of the zone,
+    # not the A queries of the hosts: the transfer answered them
+    assert server.counter.value == 1 + 2 + 1 + 2 + 11
+
+
+def test_zone_transfer_of_parent(dns_server, dns_args):
+    server = dns_server(hosts=10, nxdomain_ratio=0, allow_transfer=True)
+    cmd = recon(server, dns_args, fqdns=['host1.bench.test'], wildcard_probes=0)
+
+    assert cmd.transferred_zones == {'bench.test'}
+    assert cmd.results.ips_of('host5.bench.test') == {'10.0.0.5'}
+
+
+def test_load_zone(dns_server, dns_args, tmp_path):
+    server = dns_server(hosts=10)
+    cmd = DnsReconCommand(dns_query_module_args=dns_args(server),
+                          command_args=DnsReconCommand.Args(ip_addresses=[], fully_qualified_domain_names=[]))
+    cmd.rounds = 1
+    cmd._load_zone('test.com', {('test.com', 'NS'): ['ns1.test.com.'],
+                                ('www.test.com', 'A'): ['10.0.0.1'],
+                                ('www.test.com', 'MX'): ['10 mx.test.com.'],
+                                ('www.test.com', 'TXT'): ['"hello"']}, frontier=[], journal=None)
+    cmd._load_zone('0.0.10.in-addr.arpa', {('1.0.0.10.in-addr.arpa', 'PTR'): ['www.test.com.']},
+                   frontier=[], journal=None)
+
+    edges = list(cmd.results.edges())
+    # Once per name, whatever its number of records
+    assert [edge for edge in edges if edge[1] == 'AXFR' and edge[2] == 'www.test.com'] == \
+        [('test.com', 'AXFR', 'www.test.com', 1)]
+    # From the IP, not from its reverse name
+    assert ('10.0.0.1', 'PTR', 'www.test.com', 1) in edges
+
+    store = ResultStore(str(tmp_path / 'results.db'))
+    store.add_dns_records(store.begin_run('dns-recon', {}), edges)
+    store.close()
+
+
+def test_sharded(dns_server, dns_args):
+    server = dns_server(hosts=40, nxdomain_ratio=0.1)
+
+    def sharded_recon(processes: int):
+        cmd = DnsReconCommand(dns_query_module_args=dns_args(server, cache_size=0),
+                              command_args=DnsReconCommand.Args(ip_addresses=iter_ip_addresses(['10.0.0.0/26']),
+                                                                fully_qualified_domain_names=['bench.test'],
+                                                                processes=processes))
+        cmd.execute()
+        return cmd
+
+    single = sharded_recon(1)
+    queries = server.counter.value
+    sharded = sharded_recon(3)
+
+    # Same graph, same queries, only resolved by the workers
+    assert sorted(sharded.results.edges()) == sorted(single.results.edges())
+    assert sharded.results.fqdns_of('10.0.0.5') == {'host5.bench.test'}
+    assert server.counter.value == 2 * queries
+
+
+def test_wildcard_answers_are_not_followed(dns_server, dns_args):
+    server = dns_server(hosts=10, nxdomain_ratio=0, wildcard='10.0.0.200')
+    cmd = recon(server, dns_args, fqdns=['host1.bench.test', 'www.bench.test'])
+
+    assert cmd.wildcard_zones['bench.test'] == {'10.0.0.200'}
+    assert cmd.synthetic_fqdns == {'www.bench.test'}
+    assert cmd.results.ips_of('host1.bench.test') == {'10.0.0.1'}
+    # No PTR of the wildcard's IP
+    assert '10.0.0.200' not in cmd.seen_ip_addresses
+
+    # Without probes, it is just another answer
+    cmd = recon(server, dns_args, fqdns=['host1.bench.test', 'www.bench.test'], wildcard_probes=0)
+    assert not cmd.wildcard_zones
+    assert '10.0.0.200' in cmd.seen_ip_addresses
+
+
+def test_record_types(dns_server, dns_args):
+    server = dns_server(hosts=10, nxdomain_ratio=0)
+    cmd = recon(server, dns_args, fqdns=['bench.test'], record_types=('A', 'NS', 'MX'), zone_transfers=False,
+                wildcard_probes=0)
+
+    # The NS target is within scope: followed, and its A fed back
+    assert ('bench.test', 'NS', 'ns1.bench.test', 1) in cmd.results.edges()
+    assert cmd.results.ips_of('ns1.bench.test') == {'127.0.0.1'}
+    assert '127.0.0.1' in cmd.seen_ip_addresses
+    assert {child.command_args.record_type for child in cmd.children()} == {'A', 'NS', 'MX', 'PTR'}
+
+
+def test_failed_queries_are_journaled(dns_server, dns_args, tmp_path):
+    server = dns_server(hosts=10, latency=0.5)
+    journal_path = str(tmp_path / 'recon.journal')
+    cmd = DnsReconCommand(dns_query_module_args=dns_args(server, cache_size=0, timeout=0.1, ttl=0.2),
+                          command_args=DnsReconCommand.Args(ip_addresses=[], zone_transfers=False, wildcard_probes=0,
+                                                            fully_qualified_domain_names=['host1.bench.test'],
+                                                            record_types=('A', 'MX'), journal_path=journal_path))
+    cmd.execute()
+
+    # host1.bench.test and bench.test, A and MX: no answer, the recon still completes
+    assert cmd.failed_queries == 4
+    assert not cmd.results.ips_of('host1.bench.test')
+    assert sorted((entry['type'], entry['query']) for entry in Journal.replay(journal_path) if entry.get('failed')) == \
+        [('A', 'bench.test'), ('A', 'host1.bench.test'), ('MX', 'bench.test'), ('MX', 'host1.bench.test')]
+
+
+def test_brute_force(dns_server, dns_args, tmp_path):
+    wordlist_path = tmp_path / 'subdomains.txt'
+    wordlist_path.write_text('host1\nhost3\nwww\nmail\n')
+
+    server = dns_server(hosts=10, nxdomain_ratio=0)
+    cmd = recon(server, dns_args, fqdns=['bench.test'], wordlist_path=str(wordlist_path), zone_transfers=False)
+
+    assert ('bench.test', 'BRUTE', 'host3.bench.test', 0) in cmd.results.edges()
+    assert cmd.results.ips_of('host3.bench.test') == {'10.0.0.3'}
+    assert 'host3.bench.test' in cmd.seen_fqdns and 'www.bench.test' not in cmd.seen_fqdns
+
+    # Wildcard answers are not hits
+    server = dns_server(hosts=10, nxdomain_ratio=0, wildcard='10.0.0.200')
+    cmd = recon(server, dns_args, fqdns=['bench.test'], wordlist_path=str(wordlist_path), zone_transfers=False)
+
+    assert {edge[2] for edge in cmd.results.edges() if edge[1] == 'BRUTE'} == {'host1.bench.test', 'host3.bench.test'}
+    assert 'www.bench.test' not in cmd.seen_fqdns
@@ -0,0 +1,35 @@
+import pytest
+
+import OSSER.core.helpers as helpers
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.Test.com:443/a/?utm_source=x&b=2&a=1#top', 'test.com/a?a=1&b=2'),
+    ('http://test.com/a', 'test.com/a'),
+    ('http://test.com:8080/a/', 'test.com:8080/a'),
+    ('https://www.linkedin.com/in/someone?trk=public_profile', 'linkedin.com/in/someone'),
+    ('https://test.com/', 'test.com'),
+    ('https://test.com/?q=', 'test.com?q='),
+])
+def test_normalize_url(url, expected):
+    assert helpers.normalize_url(url) == expected
+
+
+def test_normalize_fqdn():
+    assert helpers.normalize_fqdn(' Admin.Test.COM. ') == 'admin.test.com'
+
+
+def test_expand_fqdn():
+    assert helpers.expand_fqdn('this.is.sparta.com') == ['sparta.com', 'is.sparta.com', 'this.is.sparta.com']
+
+
+def test_iter_ip_addresses():
+    assert list(helpers.iter_ip_addresses(['10.0.0.1', '10.0.0.0/30', '10.0.1.0/31'])) == \
+        ['10.0.0.1', '10.0.0.1', '10.0.0.2', '10.0.1.0', '10.0.1.1']
+
+
+def test_extract_fqdn_from_bing_results():
+    results = [{'url': url} for url in ('https://www.Test.com/a', 'http://test.com:8080/', 'http://1.2.3.4:8080/',
+                                        'http://[::1]/a', 'http://[2001:db8::1]:8443/', 'mailto:someone')]
+
+    assert helpers.extract_fqdn_from_bing_results(results) == {'www.test.com', 'test.com'}
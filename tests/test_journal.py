@@ -0,0 +1,101 @@
+from OSSER.commands.DnsReconCommand import DnsReconCommand
+from OSSER.core.Journal import Journal
+from OSSER.modules.DnsQuery import DnsQuery
+
+
+def test_replay_skips_torn_last_line(tmp_path):
+    path = str(tmp_path / 'recon.journal')
+    journal = Journal(path)
+    journal.append({'query': 'a'})
+    journal.append({'query': 'b'})
+    journal.close()
+
+    # The run died while writing its last entry
+    with open(path, 'a') as f:
+        f.write('{"query": "c", "ans')
+
+    assert [entry['query'] for entry in Journal.replay(path)] == ['a', 'b']
+
+
+def test_resume_appends_after_torn_line(tmp_path):
+    path = str(tmp_path / 'recon.journal')
+    with open(path, 'w') as f:
+        f.write('{"query": "a"}\n{"query": "b", "ans')
+
+    journal = Journal(path, resume=True)
+    journal.append({'query': 'c'})
+    journal.close()
+
+    assert [entry['query'] for entry in Journal.replay(path)] == ['a', 'c']
+
+
+def test_replay_missing_file(tmp_path):
+    assert list(Journal.replay(str(tmp_path / 'missing.journal'))) == []
+
+
+def test_recon_resume_does_not_query_again(tmp_path):
+    path = str(tmp_path / 'recon.journal')
+    journal = Journal(path)
+    journal.append({'round': 1, 'type': 'A', 'query': 'test.com', 'answers': []})
+    journal.append({'round': 1, 'type': 'A', 'query': 'www.test.com', 'answers': ['10.0.0.1']})
+    journal.append({'round': 2, 'type': 'PTR', 'query': '10.0.0.1', 'answers': ['www.test.com.']})
+    journal.close()
+    with open(path, 'a') as f:
+        f.write('{"round": 2, "type": "PTR", "qu')
+
+    # Nothing listens there: a query sent anyway would fail (and its answer would be missing)
+    dns_args = DnsQuery.Args(nameservers=['127.0.0.1'], port=9, timeout=0.1, ttl=0.1, cache_size=0)
+    cmd = DnsReconCommand(dns_query_module_args=dns_args,
+                          command_args=DnsReconCommand.Args(ip_addresses=[],
+                                                            fully_qualified_domain_names=['www.test.com'],
+                                                            journal_path=path,
+                                                            resume=True,
+                                                            reverse_zone_probe_min=0,
+                                                            wildcard_probes=0,
+                                                            zone_transfers=False))
+    cmd.execute()
+
+    assert cmd.failed_queries == 0
+    assert cmd.trace('10.0.0.1') == [('www.test.com', 'A', '10.0.0.1', 1)]
+    assert cmd.results.fqdns_of('10.0.0.1') == {'www.test.com'}
+
+
+def test_existing_journal_is_kept_aside(tmp_path):
+    path = str(tmp_path / 'recon.journal')
+    for query in ('a', 'b', 'c'):
+        journal = Journal(path)
+        journal.append({'query': query})
+        journal.close()
+
+    assert journal.rotated_path == path + '.2'
+    assert [[entry['query'] for entry in Journal.replay(p)] for p in (path + '.1', path + '.2', path)] == \
+        [['a'], ['b'], ['c']]
+
+
+def test_recon_resume_sends_no_probe_again(dns_server, dns_args, tmp_path):
+    """Zone transfer (NS and nameserver lookups included), wildcard and reverse zone probes come from the journal"""
+    path = str(tmp_path / 'recon.journal')
+
+    def recon(server, resume: bool):
+        cmd = DnsReconCommand(dns_query_module_args=dns_args(server),
+                              command_args=DnsReconCommand.Args(ip_addresses=['10.0.1.{}'.format(i) for i in range(10)],
+                                                                fully_qualified_domain_names=['bench.test',
+                                                                                              'www.other.test'],
+                                                                journal_path=path,
+                                                                resume=resume))
+        cmd.execute()
+        return cmd
+
+    first = recon(dns_server(hosts=10, allow_transfer=True), resume=False)
+    assert first.transferred_zones == {'bench.test'}
+    assert '1.0.10.in-addr.arpa.' in first._dead_zones
+    assert first.wildcard_zones == {'other.test': frozenset()}
+
+    # Another server (so nothing comes from the DnsCache either)
+    server = dns_server(hosts=10, allow_transfer=True)
+    resumed = recon(server, resume=True)
+
+    assert server.counter.value == 0
+    assert sorted(resumed.results.edges()) == sorted(first.results.edges())
+    assert resumed._dead_zones == first._dead_zones
+    assert resumed.wildcard_zones == first.wildcard_zones
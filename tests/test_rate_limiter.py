@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from OSSER.core.RateLimiter import RateLimiter
+from OSSER.modules.BingSearch import BingSearch
+
+
+def test_burst_then_rate():
+    limiter = RateLimiter(rate=20, burst=2)
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+
+    # 2 at once, then one every 1/20s
+    assert 0.09 <= time.monotonic() - started < 0.2
+    assert limiter.throttled_time >= 0.09
+
+
+def test_backoff_pauses_and_halves_the_rate():
+    limiter = RateLimiter(rate=100, burst=10)
+    limiter.backoff(0.2)
+    assert limiter.rate == 50
+
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.2
+
+    # Back towards the configured rate, never above it
+    for _ in range(20):
+        limiter.success()
+    assert limiter.rate == 100
+
+
+def test_backoff_min_rate():
+    limiter = RateLimiter(rate=1, burst=1, min_rate=0.5)
+    limiter.backoff(0)
+    limiter.backoff(0)
+
+    assert limiter.rate == 0.5
+
+
+def test_shared_keeps_the_first_settings():
+    limiter = RateLimiter.shared(key='test_shared_keeps_the_first_settings', rate=5, burst=2)
+
+    assert RateLimiter.shared(key='test_shared_keeps_the_first_settings', rate=5, burst=2) is limiter
+    with pytest.warns(RuntimeWarning):
+        assert RateLimiter.shared(key='test_shared_keeps_the_first_settings', rate=10, burst=2) is limiter
+    assert (limiter.max_rate, limiter.burst) == (5, 2)
+
+
+def test_bing_search_retry_after(bing_server):
+    """Every request gets a 429 with Retry-After: 1, retried once after that second, then given up"""
+    server = bing_server(throttle_ratio=1.0)
+    bing_search = BingSearch(args=BingSearch.Args(bing_api_key='test_bing_search_retry_after', endpoint=server.endpoint,
+                                                  find_all=False, requests_per_second=100, burst=10, max_retries=1,
+                                                  backoff=30))
+
+    started = time.monotonic()
+    with pytest.raises(BingSearch.Throttled) as err:
+        bing_search.do_search('ip:10.0.0.1')
+
+    assert err.value.status_code == 429
+    assert err.value.retry_after == 1
+    # Retry-After, not backoff * 2^attempt
+    assert 1 <= time.monotonic() - started < 5
+    assert server.counter.value == 2
+    assert bing_search.rate_limiter.rate == 50
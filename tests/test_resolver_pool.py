@@ -0,0 +1,61 @@
+import pytest
+
+from OSSER.modules.DnsQuery import DnsQuery
+from OSSER.modules.ResolverPool import ResolverPool
+
+NAMESERVERS = ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+
+
+def test_shared_by_settings():
+    pool = ResolverPool.get(nameservers=NAMESERVERS, port=5353)
+
+    assert ResolverPool.get(nameservers=NAMESERVERS, port=5353) is pool
+    assert ResolverPool.get(nameservers=NAMESERVERS, port=53) is not pool
+    assert ResolverPool.get(nameservers=NAMESERVERS, port=5353, balancing=ResolverPool.LEAST_LOAD) is not pool
+    assert DnsQuery(args=DnsQuery.Args(nameservers=NAMESERVERS, port=5353))._pool is pool
+
+
+def test_resolvers_fall_back_on_the_others():
+    pool = ResolverPool(NAMESERVERS, port=5353, timeout=1, lifetime=2, balancing=ResolverPool.ROUND_ROBIN)
+
+    assert pool.endpoints == ('10.0.0.1#5353', '10.0.0.2#5353', '10.0.0.3#5353')
+    assert pool.resolver(1).nameservers == ['10.0.0.2', '10.0.0.3', '10.0.0.1']
+    assert pool.async_resolver(2).nameservers == ['10.0.0.3', '10.0.0.1', '10.0.0.2']
+    assert (pool.resolver(0).port, pool.resolver(0).timeout, pool.resolver(0).lifetime) == (5353, 1, 2)
+
+
+def test_round_robin():
+    pool = ResolverPool(NAMESERVERS, port=53, timeout=3, lifetime=3, balancing=ResolverPool.ROUND_ROBIN)
+
+    # Whatever the load
+    assert [pool.acquire() for _ in range(7)] == [0, 1, 2, 0, 1, 2, 0]
+
+
+def test_least_load():
+    pool = ResolverPool(NAMESERVERS, port=53, timeout=3, lifetime=3, balancing=ResolverPool.LEAST_LOAD)
+
+    # Idle nameservers are all used first
+    assert sorted(pool.acquire() for _ in range(3)) == [0, 1, 2]
+
+    # Then the ones done with their queries
+    pool.release(1)
+    assert pool.acquire() == 1
+    pool.release(2)
+    pool.release(2)
+    assert [pool.acquire(), pool.acquire()] == [2, 2]
+    assert pool._load == [1, 1, 1]
+
+
+def test_unknown_balancing():
+    with pytest.raises(NotImplementedError):
+        ResolverPool(NAMESERVERS, port=53, timeout=3, lifetime=3, balancing='random')
+
+
+def test_queries_spread_over_nameservers(dns_server, dns_args):
+    first = dns_server(hosts=20, nxdomain_ratio=0)
+    second = dns_server(hosts=20, nxdomain_ratio=0, host='127.0.0.2', port=first.port)
+    dns_query = DnsQuery(args=dns_args(first, nameservers=['127.0.0.1', '127.0.0.2'], cache_size=0))
+
+    dns_query.do_query_many(['host{}.bench.test.'.format(i) for i in range(20)])
+
+    assert (first.counter.value, second.counter.value) == (10, 10)
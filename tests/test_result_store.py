@@ -0,0 +1,66 @@
+import pytest
+
+from OSSER.core.ResultStore import ResultStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.db'), batch_size=2)
+    run = store.begin_run('dns-recon', {'fqdns': ['test.com']})
+    store.add_dns_records(run, [('www.test.com', 'A', '10.0.0.1', 1),
+                                ('10.0.0.1', 'PTR', 'www.test.com.', 2),
+                                ('mail.test.community', 'A', '10.0.1.1', 1),
+                                ('v6.test.com', 'AAAA', '2001:db8::1', 1),
+                                ('test.com', 'MX', 'mx.provider.net', 1)])
+    store.add_web_results(run, 'bing-ip', 'ip:10.0.0.2',
+                          [{'name': 'x', 'description': '', 'url': 'https://blog.test.com/a'}], ip='10.0.0.2')
+    store.finish_run(run)
+
+    yield store
+
+    store.close()
+
+
+def test_pack_ip_sorts_ipv4_within_ipv6():
+    assert ResultStore.unpack_ip(ResultStore.pack_ip('10.0.0.1')) == '10.0.0.1'
+    assert ResultStore.unpack_ip(ResultStore.pack_ip('2001:db8::1')) == '2001:db8::1'
+    assert ResultStore.pack_ip('10.0.0.1') < ResultStore.pack_ip('10.0.0.2') < ResultStore.pack_ip('2001:db8::1')
+
+
+def test_fqdns_in_range(store):
+    assert store.fqdns_in_range('10.0.0.0/24') == {'www.test.com', 'blog.test.com'}
+    assert store.fqdns_in_range('10.0.0.0/16') == {'www.test.com', 'blog.test.com', 'mail.test.community'}
+    assert store.fqdns_in_range('2001:db8::/32') == {'v6.test.com'}
+    assert store.fqdns_in_range('192.168.0.0/16') == set()
+
+
+def test_dns_records_by_zone(store):
+    # By the name side of the records: test.community is not below test.com, and neither is the MX target
+    rows = store.dns_records(zone='test.com')
+
+    assert sorted((src, record_type, dst) for _, _, src, record_type, dst, _ in rows) == \
+        [('10.0.0.1', 'PTR', 'www.test.com.'),
+         ('v6.test.com', 'AAAA', '2001:db8::1'),
+         ('www.test.com', 'A', '10.0.0.1')]
+
+
+def test_dns_records_by_range_and_type(store):
+    rows = store.dns_records(ip_range='10.0.0.0/24', record_types=['PTR'])
+
+    assert [(src, dst) for _, _, src, _, dst, _ in rows] == [('10.0.0.1', 'www.test.com.')]
+
+
+def test_web_results_by_zone(store):
+    rows = store.web_results(zone='test.com')
+
+    assert [(url, ip) for _, _, _, _, url, _, _, ip in rows] == [('https://blog.test.com/a', '10.0.0.2')]
+    assert store.web_results(zone='other.com') == []
+
+
+def test_changed_ptrs(store):
+    run = store.begin_run('dns-recon', {})
+    store.add_dns_records(run, [('10.0.0.1', 'PTR', 'new.test.com.', 1)])
+    store.finish_run(run)
+    since = store.runs()[-1][3]
+
+    assert store.changed_ptrs(since=since) == {'10.0.0.1': ({'www.test.com.'}, {'new.test.com.'})}
@@ -0,0 +1,20 @@
+from OSSER.core.Wordlist import Wordlist
+
+
+def test_labels(tmp_path):
+    path = tmp_path / 'subdomains.txt'
+    path.write_bytes(b'www\n# comment\n\n  Mail \nnot valid!\n-dash\n_ldap._tcp\n' + b'a' * 64 + b'\nlast')
+
+    with Wordlist(str(path)) as wordlist:
+        assert list(wordlist) == ['www', 'mail', '_ldap._tcp', 'last']
+        # Iterated again, once per zone
+        assert list(wordlist.names('test.com.')) == ['www.test.com', 'mail.test.com', '_ldap._tcp.test.com',
+                                                     'last.test.com']
+
+
+def test_empty(tmp_path):
+    path = tmp_path / 'empty.txt'
+    path.write_bytes(b'')
+
+    with Wordlist(str(path)) as wordlist:
+        assert list(wordlist.names('test.com')) == []
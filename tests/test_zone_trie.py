@@ -0,0 +1,44 @@
+from OSSER.core.ZoneTrie import ZoneTrie
+
+
+def test_insert_returns_new_names_parents_first():
+    trie = ZoneTrie()
+
+    assert trie.insert('Admin.Test.com.') == ['test.com', 'admin.test.com']
+    assert trie.insert('www.test.com') == ['www.test.com']
+    assert trie.insert('admin.test.com') == []
+    assert len(trie) == 3
+    assert sorted(trie) == ['admin.test.com', 'test.com', 'www.test.com']
+
+
+def test_tld_alone():
+    trie = ZoneTrie(['test.com'])
+
+    assert 'com' not in trie
+    assert ZoneTrie().insert('localhost') == ['localhost']
+
+
+def test_covers():
+    trie = ZoneTrie(['test.com'])
+
+    assert trie.covers('test.com')
+    assert trie.covers('a.b.test.com')
+    assert not trie.covers('com')
+    assert not trie.covers('test.community')
+    assert not trie.covers('other.com')
+
+
+def test_has_children():
+    trie = ZoneTrie(['www.test.com'])
+
+    assert trie.has_children('test.com')
+    assert not trie.has_children('www.test.com')
+    assert not trie.has_children('other.com')
+
+
+def test_empty_label():
+    trie = ZoneTrie(['a.test.com'])
+
+    assert trie.insert('x..a.test.com') == ['.a.test.com', 'x..a.test.com']
+    assert 'x..a.test.com' in trie
+    assert trie.has_children('a.test.com')